@@ -0,0 +1,221 @@
+
+import time
+import queue
+import threading
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+
+
+class TaskCancelledError(Exception):
+
+    """
+    raised in the worker thread by BackgroundWorker.report_progress when the user cancelled the running task
+
+    """
+
+
+
+class BackgroundWorker():
+
+    """
+    run the long tasks of the graphical interface (extraction, export, plots, clustering...) in a background thread,
+    so that the tkinter main loop keeps processing events while they run
+
+    tkinter widgets must only be used from the main thread: the worker thread only puts messages in a queue, which is
+    polled from the main loop with gui_root.after, and the callbacks (on_progress, on_done...) are called from there
+
+    a task is a list of stages (name, function) run in sequence, each stage being timed; the functions report their
+    progress with report_progress, which is also where a cancelled task stops (cancellation is cooperative)
+
+    """
+
+    def __init__(self, gui_root, on_progress=None, poll_interval=100):
+
+        """
+            parameters
+            ----------
+            gui_root: the tkinter root, used to poll the queue
+            on_progress: function called in the main thread with (stage name, fraction of the stage done or None, timings)
+                         each time a stage starts or reports its progress, e.g. to update a progress bar
+            poll_interval: time between two polls of the queue, in ms
+
+        """
+
+        self.gui_root = gui_root
+        self.on_progress = on_progress
+        self.poll_interval = poll_interval
+
+        # one task at a time, the stages of a task depend on each other
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.messages = queue.Queue()
+        self.cancel_event = threading.Event()
+
+        # name and callbacks of the running task, None when the worker is idle
+        self.task = None
+
+        # duration of each stage of the running (or last) task, in seconds
+        self.timings = {}
+        self.current_stage = None
+        self.stage_start = None
+
+
+    def is_busy(self):
+
+        return self.task is not None
+
+
+    def submit(self, name, stages, on_done=None, on_error=None, on_cancelled=None):
+
+        """
+        run the stages of a task in the worker thread (called from the main thread)
+
+            parameters
+            ----------
+            name: name of the task, e.g. 'plots'
+            stages: list of (stage name, function without arguments), run in this order
+            on_done: called in the main thread with the value returned by the last stage and the timings of the stages
+            on_error: called in the main thread with the exception and its traceback (default: the traceback is printed)
+            on_cancelled: called in the main thread when the task stopped after a call to cancel
+
+            returns
+            ----------
+            False if another task is running (the task is not submitted), True otherwise
+
+        """
+
+        if self.is_busy():
+            return False
+
+        self.task = {'name': name, 'on_done': on_done, 'on_error': on_error, 'on_cancelled': on_cancelled}
+        self.timings = {}
+        self.cancel_event.clear()
+
+        self.executor.submit(self.run_stages, stages)
+
+        self.gui_root.after(self.poll_interval, self.poll)
+
+        return True
+
+
+    def cancel(self):
+
+        """
+        ask the running task to stop, it stops at its next call to report_progress
+        (called from the main thread)
+
+        """
+
+        if self.is_busy():
+            self.cancel_event.set()
+
+
+    def report_progress(self, fraction=None, stage=None):
+
+        """
+        called from the functions of the stages, in the worker thread
+
+            parameters
+            ----------
+            fraction: fraction of the current stage done, between 0 and 1 (None if unknown)
+            stage: name of a new sub-stage starting, timed separately (optional)
+
+        raise TaskCancelledError if the task was cancelled, calls outside a task have no effect
+
+        """
+
+        if threading.current_thread() is threading.main_thread():
+            return
+
+        if self.cancel_event.is_set():
+            raise TaskCancelledError()
+
+        if stage is not None:
+            self.start_stage(stage)
+
+        self.messages.put(('progress', self.current_stage, fraction, dict(self.timings)))
+
+
+    def start_stage(self, stage):
+
+        now = time.perf_counter()
+
+        if self.current_stage is not None:
+            self.timings[self.current_stage] = now - self.stage_start
+
+        self.current_stage = stage
+        self.stage_start = now
+
+
+    def run_stages(self, stages):
+
+        # worker thread: the outcome is only put in the queue, the callbacks are called by poll
+        self.current_stage = None
+
+        try:
+            result = None
+            for stage, function in stages:
+                self.report_progress(0, stage=stage)
+                result = function()
+            outcome = ('done', result)
+
+        except TaskCancelledError:
+            outcome = ('cancelled', None)
+
+        except Exception as error:
+            outcome = ('error', (error, traceback.format_exc()))
+
+        # time of the last stage
+        self.start_stage(None)
+        self.messages.put((*outcome, dict(self.timings)))
+
+
+    def poll(self):
+
+        """
+        process the messages of the worker thread (main thread, scheduled with gui_root.after while a task runs)
+
+        """
+
+        while True:
+            try:
+                message, value, *others = self.messages.get_nowait()
+            except queue.Empty:
+                break
+
+            if message == 'progress':
+                if self.on_progress is not None:
+                    self.on_progress(value, *others)
+                continue
+
+            task = self.task
+            self.task = None
+
+            # a task cancelled after its last call to report_progress still returns normally, its result is outdated
+            if message == 'cancelled' or self.cancel_event.is_set():
+                if task['on_cancelled'] is not None:
+                    task['on_cancelled']()
+
+            elif message == 'error':
+                if task['on_error'] is not None:
+                    task['on_error'](*value)
+                else:
+                    print(value[1])
+
+            elif task['on_done'] is not None:
+                task['on_done'](value, others[0])
+
+            return
+
+        self.gui_root.after(self.poll_interval, self.poll)
+
+
+
+def format_timings(timings):
+
+    """
+    timings of the stages of a task as a text, e.g. 'extraction 2.1 s, derived quantities 0.3 s'
+
+    """
+
+    return ', '.join(stage+' '+f"{duration:.1f} s" for stage, duration in timings.items())
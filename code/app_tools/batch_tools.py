@@ -0,0 +1,212 @@
+
+import os
+import glob
+import time
+import logging
+import traceback
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from app_tools.other_tools import create_directory
+
+from nanosight_app import NanosightApp
+
+
+logger = logging.getLogger('nanosight_batch')
+
+# file written in the results of a data directory whose processing failed, with the traceback of the error
+error_log_filename = 'batch_error.log'
+
+
+
+
+def find_data_directories(patterns):
+
+    """
+    expand a list of data directories and glob patterns (e.g. 'data/2024-*', 'data/**/plate_*') into data directories
+
+        returns
+        ----------
+        the sorted list of the existing directories matching the patterns, without duplicates
+        the patterns matching no directory
+
+    """
+
+    directories = set()
+    unmatched_patterns = []
+
+    for pattern in patterns:
+
+        matches = [match for match in glob.glob(os.path.expanduser(pattern), recursive=True) if os.path.isdir(match)]
+
+        if len(matches) == 0:
+            unmatched_patterns.append(pattern)
+
+        directories.update(os.path.abspath(match) for match in matches)
+
+    return sorted(directories), unmatched_patterns
+
+
+
+def find_duplicate_names(directories):
+
+    """
+    data directories sharing the same name, whose results would be written in the same directory of the output root
+
+    """
+
+    names = {}
+    for directory in directories:
+        names.setdefault(Path(directory).name, []).append(directory)
+
+    return {name: paths for name, paths in names.items() if len(paths) > 1}
+
+
+
+def process_data_directories(directories, results_root, n_workers=2, **kwargs):
+
+    """
+    process data directories independently, at most n_workers at a time; the failure of a directory
+    (e.g. a malformed export) is reported in its result and does not stop the others
+
+        parameters
+        ----------
+        directories: paths of the data directories
+        results_root: directory where the results of each data directory are written, in a directory of the same name
+        n_workers: number of directories processed in parallel, in worker processes (default: 2; 1: one after the other
+                   in this process; -1: as many as cpus)
+        kwargs: arguments of process_data_directory
+
+        returns
+        ----------
+        the result of each directory (see process_data_directory), in the order of directories
+
+    """
+
+    if n_workers == -1:
+        n_workers = os.cpu_count()
+
+    if n_workers == 1 or len(directories) < 2:
+        return [log_directory_result(process_data_directory(directory, results_root, **kwargs)) for directory in directories]
+
+    results = {}
+
+    with ProcessPoolExecutor(max_workers=n_workers) as pool_executor:
+
+        futures = {pool_executor.submit(process_data_directory, directory, results_root, **kwargs): directory
+                   for directory in directories}
+
+        for future in as_completed(futures):
+
+            directory = futures[future]
+
+            # errors of the processing are caught in the worker, this one comes from the worker itself (e.g. killed)
+            try:
+                results[directory] = future.result()
+            except Exception as exception:
+                results[directory] = {'directory': directory, 'status': 'failed', 'n_files': None, 'n_samples': None,
+                                      'elapsed_time': None, 'error': repr(exception)}
+
+            log_directory_result(results[directory])
+
+    return [results[directory] for directory in directories]
+
+
+
+def process_data_directory(directory_path, results_root, dilution_prefix=None, replicate_prefix=None, use_cache=True,
+                           binary_export_format=None, force_outputs=None, plots=True, clustering=True):
+
+    """
+    extract the data of one data directory and write its csv export, plots and clustering, as the manual mode of the app
+
+    the plots and the binary export are written by this process only (n_plot_jobs=1, n_export_jobs=1), so that the number
+    of processes of a batch is bounded by its number of workers
+
+        returns
+        ----------
+        a dictionary with the directory, the status ('ok' or 'failed'), the number of files and samples,
+        the processing time in seconds and the error message (None if the processing succeeded);
+        the traceback of an error is written in the results of the directory (error_log_filename)
+
+    """
+
+    directory_path = Path(directory_path)
+    error_log_path = Path(results_root, directory_path.name, error_log_filename)
+
+    start = time.perf_counter()
+
+    result = {'directory': str(directory_path), 'status': 'ok', 'n_files': None, 'n_samples': None,
+              'elapsed_time': None, 'error': None}
+
+    try:
+        app = NanosightApp(mode='manual', chosen_directory=directory_path.name, data_root=directory_path.parent,
+                           results_root=results_root, dilution_prefix=dilution_prefix, replicate_prefix=replicate_prefix,
+                           use_cache=use_cache, n_plot_jobs=1, force_outputs=force_outputs,
+                           binary_export_format=binary_export_format, n_export_jobs=1)
+
+        app.extract_data()
+        result['n_files'] = len(app.filenames)
+        result['n_samples'] = len(app.samples_names)
+
+        app.export_data()
+
+        if plots:
+            app.plot()
+
+        if clustering:
+            app.run_clustering()
+
+        # the error of a previous run is outdated
+        if os.path.exists(error_log_path):
+            os.remove(error_log_path)
+
+    except Exception as exception:
+
+        result['status'] = 'failed'
+        result['error'] = repr(exception)
+
+        create_directory([results_root, directory_path.name])
+        with open(error_log_path, 'w') as write_obj:
+            write_obj.write(traceback.format_exc())
+
+    result['elapsed_time'] = time.perf_counter() - start
+
+    return result
+
+
+
+def log_directory_result(result):
+
+    if result['status'] == 'ok':
+        logger.info("%s processed in %.1f s", result['directory'], result['elapsed_time'])
+    else:
+        logger.error("%s failed: %s", result['directory'], result['error'])
+
+    return result
+
+
+
+def format_batch_summary(results):
+
+    """
+    summary of a batch as a text table, one row per data directory
+
+    """
+
+    width = max([len('directory')] + [len(result['directory']) for result in results])
+
+    lines = [f"{'directory':<{width}} {'status':>7} {'files':>6} {'samples':>8} {'time (s)':>9}  error"]
+
+    for result in results:
+
+        n_files = '-' if result['n_files'] is None else str(result['n_files'])
+        n_samples = '-' if result['n_samples'] is None else str(result['n_samples'])
+        elapsed_time = '-' if result['elapsed_time'] is None else f"{result['elapsed_time']:.1f}"
+
+        lines.append(f"{result['directory']:<{width}} {result['status']:>7} {n_files:>6} {n_samples:>8} {elapsed_time:>9}  "
+                     + ('' if result['error'] is None else result['error']))
+
+    n_failed = sum(result['status'] != 'ok' for result in results)
+    lines.append(f"{len(results) - n_failed} / {len(results)} directories processed, {n_failed} failed")
+
+    return '\n'.join(lines)
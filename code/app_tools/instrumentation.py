@@ -0,0 +1,522 @@
+
+import os
+import sys
+import json
+import time
+import inspect
+import threading
+import functools
+import contextlib
+import tracemalloc
+from pathlib import Path
+
+# the peak resident memory of the process is read with getrusage, not available on windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+
+# tracer recording the spans, None when the instrumentation is disabled (default)
+current_tracer = None
+
+# context returned by span when the instrumentation is disabled, it does nothing and can be reused
+null_span = contextlib.nullcontext()
+
+
+
+
+def enable_instrumentation(trace_memory=False):
+
+    """
+    start recording the spans and counters of the extraction and analysis stages (see span, count and instrumented)
+    the instrumentation is disabled by default, the instrumented functions then only test that current_tracer is None
+
+        parameters
+        ----------
+        trace_memory: if True, the python memory allocated by each span is also measured with tracemalloc,
+                      which slows down the code being traced (default: False, only the peak resident memory is recorded)
+
+        returns
+        ----------
+        the new Tracer, which holds the records and writes the traces
+
+    """
+
+    global current_tracer
+
+    current_tracer = Tracer(trace_memory=trace_memory)
+
+    return current_tracer
+
+
+
+def disable_instrumentation():
+
+    """
+    stop recording, the tracer keeps its records
+
+        returns
+        ----------
+        the tracer that was recording (None if the instrumentation was not enabled)
+
+    """
+
+    global current_tracer
+
+    tracer = current_tracer
+    current_tracer = None
+
+    if tracer is not None:
+        tracer.stop()
+
+    return tracer
+
+
+
+def get_tracer():
+
+    return current_tracer
+
+
+
+def span(name, category='', **args):
+
+    """
+    context timing a block of code, e.g.
+        with span('integration', 'extraction'):
+            ...
+    args are recorded with the span (e.g. file=filename), the spans opened inside the block are its children
+
+    """
+
+    if current_tracer is None:
+        return null_span
+
+    return Span(current_tracer, name, category, args)
+
+
+
+def count(name, value=1):
+
+    """
+    add value to a counter of the innermost span open in this thread (e.g. 'bytes read') and to the total of the trace
+
+    """
+
+    if current_tracer is not None:
+        current_tracer.count(name, value)
+
+
+
+def instrumented(name, category='', arguments=()):
+
+    """
+    decorator recording each call of a function as a span
+
+        parameters
+        ----------
+        name: name of the span
+        category: category of the span, e.g. 'extraction' or 'app'
+        arguments: names of the arguments of the function recorded with the span, e.g. ('filename',)
+
+    """
+
+    def decorator(function):
+
+        signature = inspect.signature(function)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+
+            if current_tracer is None:
+                return function(*args, **kwargs)
+
+            span_args = {}
+            if len(arguments) > 0:
+                bound_arguments = signature.bind(*args, **kwargs).arguments
+                span_args = {argument: str(bound_arguments[argument]) for argument in arguments if argument in bound_arguments}
+
+            with Span(current_tracer, name, category, span_args):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+
+def get_current_span():
+
+    """
+    innermost span open in this thread (None if the instrumentation is disabled or no span is open), to pass to
+    run_in_span in a worker thread
+
+    """
+
+    if current_tracer is None:
+        return None
+
+    thread_spans = current_tracer.get_thread_spans()
+
+    return thread_spans[-1] if len(thread_spans) > 0 else None
+
+
+
+def run_in_span(parent_span, function, *args):
+
+    """
+    call function(*args) in a worker thread as if parent_span, opened in another thread, were open in this one:
+    the spans opened by the call are children of parent_span instead of roots of the trace
+
+    """
+
+    if parent_span is None or current_tracer is None:
+        return function(*args)
+
+    thread_spans = current_tracer.get_thread_spans()
+    thread_spans.append(parent_span)
+
+    try:
+        return function(*args)
+    finally:
+        thread_spans.remove(parent_span)
+
+
+
+def run_traced(function, trace_memory, *args):
+
+    """
+    call function(*args) in a worker process with a tracer of its own, the tracer of the parent process is not shared
+    with its workers; merge the returned records in the parent tracer with Tracer.merge
+
+        returns
+        ----------
+        the value returned by function
+        the records of the spans of the call
+
+    """
+
+    global current_tracer
+
+    # a forked worker inherits a copy of the parent tracer, which is put back after the call
+    parent_tracer = current_tracer
+    current_tracer = Tracer(trace_memory=trace_memory)
+
+    try:
+        result = function(*args)
+    finally:
+        tracer = current_tracer
+        tracer.stop()
+        current_tracer = parent_tracer
+
+    return result, tracer.records
+
+
+
+def get_peak_rss():
+
+    """
+    peak resident memory of the process since it started, in bytes (None where getrusage is not available)
+
+    """
+
+    if resource is None:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # kilobytes on linux, bytes on macos
+    return peak_rss if sys.platform == 'darwin' else 1024 * peak_rss
+
+
+
+class Span():
+
+    """
+    one timed block of code, recorded by its tracer when it ends
+
+    """
+
+    def __init__(self, tracer, name, category, args):
+
+        self.tracer = tracer
+        self.record = {'name': name, 'category': category, 'args': args, 'counters': {}}
+
+
+    def __enter__(self):
+
+        self.tracer.start_span(self)
+        return self
+
+
+    def __exit__(self, *exc_info):
+
+        self.tracer.end_span(self)
+        return False
+
+
+
+class Tracer():
+
+    """
+    records of the spans and counters of one process, and their export as a JSON trace or a Chrome trace
+
+    each span records its start and duration, its process and thread, its parent span, the counters incremented
+    while it was the innermost span of its thread (e.g. bytes read for the reading of one file), the peak resident
+    memory of the process at its end, and if trace_memory is True the python memory it allocated (tracemalloc
+    measures all threads, the memory of a span includes the allocations of the other threads running meanwhile)
+
+    """
+
+    def __init__(self, trace_memory=False):
+
+        self.trace_memory = trace_memory
+
+        # times are perf_counter values, written relative to the start of the trace
+        self.start_time = time.perf_counter()
+        self.start_datetime = time.strftime('%Y-%m-%d %H:%M:%S')
+
+        # records of the ended spans, in order of their end
+        self.records = []
+        # totals of the counters over the whole trace
+        self.counters = {}
+
+        self.lock = threading.Lock()
+        self.next_id = 0
+
+        # spans open in each thread (innermost last), and in all threads for the tracemalloc peaks
+        self.local = threading.local()
+        self.open_spans = []
+
+        # tracemalloc is stopped with the tracer only if the tracer started it
+        self.started_tracemalloc = trace_memory and not tracemalloc.is_tracing()
+        if self.started_tracemalloc:
+            tracemalloc.start()
+
+
+    def stop(self):
+
+        if self.started_tracemalloc:
+            tracemalloc.stop()
+            self.started_tracemalloc = False
+
+
+    def get_thread_spans(self):
+
+        if not hasattr(self.local, 'spans'):
+            self.local.spans = []
+
+        return self.local.spans
+
+
+    def start_span(self, span):
+
+        thread_spans = self.get_thread_spans()
+
+        with self.lock:
+            span.record['id'] = self.next_id
+            self.next_id += 1
+
+        span.record['parent'] = thread_spans[-1].record['id'] if len(thread_spans) > 0 else None
+        span.record['pid'] = os.getpid()
+        span.record['thread'] = threading.get_ident()
+        span.peak_rss_at_start = get_peak_rss()
+
+        thread_spans.append(span)
+
+        if self.trace_memory and tracemalloc.is_tracing():
+            with self.lock:
+                # the peak reached so far belongs to the spans already open, the peak is then measured from here
+                current, peak = tracemalloc.get_traced_memory()
+                for open_span in self.open_spans:
+                    open_span.tracemalloc_peak = max(open_span.tracemalloc_peak, peak)
+                tracemalloc.reset_peak()
+                span.tracemalloc_start = current
+                span.tracemalloc_peak = current
+                self.open_spans.append(span)
+
+        span.start = time.perf_counter()
+
+
+    def end_span(self, span):
+
+        end = time.perf_counter()
+
+        record = span.record
+        record['start'] = span.start
+        record['duration'] = end - span.start
+
+        record['peak_rss'] = get_peak_rss()
+        if record['peak_rss'] is not None:
+            record['peak_rss_increase'] = record['peak_rss'] - span.peak_rss_at_start
+
+        if span in self.open_spans:
+            with self.lock:
+                current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (span.tracemalloc_start, 0)
+                for open_span in self.open_spans:
+                    open_span.tracemalloc_peak = max(open_span.tracemalloc_peak, peak)
+                self.open_spans.remove(span)
+            record['tracemalloc_delta'] = current - span.tracemalloc_start
+            record['tracemalloc_peak'] = span.tracemalloc_peak - span.tracemalloc_start
+
+        self.get_thread_spans().pop()
+
+        with self.lock:
+            self.records.append(record)
+
+
+    def count(self, name, value=1):
+
+        thread_spans = self.get_thread_spans()
+
+        # the innermost span can be shared with worker threads (see run_in_span), its counters are updated under the lock
+        with self.lock:
+
+            if len(thread_spans) > 0:
+                counters = thread_spans[-1].record['counters']
+                counters[name] = counters.get(name, 0) + value
+
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+    def merge(self, records):
+
+        """
+        add the records of a worker (see run_traced) to this trace; spans without parent in the worker become children
+        of the innermost span open in this thread, and the ids of the worker spans are renumbered
+
+        """
+
+        thread_spans = self.get_thread_spans()
+        parent = thread_spans[-1].record['id'] if len(thread_spans) > 0 else None
+
+        with self.lock:
+
+            ids = {}
+            for record in sorted(records, key=lambda record: record['id']):
+                ids[record['id']] = self.next_id
+                self.next_id += 1
+
+            for record in records:
+                record = dict(record, id=ids[record['id']], parent=ids.get(record['parent'], parent))
+                self.records.append(record)
+                for name, value in record['counters'].items():
+                    self.counters[name] = self.counters.get(name, 0) + value
+
+
+    def get_summary(self):
+
+        """
+        statistics of the spans of each (category, name): number, total, self (total minus the time of the children
+        spans) and maximum durations in seconds, counters, largest peak resident memory increase and tracemalloc peak
+
+        """
+
+        children_durations = {}
+        for record in self.records:
+            if record['parent'] is not None:
+                children_durations[record['parent']] = children_durations.get(record['parent'], 0) + record['duration']
+
+        summary = {}
+        for record in sorted(self.records, key=lambda record: record['start']):
+
+            key = record['category']+'/'+record['name'] if record['category'] != '' else record['name']
+            if key not in summary:
+                summary[key] = {'count': 0, 'total': 0., 'self': 0., 'max': 0., 'counters': {}}
+
+            stats = summary[key]
+            stats['count'] += 1
+            stats['total'] += record['duration']
+            # children running in parallel (workers) can last longer than their parent
+            stats['self'] += max(0., record['duration'] - children_durations.get(record['id'], 0))
+            stats['max'] = max(stats['max'], record['duration'])
+
+            for name, value in record['counters'].items():
+                stats['counters'][name] = stats['counters'].get(name, 0) + value
+
+            for memory in ['peak_rss_increase', 'tracemalloc_peak']:
+                if record.get(memory) is not None:
+                    stats[memory] = max(stats.get(memory, 0), record[memory])
+
+        return summary
+
+
+    def format_summary(self):
+
+        """
+        summary as a text table, one row per (category, name), in order of first start
+
+        """
+
+        lines = [f"{'span':<36} {'count':>6} {'total (s)':>10} {'self (s)':>9} {'max (s)':>8} {'peak rss +MB':>13}  counters"]
+
+        for key, stats in self.get_summary().items():
+            peak_rss_increase = f"{stats['peak_rss_increase'] / 1024**2:.1f}" if 'peak_rss_increase' in stats else '-'
+            counters = ', '.join(name+' '+str(value) for name, value in stats['counters'].items())
+            lines.append(f"{key:<36} {stats['count']:>6} {stats['total']:>10.3f} {stats['self']:>9.3f} {stats['max']:>8.3f} "
+                         f"{peak_rss_increase:>13}  {counters}")
+
+        return '\n'.join(lines)
+
+
+    def get_relative_records(self):
+
+        # records with their start relative to the start of the trace, in order of start
+        return [dict(record, start=record['start'] - self.start_time) for record in sorted(self.records, key=lambda record: record['start'])]
+
+
+    def export_json_trace(self, filepath):
+
+        """
+        write the spans (times in seconds from the start of the trace, memory in bytes), the totals of the counters
+        and the summary of the trace in a JSON file
+
+        """
+
+        trace = {'start_datetime': self.start_datetime,
+                 'trace_memory': self.trace_memory,
+                 'spans': self.get_relative_records(),
+                 'counters': self.counters,
+                 'summary': self.get_summary()}
+
+        write_json(filepath, trace)
+
+
+    def export_chrome_trace(self, filepath):
+
+        """
+        write the spans in the Chrome trace event format (complete events, times in microseconds), to open in
+        chrome://tracing or https://ui.perfetto.dev; the peak resident memory is also written as a counter track
+
+        """
+
+        events = []
+
+        for record in self.get_relative_records():
+
+            args = dict(record['args'], **record['counters'])
+            for memory in ['peak_rss', 'peak_rss_increase', 'tracemalloc_delta', 'tracemalloc_peak']:
+                if record.get(memory) is not None:
+                    args[memory] = record[memory]
+
+            events.append({'name': record['name'], 'cat': record['category'], 'ph': 'X',
+                           'ts': 1e6 * record['start'], 'dur': 1e6 * record['duration'],
+                           'pid': record['pid'], 'tid': record['thread'], 'args': args})
+
+            if record.get('peak_rss') is not None:
+                events.append({'name': 'peak rss (MB)', 'ph': 'C', 'ts': 1e6 * (record['start'] + record['duration']),
+                               'pid': record['pid'], 'args': {'peak rss': record['peak_rss'] / 1024**2}})
+
+        write_json(filepath, {'traceEvents': events, 'displayTimeUnit': 'ms'})
+
+
+
+def write_json(filepath, content):
+
+    # write in a temporary file first, so that an interrupted write never leaves a partial trace
+    tmp_path = Path(str(filepath) + f".{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, 'w') as write_obj:
+        json.dump(content, write_obj, indent=1)
+    os.replace(tmp_path, filepath)
@@ -6,10 +6,6 @@ from pathlib import Path
 
 
 def create_directory(list_sequential_dirs):
-    
-    for i in range(len(list_sequential_dirs)):
-        
-        path = Path(*list_sequential_dirs[:i+1])
 
-        if not os.path.exists(path):
-            os.mkdir(Path(path))
+    # the missing parent directories are created too, and a directory created meanwhile by another process is not an error
+    os.makedirs(Path(*list_sequential_dirs), exist_ok=True)
@@ -0,0 +1,128 @@
+
+import os
+import json
+import fnmatch
+import hashlib
+import threading
+import numpy as np
+import pandas
+from pathlib import Path
+
+
+
+# name of the manifest file written in each output directory
+manifest_filename = '.manifest.json'
+
+
+
+def compute_fingerprint(*objects):
+
+    """
+    hash of the content of the inputs of an output file (dataframes, numpy arrays, lists, dictionaries, strings, numbers)
+    two calls with equal inputs give the same fingerprint, whatever the process or the session
+
+    """
+
+    hasher = hashlib.sha1()
+
+    for obj in objects:
+        update_fingerprint(hasher, obj)
+
+    return hasher.hexdigest()
+
+
+
+def update_fingerprint(hasher, obj):
+
+    if isinstance(obj, pandas.DataFrame):
+        hasher.update(b'DataFrame')
+        update_fingerprint(hasher, obj.index)
+        for i, col in enumerate(obj.columns):
+            update_fingerprint(hasher, col)
+            update_fingerprint(hasher, obj.iloc[:, i].values)
+
+    elif isinstance(obj, (pandas.Series, pandas.Index)):
+        hasher.update(type(obj).__name__.encode())
+        update_fingerprint(hasher, obj.values)
+
+    elif isinstance(obj, np.ndarray):
+        # object arrays (strings, lists...) have no stable bytes, their values are hashed as text
+        if obj.dtype == object:
+            hasher.update(repr(obj.tolist()).encode())
+        else:
+            hasher.update(f"{obj.dtype.str}{obj.shape}".encode())
+            hasher.update(np.ascontiguousarray(obj).tobytes())
+
+    elif isinstance(obj, (list, tuple)):
+        hasher.update(f"{type(obj).__name__}{len(obj)}".encode())
+        for item in obj:
+            update_fingerprint(hasher, item)
+
+    elif isinstance(obj, dict):
+        hasher.update(f"dict{len(obj)}".encode())
+        for key in sorted(obj, key=str):
+            update_fingerprint(hasher, key)
+            update_fingerprint(hasher, obj[key])
+
+    else:
+        hasher.update(f"{type(obj).__name__}:{obj!r};".encode())
+
+
+
+def load_manifest(directory):
+
+    """
+    fingerprints of the output files of a directory, as written by save_manifest ({} if there is no manifest)
+
+    """
+
+    try:
+        with open(Path(directory, manifest_filename), 'r') as read_obj:
+            return json.load(read_obj)
+    except (OSError, ValueError):
+        return {}
+
+
+
+def save_manifest(directory, manifest):
+
+    # write in a temporary file first, so that an interrupted write never leaves a partial manifest
+    tmp_path = Path(directory, f"{manifest_filename}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, 'w') as write_obj:
+        json.dump(manifest, write_obj, indent=1, sort_keys=True)
+    os.replace(tmp_path, Path(directory, manifest_filename))
+
+
+
+def is_output_up_to_date(manifest, directory, output_name, fingerprint, force=None):
+
+    """
+    True if the output file exists and was written from inputs with the same fingerprint, i.e. it can be skipped
+
+        parameters
+        ----------
+        manifest: dictionary loaded with load_manifest
+        directory: directory of the output file
+        output_name: name of the output file
+        fingerprint: fingerprint of the current inputs of the output file
+        force: outputs to regenerate anyway: True for all outputs, or a list of patterns of output names
+               (fnmatch syntax, e.g. ['*_barplot.png', 'size_distributions.csv']); default None
+
+    """
+
+    if is_forced(output_name, force):
+        return False
+
+    return manifest.get(output_name) == fingerprint and os.path.exists(Path(directory, output_name))
+
+
+
+def is_forced(output_name, force):
+
+    if force is None or force is False:
+        return False
+
+    if force is True:
+        return True
+
+    return any(fnmatch.fnmatchcase(output_name, pattern) for pattern in force)
@@ -0,0 +1,270 @@
+
+import tkinter
+
+
+
+class VirtualTable():
+
+    """
+    table of text rows that only creates the widgets of the visible rows, whatever the number of rows
+
+    a fixed pool of n_visible_rows rows of labels is created once; scrolling, searching or filtering only changes
+    the texts of these labels, so that displaying thousands of samples costs the same as displaying a few
+
+    an optional last column of entries edits one value per key (e.g. a class label per sample name); rows sharing a key
+    (e.g. the replicates of a sample) show and edit the same value, the values are stored in a dictionary, not in
+    one tkinter variable per row
+
+    """
+
+    def __init__(self, parent, columns, rows, keys, bg_color, n_visible_rows=20, filter_column=None,
+                 max_column_width=40, ratio_padx=1, ratio_pady=1):
+
+        """
+            parameters
+            ----------
+            parent: the tkinter frame containing the table
+            columns: titles of the columns
+            rows: list of rows, each row being a tuple of texts (one per column)
+            keys: key of each row, the edited values are stored by key
+            n_visible_rows: number of rows displayed at once
+            filter_column: title of a column whose values can be selected in a menu to filter the rows (optional)
+            max_column_width: maximum width of a column, in characters
+
+        """
+
+        self.columns = list(columns)
+        self.rows = rows
+        self.keys = keys
+        self.bg_color = bg_color
+        self.n_visible_rows = n_visible_rows
+
+        # text searched in each row, computed once
+        self.search_texts = [' '.join(row).lower() for row in rows]
+
+        # indexes of the rows matching the search and the filter, and index (in this list) of the first displayed row
+        self.displayed_rows = list(range(len(rows)))
+        self.first = 0
+
+        # edited values by key, None while the editable column is hidden
+        self.values = None
+        self.editable = False
+        self.editable_title = ''
+
+        self.frame = tkinter.Frame(parent, bg=bg_color)
+
+        """
+        search and filter
+
+        """
+
+        tools_frame = tkinter.Frame(self.frame, bg=bg_color)
+        tools_frame.grid(row=0, column=0, columnspan=2, sticky='w', pady=10*ratio_pady)
+
+        tkinter.Label(tools_frame, text='Search', bg=bg_color, fg='black').grid(row=0, column=0, padx=5*ratio_padx)
+        self.search_tkinter_var = tkinter.StringVar()
+        tkinter.Entry(tools_frame, textvariable=self.search_tkinter_var, width=25).grid(row=0, column=1, padx=5*ratio_padx)
+        self.search_tkinter_var.trace_add(mode='write', callback=self.update_displayed_rows)
+
+        self.filter_column = filter_column
+        self.filter_tkinter_var = tkinter.StringVar(value='All')
+
+        if filter_column is not None:
+            filter_index = self.columns.index(filter_column)
+            filter_values = ['All'] + sorted(set(row[filter_index] for row in rows))
+            tkinter.Label(tools_frame, text=filter_column, bg=bg_color, fg='black').grid(row=0, column=2, padx=5*ratio_padx)
+            filter_menu = tkinter.OptionMenu(tools_frame, self.filter_tkinter_var, *filter_values)
+            filter_menu.config(bg='white')
+            filter_menu.grid(row=0, column=3, padx=5*ratio_padx)
+            self.filter_tkinter_var.trace_add(mode='write', callback=self.update_displayed_rows)
+
+        # number of rows matching the search and the filter
+        self.count_label = tkinter.Label(tools_frame, text='', bg=bg_color, fg='black')
+        self.count_label.grid(row=0, column=4, padx=10*ratio_padx)
+
+        """
+        pool of rows
+
+        """
+
+        self.table_frame = tkinter.Frame(self.frame, bg=bg_color)
+        self.table_frame.grid(row=1, column=0, sticky='nswe')
+
+        # widths in characters, from the longest text of each column
+        widths = [min(max_column_width, max([len(title)] + [len(row[j]) for row in rows])) for j, title in enumerate(self.columns)]
+
+        for j, title in enumerate(self.columns):
+            tkinter.Label(self.table_frame, text=title, bg=bg_color, fg='black', width=widths[j]).grid(row=0, column=j, pady=10*ratio_pady, padx=2*ratio_padx)
+
+        self.editable_title_label = tkinter.Label(self.table_frame, text='', bg=bg_color, fg='black')
+        self.editable_title_label.grid(row=0, column=len(self.columns), pady=10*ratio_pady, padx=10*ratio_padx)
+
+        self.pool_labels = []
+        self.pool_entries = []
+        self.pool_tkinter_vars = []
+
+        for i in range(n_visible_rows):
+
+            labels = [tkinter.Label(self.table_frame, text='', bg=bg_color, fg='black', width=widths[j], anchor='w')
+                      for j in range(len(self.columns))]
+            for j, label in enumerate(labels):
+                label.grid(row=i+1, column=j, pady=1*ratio_pady, padx=2*ratio_padx)
+
+            tkinter_var = tkinter.StringVar()
+            entry = tkinter.Entry(self.table_frame, textvariable=tkinter_var, width=4)
+            entry.grid(row=i+1, column=len(self.columns), pady=1*ratio_pady, padx=10*ratio_padx)
+            entry.grid_remove()
+            # the pool row index is bound now, the displayed row is found when the value is written
+            tkinter_var.trace_add(mode='write', callback=lambda *args, i=i: self.on_value_change(i))
+
+            self.pool_labels.append(labels)
+            self.pool_entries.append(entry)
+            self.pool_tkinter_vars.append(tkinter_var)
+
+        # True while refresh writes the displayed values in the entries, these writes are not edits
+        self.refreshing = False
+
+        self.scrollbar = tkinter.Scrollbar(self.frame, orient='vertical', command=self.on_scroll)
+        self.scrollbar.grid(row=1, column=1, sticky='ns')
+
+        # scroll with the mouse wheel over the rows (<MouseWheel> on windows and macos, buttons 4 and 5 on linux)
+        for widget in [self.table_frame] + [widget for labels in self.pool_labels for widget in labels]:
+            widget.bind('<MouseWheel>', lambda event: self.scroll_to(self.first - (1 if event.delta > 0 else -1)))
+            widget.bind('<Button-4>', lambda event: self.scroll_to(self.first - 1))
+            widget.bind('<Button-5>', lambda event: self.scroll_to(self.first + 1))
+
+        self.refresh()
+
+
+    def grid(self, **kwargs):
+
+        self.frame.grid(**kwargs)
+
+
+    def update_displayed_rows(self, *args):
+
+        """
+        keep the rows containing the searched text (case insensitive) and matching the filter
+
+        """
+
+        search = self.search_tkinter_var.get().lower()
+        filter_value = self.filter_tkinter_var.get()
+
+        displayed_rows = range(len(self.rows))
+
+        if search != '':
+            displayed_rows = [i for i in displayed_rows if search in self.search_texts[i]]
+
+        if self.filter_column is not None and filter_value != 'All':
+            filter_index = self.columns.index(self.filter_column)
+            displayed_rows = [i for i in displayed_rows if self.rows[i][filter_index] == filter_value]
+
+        self.displayed_rows = list(displayed_rows)
+        self.first = 0
+
+        self.refresh()
+
+
+    def refresh(self):
+
+        """
+        write the texts of the displayed rows in the pool of widgets
+
+        """
+
+        self.refreshing = True
+
+        for i in range(self.n_visible_rows):
+
+            position = self.first + i
+
+            if position < len(self.displayed_rows):
+                row_index = self.displayed_rows[position]
+                texts = self.rows[row_index]
+            else:
+                row_index = None
+                texts = ['']*len(self.columns)
+
+            for label, text in zip(self.pool_labels[i], texts):
+                label.config(text=text)
+
+            if self.values is None or row_index is None:
+                self.pool_entries[i].grid_remove()
+            else:
+                self.pool_tkinter_vars[i].set(self.values[self.keys[row_index]])
+                self.pool_entries[i].config(state='normal' if self.editable else 'readonly')
+                self.pool_entries[i].grid()
+
+        self.refreshing = False
+
+        n_displayed = len(self.displayed_rows)
+        self.count_label.config(text=str(n_displayed)+' / '+str(len(self.rows))+' rows')
+
+        if n_displayed == 0:
+            self.scrollbar.set(0, 1)
+        else:
+            self.scrollbar.set(self.first/n_displayed, min(1, (self.first+self.n_visible_rows)/n_displayed))
+
+
+    def scroll_to(self, first):
+
+        self.first = max(0, min(first, len(self.displayed_rows) - self.n_visible_rows))
+        self.refresh()
+
+
+    def on_scroll(self, action, value, unit=None):
+
+        # command of the scrollbar: ('moveto', fraction) or ('scroll', number, 'units' or 'pages')
+        if action == 'moveto':
+            self.scroll_to(int(round(float(value) * len(self.displayed_rows))))
+        elif unit == 'pages':
+            self.scroll_to(self.first + int(value)*self.n_visible_rows)
+        else:
+            self.scroll_to(self.first + int(value))
+
+
+    def show_row(self, row_index):
+
+        """
+        clear the search and the filter, and scroll to a row (e.g. to show an invalid value)
+
+        """
+
+        self.search_tkinter_var.set('')
+        self.filter_tkinter_var.set('All')
+
+        self.scroll_to(self.displayed_rows.index(row_index))
+
+
+    def on_value_change(self, i):
+
+        if self.refreshing or not self.editable:
+            return
+
+        position = self.first + i
+        if position < len(self.displayed_rows):
+            key = self.keys[self.displayed_rows[position]]
+            self.values[key] = self.pool_tkinter_vars[i].get()
+
+            # other displayed rows with the same key show the new value
+            self.refreshing = True
+            for k in range(self.n_visible_rows):
+                if k != i and self.first + k < len(self.displayed_rows) and self.keys[self.displayed_rows[self.first + k]] == key:
+                    self.pool_tkinter_vars[k].set(self.values[key])
+            self.refreshing = False
+
+
+    def set_values(self, values, title, editable=True):
+
+        """
+        display (and edit if editable is True) a value per key in the last column, values being a dictionary
+        {key: text} modified in place by the edits; values=None hides the column
+
+        """
+
+        self.values = values
+        self.editable = editable
+        self.editable_title_label.config(text=title if values is not None else '')
+
+        self.refresh()
@@ -0,0 +1,393 @@
+
+import os
+import time
+import queue
+import signal
+import logging
+import threading
+import multiprocessing
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+from app_tools.other_tools import create_directory
+
+from data_extraction_module.nanosight_export_files_listing import (export_filename_regex, get_experiment_root,
+                                                                  find_experiment_root)
+from data_extraction_module.nanosight_data_extraction import extract_experiment_data, assemble_nanosight_data
+
+from data_analysis_module.plot_tools import plot_size_distributions
+
+# inotify is used when available (linux, with the optional inotify_simple package), else the directory is polled
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+
+logger = logging.getLogger('nanosight_watch')
+
+
+
+
+def watch_directory(directory_path, results_path, dilution_prefix=None, replicate_prefix=None, cache_directory=None,
+                    n_workers=2, batch_size=8, queue_size=32, settle_time=5., poll_interval=2.,
+                    process_existing=False, use_inotify=True, stop_event=None):
+
+    """
+    watch a data directory and process each new ExperimentSummary.csv file once the instrument has finished writing it
+    (extraction, csv export and plots of this experiment only)
+
+    a file is considered finished when its size and modification time have not changed for settle_time seconds
+    and no '~lock' file of the experiment exists. Finished files go through a bounded queue to a dispatcher,
+    which sends them by batches to a pool of worker processes. When all workers are busy, the queue fills up
+    and the detection of new files waits, so that a burst of exports cannot overload the machine.
+
+        parameters
+        ----------
+        directory_path: path of the data directory to watch
+        results_path: directory where the results of each experiment are written (one sub-directory per experiment)
+        dilution_prefix: dilution prefix to consider when reading file names
+        replicate_prefix: replicate prefix to consider when reading file names
+        cache_directory: directory of the parse cache (None: no cache)
+        n_workers: number of worker processes
+        batch_size: maximum number of experiments sent to a worker at once
+        queue_size: maximum number of finished files waiting for a worker
+        settle_time: time in seconds without modification after which a file is considered finished
+        poll_interval: time in seconds between two scans of the directory (or two checks of pending files with inotify)
+        process_existing: if True, the files present when the watch starts are processed too
+        use_inotify: use inotify to detect new files if it is available
+        stop_event: threading.Event stopping the watch when set (default: the watch runs until interrupted)
+
+    """
+
+    if stop_event is None:
+        stop_event = threading.Event()
+
+    ready_queue = queue.Queue(maxsize=queue_size)
+
+    dispatcher = threading.Thread(target=dispatch_batches,
+                                  args=(ready_queue, directory_path, results_path, dilution_prefix, replicate_prefix,
+                                        cache_directory, n_workers, batch_size, stop_event),
+                                  daemon=True)
+    dispatcher.start()
+
+    if use_inotify and INotify is not None:
+        logger.info("watching %s with inotify", directory_path)
+        detect_files = detect_files_with_inotify
+    else:
+        logger.info("watching %s by polling every %s s", directory_path, poll_interval)
+        detect_files = detect_files_by_polling
+
+    try:
+        detect_files(directory_path, ready_queue, settle_time, poll_interval, process_existing, stop_event)
+    except KeyboardInterrupt:
+        logger.info("stopping")
+    finally:
+        stop_event.set()
+        dispatcher.join()
+
+
+
+def is_experiment_summary_file(filename):
+
+    """
+    True for the ExperimentSummary.csv files used by the app (not raw, not lock files)
+
+    """
+
+    if "~lock" in filename:
+        return False
+
+    match = export_filename_regex.match(filename)
+
+    return match is not None and match.group('kind') == "ExperimentSummary" and match.group('suffix') == ""
+
+
+
+def list_experiment_summary_files(directory_path):
+
+    """
+    signature (size, modification time) of all ExperimentSummary.csv files of a directory and its sub-directories
+
+    """
+
+    files = {}
+
+    for (dirpath, dirnames, filenames) in os.walk(directory_path):
+        for file in filenames:
+            if is_experiment_summary_file(file):
+                try:
+                    stat = os.stat(Path(dirpath, file))
+                except OSError:
+                    continue
+                files[Path(dirpath, file)] = (stat.st_size, stat.st_mtime_ns)
+
+    return files
+
+
+
+def is_locked(path):
+
+    """
+    True if a '~lock' file of the experiment exists next to the file, i.e. the instrument is still writing
+
+    """
+
+    experiment_root = get_experiment_root(path.name.replace("-ExperimentSummary.csv", ""))
+
+    try:
+        files = os.listdir(path.parent)
+    except OSError:
+        return False
+
+    for file in files:
+        if "~lock" not in file:
+            continue
+        # the lock file name is parsed like the export files: a lock of 'XS rep1' must not lock 'S rep1'
+        lock_name = file.replace("~lock", "").strip(".#")
+        match = export_filename_regex.match(lock_name)
+        lock_experiment = match.group('experiment') if match is not None else os.path.splitext(lock_name)[0]
+        if find_experiment_root(get_experiment_root(lock_experiment), {experiment_root}) is not None:
+            return True
+
+    return False
+
+
+
+class PendingFiles():
+
+    """
+    files detected but maybe not finished yet; a file is ready when its signature has been stable for settle_time
+
+    """
+
+    def __init__(self, settle_time):
+
+        self.settle_time = settle_time
+        # path: (signature, time of the last signature change)
+        self.pending = {}
+        # path: signature of the processed version of the file
+        self.processed = {}
+
+    def update(self, path, signature=None):
+
+        if signature is None:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                self.pending.pop(path, None)
+                return
+            signature = (stat.st_size, stat.st_mtime_ns)
+
+        if self.processed.get(path) == signature:
+            return
+
+        if path not in self.pending or self.pending[path][0] != signature:
+            self.pending[path] = (signature, time.monotonic())
+
+    def pop_ready(self):
+
+        now = time.monotonic()
+        ready = []
+
+        for path, (signature, last_change) in list(self.pending.items()):
+            if now - last_change >= self.settle_time and not is_locked(path):
+                ready.append(path)
+                self.processed[path] = signature
+                del self.pending[path]
+
+        return ready
+
+
+
+def put_ready_files(pending_files, ready_queue, stop_event):
+
+    # put blocks while the queue is full, which stops the detection of new files (backpressure)
+    for path in pending_files.pop_ready():
+        while not stop_event.is_set():
+            try:
+                ready_queue.put((path, time.time()), timeout=1.)
+                break
+            except queue.Full:
+                logger.debug("queue full, waiting for workers")
+
+
+
+def detect_files_by_polling(directory_path, ready_queue, settle_time, poll_interval, process_existing, stop_event):
+
+    pending_files = PendingFiles(settle_time)
+
+    if not process_existing:
+        pending_files.processed = list_experiment_summary_files(directory_path)
+
+    while not stop_event.is_set():
+
+        for path, signature in list_experiment_summary_files(directory_path).items():
+            pending_files.update(path, signature)
+
+        put_ready_files(pending_files, ready_queue, stop_event)
+
+        stop_event.wait(poll_interval)
+
+
+
+def detect_files_with_inotify(directory_path, ready_queue, settle_time, poll_interval, process_existing, stop_event):
+
+    pending_files = PendingFiles(settle_time)
+
+    if process_existing:
+        for path, signature in list_experiment_summary_files(directory_path).items():
+            pending_files.update(path, signature)
+    else:
+        pending_files.processed = list_experiment_summary_files(directory_path)
+
+    watch_flags = inotify_flags.CREATE | inotify_flags.MODIFY | inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO
+
+    with INotify() as inotify:
+
+        # inotify watches are not recursive, each sub-directory is watched
+        watched_directories = {}
+        for (dirpath, dirnames, filenames) in os.walk(directory_path):
+            watched_directories[inotify.add_watch(dirpath, watch_flags)] = dirpath
+
+        while not stop_event.is_set():
+
+            for event in inotify.read(timeout=int(1000 * poll_interval)):
+
+                path = Path(watched_directories.get(event.wd, directory_path), event.name)
+
+                if event.mask & inotify_flags.ISDIR:
+                    if event.mask & (inotify_flags.CREATE | inotify_flags.MOVED_TO):
+                        watched_directories[inotify.add_watch(path, watch_flags)] = path
+
+                elif is_experiment_summary_file(event.name):
+                    pending_files.update(path)
+
+            # files without event since settle_time are ready
+            for path in list(pending_files.pending):
+                pending_files.update(path)
+
+            put_ready_files(pending_files, ready_queue, stop_event)
+
+
+
+def dispatch_batches(ready_queue, directory_path, results_path, dilution_prefix, replicate_prefix, cache_directory,
+                     n_workers, batch_size, stop_event):
+
+    """
+    send the finished files to the worker processes by batches, with at most n_workers batches at a time
+
+    """
+
+    # limits the number of batches submitted and not finished
+    workers_available = threading.Semaphore(n_workers)
+
+    # the pool is created from this thread while the detection thread runs: the workers are started with spawn, forking a
+    # multithreaded process can deadlock the workers on locks held by the other threads
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=multiprocessing.get_context('spawn'),
+                             initializer=initialize_watch_worker) as pool_executor:
+
+        while not (stop_event.is_set() and ready_queue.empty()):
+
+            try:
+                batch = [ready_queue.get(timeout=1.)]
+            except queue.Empty:
+                continue
+
+            while len(batch) < batch_size:
+                try:
+                    batch.append(ready_queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            workers_available.acquire()
+
+            future = pool_executor.submit(process_experiments_batch, [path for path, _ in batch], directory_path, results_path,
+                                          dilution_prefix, replicate_prefix, cache_directory)
+            future.add_done_callback(lambda future, batch=batch: log_batch_results(future, batch, workers_available))
+
+
+
+def initialize_watch_worker():
+
+    # ctrl-c stops the watch in the main process, which waits for the batches running; the workers ignore it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+
+def log_batch_results(future, batch, workers_available):
+
+    workers_available.release()
+
+    if future.exception() is not None:
+        logger.error("batch of %d files failed: %s", len(batch), future.exception())
+        return
+
+    for (path, ready_time), (filename, error, end_time) in zip(batch, future.result()):
+
+        if error is not None:
+            logger.error("%s: %s", filename, error)
+            continue
+
+        # latency from the last write of the file to the end of the processing
+        try:
+            latency = end_time - os.stat(path).st_mtime
+        except OSError:
+            latency = float('nan')
+
+        logger.info("%s processed, latency %.1f s (%.1f s after detection)", filename, latency, end_time - ready_time)
+
+
+
+def process_experiments_batch(paths, directory_path, results_path, dilution_prefix, replicate_prefix, cache_directory):
+
+    """
+    process a batch of ExperimentSummary.csv files in a worker process
+
+        returns
+        ----------
+        for each file, its experiment name, the error message if the processing failed (else None) and the end time
+
+    """
+
+    results = []
+
+    for path in paths:
+
+        filename = get_experiment_root(Path(path).name.replace("-ExperimentSummary.csv", ""))
+
+        try:
+            process_experiment(path, filename, directory_path, results_path, dilution_prefix, replicate_prefix, cache_directory)
+            error = None
+        except Exception as exception:
+            error = repr(exception)
+
+        results.append((filename, error, time.time()))
+
+    return results
+
+
+
+def process_experiment(path, filename, directory_path, results_path, dilution_prefix, replicate_prefix, cache_directory):
+
+    """
+    extract the data of one experiment, export it in csv format and plot its size distributions
+
+    """
+
+    experiment_data = extract_experiment_data(directory_path, filename, path, dilution_prefix, replicate_prefix, cache_directory)
+
+    data = assemble_nanosight_data([experiment_data], directory_path)
+
+    create_directory([results_path, filename])
+    savepath = os.path.join(results_path, filename)
+
+    for key in data:
+        if hasattr(data[key], 'to_csv'):
+            data[key].to_csv(os.path.join(savepath, key+'.csv'), index=True)
+
+    dataset = data['dataset']
+    videos_concentrations = dataset.get_videos(filename)
+
+    plot_size_distributions(dataset.bin_centers, list(videos_concentrations), savepath=savepath, name=filename, title=filename,
+                            list_legend_labels=['Video '+str(k+1) for k in range(len(videos_concentrations))])
@@ -0,0 +1,86 @@
+import sys
+import argparse
+import logging
+from pathlib import Path
+
+# plots are only saved, no display is needed
+import matplotlib
+matplotlib.use('Agg')
+
+from paths import resultspath
+from app_tools.batch_tools import find_data_directories, find_duplicate_names, process_data_directories, format_batch_summary
+from data_extraction_module.parse_cache import clear_parse_cache
+
+
+def main():
+
+    """
+    parse the arguments, then process the data directories in worker processes
+
+    """
+
+    parser = argparse.ArgumentParser(description='process several Nanosight data directories without graphical interface '
+                                                 '(extraction, csv export, plots and clustering of each directory)')
+    parser.add_argument('directories', nargs='+', help="data directories or glob patterns, e.g. 'data/2024-*' (quoted, '**' matches subdirectories)")
+    parser.add_argument('--dilution-prefix', default=None, help='dilution prefix to consider when reading file names')
+    parser.add_argument('--replicate-prefix', default=None, help='replicate prefix to consider when reading file names')
+    parser.add_argument('--output', default=None, help='directory where the results of each data directory are written (default: nanosight_app_results)')
+    parser.add_argument('--n-workers', type=int, default=2, help='number of directories processed in parallel (default: 2, -1: as many as cpus)')
+    parser.add_argument('--no-plots', action='store_true', help='do not plot the size distributions and attributes')
+    parser.add_argument('--no-clustering', action='store_true', help='do not run the clustering of the size distributions')
+    parser.add_argument('--binary-export', choices=['parquet', 'feather'], default=None,
+                        help='also export the data in this binary format, reloaded faster than csv files')
+    parser.add_argument('--force', nargs='+', metavar='PATTERN', default=None,
+                        help="write again the outputs matching these patterns even if their inputs did not change, e.g. '*_barplot.png' ('*' for all)")
+    parser.add_argument('--no-cache', action='store_true', help='parse all export files again, without reading or writing the parse cache')
+    parser.add_argument('--clear-cache', action='store_true', help='remove all entries of the parse cache before running')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+
+    results_root = Path(resultspath if args.output is None else args.output).resolve()
+
+    if args.clear_cache:
+        clear_parse_cache(Path(results_root, '.parse_cache'))
+
+
+    directories, unmatched_patterns = find_data_directories(args.directories)
+
+    for pattern in unmatched_patterns:
+        logging.warning("no directory matches %s", pattern)
+
+    if len(directories) == 0:
+        logging.error("no data directory to process")
+        sys.exit(2)
+
+    # the results of a directory are written in a directory of the same name, two directories cannot share a name
+    duplicate_names = find_duplicate_names(directories)
+    if len(duplicate_names) > 0:
+        for name, paths in duplicate_names.items():
+            logging.error("several data directories are named %s: %s", name, ', '.join(paths))
+        sys.exit(2)
+
+
+    results = process_data_directories(directories, results_root, n_workers=args.n_workers,
+                                       dilution_prefix=args.dilution_prefix,
+                                       replicate_prefix=args.replicate_prefix,
+                                       use_cache=not args.no_cache,
+                                       binary_export_format=args.binary_export,
+                                       force_outputs=args.force,
+                                       plots=not args.no_plots,
+                                       clustering=not args.no_clustering)
+
+    print(format_batch_summary(results))
+
+    # non-zero exit code if any directory failed, e.g. for scripts and schedulers
+    if any(result['status'] != 'ok' for result in results):
+        sys.exit(1)
+
+
+
+# the worker processes are started with spawn on macos and windows, they import this module again: the batch must only
+# run in the main process
+if __name__ == '__main__':
+
+    main()
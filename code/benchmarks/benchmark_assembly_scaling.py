@@ -0,0 +1,73 @@
+
+"""
+check that the concatenation of per-file results grows linearly with the number of files
+
+run from the code directory:
+    python -m benchmarks.benchmark_assembly_scaling
+
+"""
+
+import time
+import tempfile
+from pathlib import Path
+
+from benchmarks.synthetic_exports import write_experiment_summary_file
+from data_extraction_module.nanosight_data_extraction import extract_experiment_data, concatenate_experiments_data
+
+
+
+
+def relabel_experiment_data(experiment_data, filename, new_filename):
+
+    """
+    copy the output of extract_experiment_data under a new filename
+
+    """
+
+    file_infos, size_distributions, size_concentration_attributes, metadata = [df.copy() for df in experiment_data]
+
+    file_infos.index = [new_filename]
+    file_infos['Sample name'] = new_filename
+    size_distributions.columns = [col.replace(filename, new_filename) for col in size_distributions.columns]
+    size_concentration_attributes.index = [new_filename]
+    metadata.index = [new_filename]
+
+    return file_infos, size_distributions, size_concentration_attributes, metadata
+
+
+
+def run_benchmark(list_n_files=(250, 500, 1000, 2000, 4000), n_bins=1000, n_repeats=3):
+
+    with tempfile.TemporaryDirectory() as tmp_directory:
+
+        filepath = Path(tmp_directory, 'Sample 2024-05-06 10-00-00-ExperimentSummary.csv')
+        write_experiment_summary_file(filepath, bin_centers=[b + 0.5 for b in range(n_bins)])
+        experiment_data = extract_experiment_data(tmp_directory, 'Sample', filepath, None, None)
+
+    print(f"{'files':>8} {'time (s)':>10} {'per file (ms)':>14} {'growth vs previous':>20}")
+
+    previous = None
+
+    for n_files in list_n_files:
+
+        experiments_data = [relabel_experiment_data(experiment_data, 'Sample', f'Sample{i:05d}') for i in range(n_files)]
+
+        # keep the best of several runs to limit the noise
+        times = []
+        for _ in range(n_repeats):
+            start = time.perf_counter()
+            concatenate_experiments_data(experiments_data)
+            times.append(time.perf_counter() - start)
+        elapsed = min(times)
+
+        # with a linear assembly, doubling the number of files doubles the time
+        growth = '' if previous is None else f"x{elapsed / previous[1]:.2f} for x{n_files / previous[0]:.2f} files"
+        print(f"{n_files:>8} {elapsed:>10.3f} {1000 * elapsed / n_files:>14.3f} {growth:>20}")
+
+        previous = (n_files, elapsed)
+
+
+
+if __name__ == '__main__':
+
+    run_benchmark()
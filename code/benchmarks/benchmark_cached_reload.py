@@ -0,0 +1,88 @@
+"""
+time the reload of a synthetic Nanosight directory with the cache (parsed and reshaped experiments), as done by the
+app when a directory is loaded again, and compare it with an extraction without cache
+
+run from the code directory:
+    python -m benchmarks.benchmark_cached_reload
+    python -m benchmarks.benchmark_cached_reload --experiments 500 --bins 1000 --target 1
+
+the exit code is 1 if the warm reload is slower than the target or its outputs differ from the extraction without cache
+
+"""
+
+import sys
+import time
+import argparse
+import tempfile
+from pathlib import Path
+
+from benchmarks.synthetic_exports import generate_synthetic_directory
+from benchmarks.benchmark_parallel_extraction import are_identical
+from data_extraction_module.nanosight_data_extraction import extract_nanosight_data_from_directory
+
+
+
+
+def time_reload(directory_path, cache_directory, n_repeats=3):
+
+    """
+    time an extraction without cache, a first extraction filling the cache (cold) and the reloads using it (warm)
+
+        returns
+        ----------
+        a dictionary of the duration of each extraction in seconds (the fastest warm reload is kept)
+        True if the outputs of the warm reload are identical to the outputs of the extraction without cache
+
+    """
+
+    timings = {}
+
+    start = time.perf_counter()
+    reference_data = extract_nanosight_data_from_directory(directory_path, 'D', 'rep')
+    timings['no cache'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    extract_nanosight_data_from_directory(directory_path, 'D', 'rep', cache_directory=cache_directory)
+    timings['cold cache'] = time.perf_counter() - start
+
+    warm_timings = []
+    for _ in range(n_repeats):
+        start = time.perf_counter()
+        data = extract_nanosight_data_from_directory(directory_path, 'D', 'rep', cache_directory=cache_directory)
+        warm_timings.append(time.perf_counter() - start)
+    timings['warm cache'] = min(warm_timings)
+
+    return timings, are_identical(data, reference_data)
+
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='time the cached reload of a synthetic Nanosight directory')
+    parser.add_argument('--experiments', type=int, default=500, help='experiments of the synthetic directory (default: 500)')
+    parser.add_argument('--bins', type=int, default=1000, help='bins of each size distribution (default: 1000)')
+    parser.add_argument('--repeats', type=int, default=3, help='warm reloads, the fastest is kept (default: 3)')
+    parser.add_argument('--target', type=float, default=1.0, help='maximum duration of the warm reload in seconds (default: 1)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_directory:
+
+        directory_path = Path(tmp_directory, 'data')
+        generate_synthetic_directory(directory_path, args.experiments, n_bins=args.bins)
+
+        timings, identical = time_reload(directory_path, Path(tmp_directory, 'cache'), n_repeats=args.repeats)
+
+    print(f"{args.experiments} experiments, {args.bins} bins")
+    for name, elapsed in timings.items():
+        print(f"{name:>12}: {elapsed:.3f} s")
+    print(f"{'identical':>12}: {identical}")
+
+    if timings['warm cache'] > args.target or not identical:
+        print(f"the warm reload must take less than {args.target} s, with the outputs of the extraction without cache")
+        sys.exit(1)
+
+
+
+if __name__ == '__main__':
+
+    main()
@@ -0,0 +1,95 @@
+
+"""
+time each stage of the extraction of a synthetic Nanosight directory, to find which stage dominates
+
+run from the code directory:
+    python -m benchmarks.benchmark_extraction_stages
+
+"""
+
+import time
+import tempfile
+from pathlib import Path
+
+from benchmarks.synthetic_exports import generate_synthetic_directory
+from data_extraction_module.nanosight_export_files_listing import list_nanosight_files_in_directory
+from data_extraction_module.nanosight_export_files_reading import read_experiment_summary_file
+from data_extraction_module.nanosight_dataset import build_dataset_from_experiments
+from data_extraction_module.nanosight_data_extraction import (reshape_experiment_data, verify_bin_grids, concatenate_experiments_data,
+                                                              add_metadata_summary, group_samples_filenames,
+                                                              add_replicates_average_attributes)
+
+
+
+
+def time_stages(directory_path):
+
+    """
+    run the stages of extract_nanosight_data_from_directory one after the other (serial, without parse cache)
+
+        returns
+        ----------
+        a dictionary of the duration of each stage, in seconds
+
+    """
+
+    timings = {}
+
+    def timed(stage, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        timings[stage] = timings.get(stage, 0) + time.perf_counter() - start
+        return result
+
+    files_dic = timed('listing', list_nanosight_files_in_directory, directory_path)
+    filenames = sorted(files_dic.keys())
+
+    # all files are parsed first, then the reshape of each parsed file is timed alone (what extract_experiment_data does)
+    experiments_summary_data = [timed('reading', read_experiment_summary_file, Path(directory_path, files_dic[filename]['experiment_summary_file']))
+                                for filename in filenames]
+
+    experiments_data = [timed('reshape', reshape_experiment_data, experiment_summary_data, filename, 'D', 'rep')
+                        for filename, experiment_summary_data in zip(filenames, experiments_summary_data)]
+
+    experiments_data = timed('bin grids', verify_bin_grids, experiments_data, directory_path)
+
+    all_files_infos, all_size_concentration_attributes, all_metadata = timed('concatenation', concatenate_experiments_data, experiments_data)
+
+    all_metadata = timed('metadata summary', add_metadata_summary, all_metadata)
+
+    all_samples_filenames = timed('samples grouping', group_samples_filenames, all_files_infos)
+
+    # the dataset stage includes the aggregation of the replicates distributions, the replicates stage is the attributes
+    dataset = timed('dataset', build_dataset_from_experiments, [size_distributions for _, size_distributions, _, _ in experiments_data],
+                    filenames, all_samples_filenames)
+    timed('replicates', add_replicates_average_attributes, all_size_concentration_attributes, all_samples_filenames)
+
+    timed('wide size distributions', dataset.to_size_distributions)
+
+    return timings
+
+
+
+def run_benchmark(list_n_files=(100, 1000), n_bins=1000):
+
+    for n_files in list_n_files:
+
+        with tempfile.TemporaryDirectory() as directory_path:
+
+            generate_synthetic_directory(directory_path, n_files, n_bins=n_bins)
+
+            timings = time_stages(directory_path)
+
+        total = sum(timings.values())
+
+        print(f"{n_files} files, {n_bins} bins: {total:.2f} s")
+        print(f"{'stage':>24} {'time (s)':>9} {'per file (ms)':>14} {'share':>6}")
+        for stage, elapsed in timings.items():
+            print(f"{stage:>24} {elapsed:>9.3f} {1000 * elapsed / n_files:>14.3f} {100 * elapsed / total:>5.1f}%")
+        print()
+
+
+
+if __name__ == '__main__':
+
+    run_benchmark()
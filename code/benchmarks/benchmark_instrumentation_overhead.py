@@ -0,0 +1,81 @@
+
+"""
+time the extraction of a synthetic Nanosight directory with the instrumentation disabled (default), enabled, and
+enabled with tracemalloc, and the cost of a call to an instrumented function while the instrumentation is disabled
+
+run from the code directory:
+    python -m benchmarks.benchmark_instrumentation_overhead
+
+"""
+
+import time
+import tempfile
+import timeit
+
+from benchmarks.synthetic_exports import generate_synthetic_directory
+from app_tools.instrumentation import enable_instrumentation, disable_instrumentation, instrumented, span
+from data_extraction_module.nanosight_data_extraction import extract_nanosight_data_from_directory
+
+
+
+
+@instrumented('noop')
+def instrumented_noop():
+    pass
+
+
+def noop():
+    pass
+
+
+
+def time_extraction(directory_path, n_jobs=1):
+
+    # the parse cache is not used, so that every file is read
+    start = time.perf_counter()
+    extract_nanosight_data_from_directory(directory_path, 'D', 'rep', n_jobs=n_jobs)
+
+    return time.perf_counter() - start
+
+
+
+def run_benchmark(n_files=200, n_bins=1000, n_jobs=1, n_repeats=5):
+
+    n_calls = 10**6
+    noop_time = timeit.timeit(noop, number=n_calls) / n_calls
+    instrumented_time = timeit.timeit(instrumented_noop, number=n_calls) / n_calls
+    span_time = timeit.timeit(lambda: span('noop').__enter__(), number=n_calls) / n_calls
+    print(f"disabled instrumentation: {1e9 * (instrumented_time - noop_time):.0f} ns per instrumented call, "
+          f"{1e9 * span_time:.0f} ns per span")
+
+    with tempfile.TemporaryDirectory() as directory_path:
+
+        generate_synthetic_directory(directory_path, n_files, n_bins=n_bins)
+
+        # first extraction not timed (imports, file system cache)
+        time_extraction(directory_path, n_jobs=n_jobs)
+
+        # the modes are interleaved and the best time of each is kept, so that a slower period of the machine
+        # does not fall on one mode only
+        modes = {'disabled': None, 'enabled': False, 'tracemalloc': True}
+        timings = {mode: [] for mode in modes}
+
+        for _ in range(n_repeats):
+            for mode, trace_memory in modes.items():
+                if trace_memory is not None:
+                    enable_instrumentation(trace_memory=trace_memory)
+                timings[mode].append(time_extraction(directory_path, n_jobs=n_jobs))
+                tracer = disable_instrumentation()
+                if mode == 'enabled':
+                    n_spans = len(tracer.records)
+
+    print(f"{n_files} files, {n_bins} bins, {n_jobs} jobs ({n_spans} spans recorded)")
+    print(f"{'instrumentation':>16} {'time (s)':>9} {'overhead':>9}")
+    for mode in modes:
+        print(f"{mode:>16} {min(timings[mode]):>9.3f} {100 * (min(timings[mode]) / min(timings['disabled']) - 1):>8.1f}%")
+
+
+
+if __name__ == '__main__':
+
+    run_benchmark()
@@ -0,0 +1,73 @@
+
+"""
+compare serial and parallel extraction of synthetic Nanosight directories
+
+run from the code directory:
+    python -m benchmarks.benchmark_parallel_extraction
+
+"""
+
+import os
+import time
+import tempfile
+from pathlib import Path
+
+from benchmarks.synthetic_exports import generate_synthetic_directory
+from data_extraction_module.nanosight_data_extraction import extract_nanosight_data_from_directory
+
+
+
+
+def time_extraction(directory_path, **kwargs):
+
+    start = time.perf_counter()
+    data = extract_nanosight_data_from_directory(directory_path, dilution_prefix='D', replicate_prefix='rep', **kwargs)
+    return time.perf_counter() - start, data
+
+
+
+def are_identical(data, reference_data):
+
+    for key in reference_data:
+        if key == 'samples_filenames':
+            if data[key] != reference_data[key]:
+                return False
+        elif key == 'dataset':
+            # the arrays of the dataset are compared through its frames
+            if not all(frame.equals(reference_frame) for frame, reference_frame
+                       in zip(data[key].to_frames(), reference_data[key].to_frames())):
+                return False
+        elif not data[key].equals(reference_data[key]):
+            return False
+
+    return True
+
+
+
+def run_benchmark(list_n_experiments=(10, 100, 1000), n_bins=1000, n_jobs=-1):
+
+    n_workers = os.cpu_count() if n_jobs == -1 else n_jobs
+
+    print(f"{'experiments':>12} {'serial (s)':>12} {'process (s)':>12} {'thread (s)':>12} {'speedup':>8} {'identical':>10}")
+
+    with tempfile.TemporaryDirectory() as tmp_directory:
+
+        for n_experiments in list_n_experiments:
+
+            directory_path = Path(tmp_directory, f"{n_experiments}_experiments")
+            generate_synthetic_directory(directory_path, n_experiments, n_bins=n_bins)
+
+            serial_time, serial_data = time_extraction(directory_path)
+            process_time, process_data = time_extraction(directory_path, n_jobs=n_workers, executor='process')
+            thread_time, thread_data = time_extraction(directory_path, n_jobs=n_workers, executor='thread')
+
+            identical = are_identical(process_data, serial_data) and are_identical(thread_data, serial_data)
+
+            print(f"{n_experiments:>12} {serial_time:>12.2f} {process_time:>12.2f} {thread_time:>12.2f} "
+                  f"{serial_time/process_time:>8.2f} {str(identical):>10}")
+
+
+
+if __name__ == '__main__':
+
+    run_benchmark()
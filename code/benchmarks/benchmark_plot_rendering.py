@@ -0,0 +1,64 @@
+
+"""
+time the rendering of size distribution plots: a new figure per plot, reused figures, and a process pool
+
+run from the code directory:
+    python -m benchmarks.benchmark_plot_rendering
+
+"""
+
+import os
+import time
+import tempfile
+import numpy as np
+
+import matplotlib
+matplotlib.use('Agg')
+
+from data_analysis_module.plot_tools import plot_size_distributions, render_plots
+
+
+
+
+def get_plot_jobs(n_plots, savepath, n_bins=1000, n_videos=5, seed=0):
+
+    rng = np.random.default_rng(seed)
+    bin_centers = np.arange(n_bins) + 0.5
+
+    plot_jobs = []
+
+    for i in range(n_plots):
+        means = rng.uniform(80, 300, size=(n_videos, 1))
+        list_concentrations = list(1e8 * np.exp(-(bin_centers - means)**2 / (2 * 40**2)))
+        plot_jobs.append(('plot_size_distributions', dict(bin_centers=bin_centers, list_concentrations=list_concentrations, savepath=savepath,
+                                                          list_legend_labels=['Video '+str(k+1) for k in range(n_videos)],
+                                                          name=f'sample{i:04d}', title=f'sample{i:04d}')))
+
+    return plot_jobs
+
+
+
+def run_benchmark(n_plots=40, list_n_jobs=(2, -1)):
+
+    with tempfile.TemporaryDirectory() as tmp_directory:
+
+        plot_jobs = get_plot_jobs(n_plots, tmp_directory)
+
+        start = time.perf_counter()
+        for _, kwargs in plot_jobs:
+            plot_size_distributions(**kwargs)
+        print(f"{'new figure per plot':>24}: {n_plots} plots in {time.perf_counter() - start:.2f} s")
+
+        report = render_plots(plot_jobs, n_jobs=1)
+        print(f"{'reused figure':>24}: {report['n_plots']} plots in {report['render_time']:.2f} s")
+
+        for n_jobs in list_n_jobs:
+            report = render_plots(plot_jobs, n_jobs=n_jobs)
+            print(f"{'process pool':>24}: {report['n_plots']} plots in {report['render_time']:.2f} s "
+                  f"({report['n_workers']} workers, {os.cpu_count()} cpus)")
+
+
+
+if __name__ == '__main__':
+
+    run_benchmark()
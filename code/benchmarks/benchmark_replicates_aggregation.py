@@ -0,0 +1,115 @@
+
+"""
+time the aggregation of replicates (size distributions and size and concentration attributes of each sample)
+against the previous loop over samples
+
+run from the code directory:
+    python -m benchmarks.benchmark_replicates_aggregation
+
+"""
+
+import time
+import warnings
+import numpy as np
+import pandas
+
+from data_extraction_module.nanosight_data_extraction import (add_replicates_average_size_distributions,
+                                                              add_replicates_average_attributes)
+
+
+
+
+def generate_replicates_data(n_files, n_replicates=3, n_bins=1000, n_videos=5, seed=0):
+
+    """
+    size distributions and size and concentration attributes of n_files files, replicates of n_files/n_replicates samples
+
+    """
+
+    rng = np.random.default_rng(seed)
+
+    filenames = ['Sample'+str(i // n_replicates)+' rep'+str(i % n_replicates + 1) for i in range(n_files)]
+
+    samples_filenames = {}
+    for filename in filenames:
+        sample_name, replicate = filename.split(' ')
+        samples_filenames.setdefault(sample_name+' ', []).append(replicate)
+
+    size_distributions = {'Bin centers': np.arange(n_bins) + 0.5}
+    for filename in filenames:
+        size_distributions['Average '+filename] = rng.uniform(0, 1e9, n_bins)
+        size_distributions['Std '+filename] = rng.uniform(0, 1e8, n_bins)
+    size_distributions = pandas.DataFrame(size_distributions)
+
+    attributes_columns = [attribute+' '+statistic for attribute in ['Total concentration', 'Mean size', 'Mode size', 'SD size', 'D50 size', 'D90 size']
+                          for statistic in ['Video '+str(k+1) for k in range(n_videos)] + ['Average', 'Std']]
+    size_concentration_attributes = pandas.DataFrame(rng.uniform(0, 1e9, (n_files, len(attributes_columns))),
+                                                     index=filenames, columns=attributes_columns)
+
+    return size_distributions, size_concentration_attributes, samples_filenames
+
+
+
+def aggregate_replicates_with_loop(size_distributions, size_concentration_attributes, samples_filenames):
+
+    """
+    previous implementation: one sample at a time, columns and rows inserted one by one
+
+    """
+
+    for sample_name, replicates_filenames in samples_filenames.items():
+
+        all_replicates_size_distributions = size_distributions[['Average '+sample_name+filename for filename in replicates_filenames]]
+        size_distributions['Average '+sample_name] = np.mean(all_replicates_size_distributions, axis=1)
+        size_distributions['Std '+sample_name] = np.std(all_replicates_size_distributions, axis=1)
+
+    for sample_name, replicates_filenames in samples_filenames.items():
+
+        all_replicates_values = size_concentration_attributes.loc[[sample_name+filename for filename in replicates_filenames]]
+        size_concentration_attributes.loc[sample_name] = all_replicates_values.mean()
+
+        cols_to_write_nan = [col for col in size_concentration_attributes.columns if ('Video' in col or 'Std' in col)]
+        size_concentration_attributes.loc[sample_name, cols_to_write_nan] = np.nan
+
+    return size_distributions, size_concentration_attributes
+
+
+
+def run_benchmark(list_n_files=(100, 1000, 3000), n_bins=1000):
+
+    print(f"{'files':>6} {'loop (s)':>9} {'matrix (s)':>11} {'speed-up':>9} {'median (s)':>11}")
+
+    for n_files in list_n_files:
+
+        size_distributions, size_concentration_attributes, samples_filenames = generate_replicates_data(n_files, n_bins=n_bins)
+
+        start = time.perf_counter()
+        with warnings.catch_warnings():
+            # inserting columns one by one fragments the dataframe, which is part of the cost of the loop
+            warnings.simplefilter('ignore', pandas.errors.PerformanceWarning)
+            loop_distributions, loop_attributes = aggregate_replicates_with_loop(size_distributions.copy(),
+                                                                                 size_concentration_attributes.copy(),
+                                                                                 samples_filenames)
+        loop_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        matrix_distributions = add_replicates_average_size_distributions(size_distributions, samples_filenames)
+        matrix_attributes = add_replicates_average_attributes(size_concentration_attributes, samples_filenames)
+        elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        add_replicates_average_size_distributions(size_distributions, samples_filenames, aggregation='median')
+        add_replicates_average_attributes(size_concentration_attributes, samples_filenames, aggregation='median')
+        median_elapsed = time.perf_counter() - start
+
+        # the loop computes the standard deviation with numpy, the matrix from the deviations to the sample means
+        assert np.allclose(loop_distributions.values, matrix_distributions[loop_distributions.columns].values, rtol=1e-10)
+        assert np.allclose(loop_attributes.values, matrix_attributes.values, rtol=1e-10, equal_nan=True)
+
+        print(f"{n_files:>6} {loop_elapsed:>9.3f} {elapsed:>11.3f} {loop_elapsed / elapsed:>8.1f}x {median_elapsed:>11.3f}")
+
+
+
+if __name__ == '__main__':
+
+    run_benchmark()
@@ -0,0 +1,66 @@
+
+"""
+time the Wasserstein distance matrix of run_wasserstein_clustering against a double loop over pairs of distributions
+
+run from the code directory:
+    python -m benchmarks.benchmark_wasserstein_distances
+
+"""
+
+import time
+import numpy as np
+from scipy.integrate import simpson
+from scipy.stats import wasserstein_distance
+
+from data_analysis_module.clustering import compute_wasserstein_distance_matrix
+
+
+
+
+def generate_normalized_distributions(n_distributions, bin_centers, seed=0):
+
+    rng = np.random.default_rng(seed)
+
+    means = rng.uniform(80, 400, size=(n_distributions, 1))
+    stds = rng.uniform(20, 80, size=(n_distributions, 1))
+
+    distributions = np.exp(-(bin_centers - means)**2 / (2 * stds**2))
+
+    return distributions / simpson(x=bin_centers, y=distributions, axis=1)[:, None]
+
+
+
+def run_benchmark(list_n_distributions=(100, 500, 2000), n_bins=1000, n_loop_pairs=2000):
+
+    bin_centers = np.arange(n_bins) + 0.5
+
+    print(f"{'distributions':>14} {'matrix (s)':>11} {'double loop, estimated (s)':>27} {'speed-up':>9}")
+
+    for n_distributions in list_n_distributions:
+
+        distributions = generate_normalized_distributions(n_distributions, bin_centers)
+
+        start = time.perf_counter()
+        distance_matrix = compute_wasserstein_distance_matrix(bin_centers, distributions)
+        elapsed = time.perf_counter() - start
+
+        # the double loop is timed on a subset of pairs and extrapolated to all pairs
+        n_pairs = n_distributions * (n_distributions - 1) // 2
+        pairs = [(i, j) for i in range(n_distributions) for j in range(i+1, n_distributions)][:n_loop_pairs]
+
+        start = time.perf_counter()
+        for i, j in pairs:
+            distance = wasserstein_distance(bin_centers, bin_centers, distributions[i], distributions[j])
+        loop_elapsed = (time.perf_counter() - start) * n_pairs / len(pairs)
+
+        # the last pair of the loop checks the matrix; scipy treats the bins as point masses and the matrix
+        # integrates the CDFs with the trapezoid rule, so both differ slightly for distributions cut by the grid
+        assert np.isclose(distance, distance_matrix[i, j], rtol=1e-2)
+
+        print(f"{n_distributions:>14} {elapsed:>11.3f} {loop_elapsed:>27.3f} {loop_elapsed / elapsed:>8.1f}x")
+
+
+
+if __name__ == '__main__':
+
+    run_benchmark()
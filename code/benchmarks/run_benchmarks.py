@@ -0,0 +1,227 @@
+
+"""
+time each stage of the pipeline on synthetic Nanosight directories of several sizes, save the results in a JSON file,
+and compare them with the results of a previous run (baseline) to detect regressions of the load time
+
+run from the code directory:
+    python -m benchmarks.run_benchmarks --output results.json
+    python -m benchmarks.run_benchmarks --baseline results.json
+
+the exit code is 1 if a stage is slower than in the baseline by more than the threshold
+
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tempfile
+from pathlib import Path
+
+import numpy as np
+import pandas
+import scipy
+
+from benchmarks.synthetic_exports import generate_synthetic_directory
+from benchmarks.benchmark_extraction_stages import time_stages
+from data_extraction_module.nanosight_data_extraction import extract_nanosight_data_from_directory
+from data_extraction_module.nanosight_particle_size_distributions import compute_particle_size_distributions
+from data_analysis_module.derived_quantities import compute_derived_quantities
+
+
+
+# version of the results file, to increment when the stages or the synthetic data change
+# (results of another version are not compared)
+results_version = 4
+
+# stages faster than this in the baseline (in seconds) are not compared, their timings are mostly noise
+default_min_time = 0.005
+
+
+
+
+def time_pipeline(directory_path, particle_files=False, n_bins=1000):
+
+    """
+    time the stages of the pipeline on a directory, once
+
+        returns
+        ----------
+        a dictionary of the duration of each stage, in seconds
+
+    """
+
+    # stages of the extraction, run one after the other (see benchmark_extraction_stages.py)
+    timings = time_stages(directory_path)
+
+    start = time.perf_counter()
+    data = extract_nanosight_data_from_directory(directory_path, 'D', 'rep')
+    timings['full extraction'] = time.perf_counter() - start
+
+    # load with the cache of the parsed and reshaped experiments, empty then filled (see benchmark_cached_reload.py)
+    with tempfile.TemporaryDirectory() as cache_directory:
+        for stage in ['cold cache extraction', 'warm cache extraction']:
+            start = time.perf_counter()
+            extract_nanosight_data_from_directory(directory_path, 'D', 'rep', cache_directory=cache_directory)
+            timings[stage] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    compute_derived_quantities(data)
+    timings['derived quantities'] = time.perf_counter() - start
+
+    if particle_files:
+        for source in ['all_tracks', 'particle_data']:
+            start = time.perf_counter()
+            compute_particle_size_distributions(directory_path, 'D', 'rep', np.arange(n_bins) + 0.5, source=source)
+            timings[source.replace('_', ' ')+' distributions'] = time.perf_counter() - start
+
+    return timings
+
+
+
+def run_suite(scales=(10, 100, 1000), n_bins=1000, n_videos=5, n_repeats=3, particle_files=False):
+
+    """
+    time the pipeline on a synthetic directory of each scale
+
+        parameters
+        ----------
+        scales: numbers of experiments of the synthetic directories
+        n_bins, n_videos: bins and videos of each experiment
+        n_repeats: number of runs at each scale, the fastest time of each stage is kept
+        particle_files: if True, AllTracks and ParticleData files are also written and the distributions computed from them
+
+        returns
+        ----------
+        a dictionary with the environment, the configuration and, for each scale, the time of each stage in seconds
+
+    """
+
+    results = {'version': results_version,
+               'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+               'environment': {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pandas.__version__,
+                               'scipy': scipy.__version__, 'platform': platform.platform(), 'cpu_count': os.cpu_count()},
+               'config': {'scales': list(scales), 'n_bins': n_bins, 'n_videos': n_videos, 'n_repeats': n_repeats,
+                          'particle_files': particle_files},
+               'timings': {}}
+
+    for n_experiments in scales:
+
+        with tempfile.TemporaryDirectory() as directory_path:
+
+            generate_synthetic_directory(directory_path, n_experiments, n_videos=n_videos, n_bins=n_bins,
+                                         particle_files=('AllTracks', 'ParticleData') if particle_files else ())
+
+            runs = [time_pipeline(directory_path, particle_files=particle_files, n_bins=n_bins) for _ in range(n_repeats)]
+
+        results['timings'][str(n_experiments)] = {stage: min(run[stage] for run in runs) for stage in runs[0]}
+
+        print(f"{n_experiments} experiments: full extraction {results['timings'][str(n_experiments)]['full extraction']:.3f} s")
+
+    return results
+
+
+
+def compare_results(results, baseline, threshold=0.2, min_time=default_min_time):
+
+    """
+    compare the timings of two runs of run_suite, stage by stage at the scales of both
+
+        parameters
+        ----------
+        results: the results of the current run
+        baseline: the results of the reference run
+        threshold: relative slowdown above which a stage is a regression (default: 0.2, 20 % slower)
+        min_time: stages faster than this in the baseline are not flagged, in seconds
+
+        returns
+        ----------
+        a list of rows (scale, stage, baseline time, time, ratio, is regression)
+
+    """
+
+    if baseline.get('version') != results.get('version'):
+        raise ValueError("The baseline was saved by another version of the benchmarks", baseline.get('version'))
+
+    rows = []
+
+    for scale, timings in results['timings'].items():
+
+        if scale not in baseline['timings']:
+            continue
+
+        for stage, elapsed in timings.items():
+
+            if stage not in baseline['timings'][scale]:
+                continue
+
+            baseline_elapsed = baseline['timings'][scale][stage]
+            ratio = elapsed / baseline_elapsed if baseline_elapsed > 0 else np.nan
+            is_regression = baseline_elapsed >= min_time and ratio > 1 + threshold
+
+            rows.append((scale, stage, baseline_elapsed, elapsed, ratio, is_regression))
+
+    return rows
+
+
+
+def format_comparison(rows):
+
+    lines = [f"{'scale':>6} {'stage':>28} {'baseline (s)':>13} {'time (s)':>9} {'ratio':>6}"]
+
+    for scale, stage, baseline_elapsed, elapsed, ratio, is_regression in rows:
+        lines.append(f"{scale:>6} {stage:>28} {baseline_elapsed:>13.4f} {elapsed:>9.4f} {ratio:>6.2f}" + ("  REGRESSION" if is_regression else ""))
+
+    return '\n'.join(lines)
+
+
+
+def save_results(results, filepath):
+
+    tmp_path = Path(str(filepath) + f".{os.getpid()}.tmp")
+    with open(tmp_path, 'w') as write_obj:
+        json.dump(results, write_obj, indent=1)
+    os.replace(tmp_path, filepath)
+
+
+
+def load_results(filepath):
+
+    with open(filepath, 'r') as read_obj:
+        return json.load(read_obj)
+
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='time the pipeline stages on synthetic Nanosight directories')
+    parser.add_argument('--scales', type=int, nargs='+', default=[10, 100, 1000], help='numbers of experiments of the synthetic directories')
+    parser.add_argument('--bins', type=int, default=1000, help='number of bins of the size distributions')
+    parser.add_argument('--videos', type=int, default=5, help='number of videos of each experiment')
+    parser.add_argument('--repeats', type=int, default=3, help='runs at each scale, the fastest time of each stage is kept')
+    parser.add_argument('--particle-files', action='store_true', help='also time the distributions computed from AllTracks and ParticleData files')
+    parser.add_argument('--output', metavar='FILE', default=None, help='save the results in this JSON file (e.g. to use it as a baseline)')
+    parser.add_argument('--baseline', metavar='FILE', default=None, help='compare the results with the results saved in this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.2, help='relative slowdown of a stage reported as a regression (default: 0.2)')
+    args = parser.parse_args()
+
+    results = run_suite(scales=args.scales, n_bins=args.bins, n_videos=args.videos, n_repeats=args.repeats,
+                        particle_files=args.particle_files)
+
+    if args.output is not None:
+        save_results(results, args.output)
+
+    if args.baseline is not None:
+
+        baseline = load_results(args.baseline)
+
+        if baseline['config'] != dict(results['config'], scales=baseline['config']['scales']):
+            print('warning: the baseline was run with another configuration', baseline['config'])
+
+        rows = compare_results(results, baseline, threshold=args.threshold)
+        print(format_comparison(rows))
+
+        if any(is_regression for *_, is_regression in rows):
+            sys.exit(1)
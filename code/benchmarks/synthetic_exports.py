@@ -0,0 +1,226 @@
+
+import os
+from pathlib import Path
+import numpy as np
+
+
+
+
+def write_experiment_summary_file(filepath, n_videos=5, bin_centers=None, autosampler=True, seed=0):
+
+    """
+    write a synthetic Nanosight ExperimentSummary.csv file
+    the layout follows the one expected by read_experiment_summary_file
+
+        parameters
+        ----------
+        filepath: path of the file to write
+        n_videos: number of videos of the experiment
+        bin_centers: bin centers of the size distributions (default: 0.5 to 999.5 nm, step 1 nm)
+        autosampler: if False, add the 'Concentration average' and 'Standard Error' columns written by the Nanosight software
+        seed: seed of the random generator used to draw the distributions
+
+    """
+
+    rng = np.random.default_rng(seed)
+
+    if bin_centers is None:
+        bin_centers = np.arange(0.5, 1000, 1.)
+    bin_centers = np.asarray(bin_centers, dtype=float)
+
+    # each video is a log-normal like distribution around a random mode
+    mode = rng.uniform(80, 200)
+    concentrations = np.array([rng.uniform(1e6, 1e7) * np.exp(-0.5 * (np.log(bin_centers / (mode * rng.uniform(0.95, 1.05))) / 0.3)**2)
+                               for _ in range(n_videos)])
+
+    totals = (concentrations * np.gradient(bin_centers)).sum(axis=1)
+    videos = ['Video '+str(k+1) for k in range(n_videos)]
+    n_columns = n_videos + 3
+
+    def row(*fields):
+        fields = [str(field) for field in fields]
+        return ','.join(fields + [''] * (n_columns - len(fields)))
+
+    lines = [row('NTA Version', 'NTA 3.4 Build 3.4.4'),
+             row('Script Used', 'synthetic'),
+             row('Sample Name', Path(filepath).name.replace('-ExperimentSummary.csv', '')),
+             row('Diluent', 'Water'),
+             '',
+             row('[Results]', *videos, 'Average', 'Std Err'),
+             row('Concentration (Particles / ml)', *['%.6E' % total for total in totals]),
+             row('Particles per frame', *['%.1f' % p for p in rng.uniform(20, 80, n_videos)]),
+             row('Particles per frame', *['%.2f' % p for p in rng.uniform(1, 5, n_videos)]),
+             row('Validity of concentration measurement', *['Valid'] * n_videos),
+             row('Noise level', *rng.choice(['No', 'No', 'No', 'Yes'], n_videos)),
+             row('Noise level', *['%.1f' % p for p in rng.uniform(0, 1, n_videos)]),
+             '',
+             row('[Size Data]'),
+             row('Mean', *['%.1f' % p for p in rng.uniform(100, 150, n_videos)]),
+             row('Mode', *['%.1f' % p for p in rng.uniform(80, 120, n_videos)]),
+             row('SD', *['%.1f' % p for p in rng.uniform(30, 60, n_videos)]),
+             row('D10', *['%.1f' % p for p in rng.uniform(60, 80, n_videos)]),
+             row('D50', *['%.1f' % p for p in rng.uniform(100, 130, n_videos)]),
+             row('D90', *['%.1f' % p for p in rng.uniform(180, 220, n_videos)]),
+             '',
+             'Graph Data,']
+
+    header = ['Bin centre (nm)'] + ['Concentration (particles / ml)'] * n_videos
+    if not autosampler:
+        header += ['Concentration average', 'Standard Error']
+    lines.append(','.join(header) + ',')
+
+    for b, bin_center in enumerate(bin_centers):
+        values = ['%.6E' % c for c in concentrations[:, b]]
+        if not autosampler:
+            values += ['%.6E' % concentrations[:, b].mean(), '%.6E' % concentrations[:, b].std()]
+        lines.append(','.join(['%g' % bin_center] + values) + ',')
+
+    lines += ['',
+              'Percentile,Size (nm)',
+              '10,%.1f' % rng.uniform(60, 80),
+              '50,%.1f' % rng.uniform(100, 130),
+              '90,%.1f' % rng.uniform(180, 220)]
+
+    with open(filepath, 'w', encoding='ISO-8859-1') as write_obj:
+        write_obj.write('\n'.join(lines) + '\n')
+
+
+
+def write_particle_file(filepath, kind='AllTracks', n_frames=30, n_tracks=200, mode=None, description=False, seed=0):
+
+    """
+    write a synthetic Nanosight AllTracks.csv or ParticleData.csv file (one video)
+    the layout follows the one expected by iter_particle_file_chunks
+
+        parameters
+        ----------
+        filepath: path of the file to write
+        kind: 'AllTracks' (one row per particle and frame, sorted by frame) or 'ParticleData' (one row per track,
+              with its first frame)
+        n_frames: number of frames of the video
+        n_tracks: number of particles tracked during the video
+        mode: mode of the size distribution in nm (default: drawn at random)
+        description: if True, rows describing the experiment precede the header, as in some exports
+        seed: seed of the random generator
+
+    """
+
+    if kind not in ['AllTracks', 'ParticleData']:
+        raise ValueError("Unknown particle file kind, expected 'AllTracks' or 'ParticleData'", kind)
+
+    rng = np.random.default_rng(seed)
+
+    if mode is None:
+        mode = rng.uniform(80, 200)
+
+    # each particle is tracked during consecutive frames, with a log-normal size and a random walk in the field of view
+    sizes = mode * np.exp(0.3 * rng.standard_normal(n_tracks))
+    first_frames = rng.integers(0, n_frames, n_tracks)
+    lengths = np.minimum(rng.integers(5, 30, n_tracks), n_frames - first_frames)
+
+    if kind == 'ParticleData':
+        header = ['Particle ID', 'Frame', 'x', 'y', 'Size/nm']
+        rows = np.column_stack([np.arange(n_tracks), first_frames, rng.uniform(0, 1280, n_tracks), rng.uniform(0, 1024, n_tracks), sizes])
+
+    else:
+        header = ['Frame', 'Track ID', 'x', 'y', 'Size']
+        track_ids = np.repeat(np.arange(n_tracks), lengths)
+        # frames of each row: first frame of its track plus its position in the track
+        frames = first_frames[track_ids] + np.arange(len(track_ids)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        x = rng.uniform(0, 1280, n_tracks)[track_ids] + np.cumsum(rng.normal(0, 1, len(track_ids)))
+        y = rng.uniform(0, 1024, n_tracks)[track_ids] + np.cumsum(rng.normal(0, 1, len(track_ids)))
+        rows = np.column_stack([frames, track_ids, x, y, sizes[track_ids]])
+        rows = rows[np.argsort(frames, kind='stable')]
+
+    lines = []
+    if description:
+        lines += ['NTA Version,NTA 3.4 Build 3.4.4',
+                  'Sample Name,'+Path(filepath).name.replace('-'+kind+'.csv', ''),
+                  'Camera Type,sCMOS',
+                  'Temperature,22.0',
+                  '']
+    lines.append(','.join(header))
+    lines += ['%d,%d,%.2f,%.2f,%.4f' % tuple(row) for row in rows]
+
+    with open(filepath, 'w', encoding='ISO-8859-1') as write_obj:
+        write_obj.write('\n'.join(lines) + '\n')
+
+
+
+def generate_synthetic_directory(directory_path, n_experiments, n_videos=5, n_bins=1000,
+                                 dilution_prefix='D', replicate_prefix='rep', n_replicates=3, 
+                                 sample_prefix='Sample', dilutions=(10, 100, 1000), separator=' ', timestamps=True,
+                                 autosampler=True, raw_variants=False, particle_files=(), n_frames=30, n_tracks=200):
+
+    """
+    write a directory of synthetic Nanosight exports
+
+        parameters
+        ----------
+        directory_path: path of the directory to create
+        n_experiments: number of ExperimentSummary.csv files to write
+        n_videos: number of videos per experiment
+        n_bins: number of bins of the size distributions
+        dilution_prefix: dilution prefix used in the file names (None: no dilution in the file names)
+        replicate_prefix: replicate prefix used in the file names (None: no replicates, each experiment is a sample)
+        n_replicates: number of replicates per sample
+        sample_prefix: beginning of the sample names, followed by the sample number
+        dilutions: dilution factors, given to the samples in turn
+        separator: separator between the sample name, the dilution and the replicate in the file names
+        timestamps: if True, the date and time of the experiment follow its name, as in the Nanosight exports
+        autosampler: if False, add the columns written by the Nanosight software for manual measurements
+        raw_variants: if True, also write the ExperimentSummary_raw.csv file of each experiment (and ParticleData_raw.csv
+                      files if ParticleData files are written), with the same content
+        particle_files: kinds of per-particle files written for each video, among 'AllTracks' and 'ParticleData'
+                        (default: none); the files of video k are named '<experiment>_00k-<kind>.csv'
+        n_frames, n_tracks: number of frames and of particles of each video of the per-particle files
+
+        returns
+        ----------
+        the list of the experiment names written
+
+    """
+
+    os.makedirs(directory_path, exist_ok=True)
+
+    bin_centers = np.arange(n_bins) + 0.5
+
+    if replicate_prefix is None:
+        n_replicates = 1
+
+    experiments = []
+
+    for i in range(n_experiments):
+
+        sample_index, replicate_index = divmod(i, n_replicates)
+
+        name_parts = [sample_prefix + str(sample_index)]
+        if dilution_prefix is not None:
+            name_parts.append(dilution_prefix + str(dilutions[sample_index % len(dilutions)]))
+        if replicate_prefix is not None:
+            name_parts.append(replicate_prefix + str(replicate_index + 1))
+        experiment = separator.join(name_parts)
+
+        if timestamps:
+            experiment_filename = experiment + f" 2024-05-06 {10 + i // 3600 % 10:02d}-{i // 60 % 60:02d}-{i % 60:02d}"
+        else:
+            experiment_filename = experiment
+
+        suffixes = ['', '_raw'] if raw_variants else ['']
+
+        for suffix in suffixes:
+            write_experiment_summary_file(Path(directory_path, experiment_filename + '-ExperimentSummary' + suffix + '.csv'),
+                                          n_videos=n_videos, bin_centers=bin_centers, autosampler=autosampler, seed=i)
+
+        # the videos of an experiment share the size distribution of its particles
+        mode = np.random.default_rng(i).uniform(80, 200)
+
+        for kind in particle_files:
+            for k in range(n_videos):
+                for suffix in (suffixes if kind == 'ParticleData' else ['']):
+                    write_particle_file(Path(directory_path, f"{experiment_filename}_{k+1:03d}-{kind}{suffix}.csv"), kind=kind,
+                                        n_frames=n_frames, n_tracks=n_tracks, mode=mode, seed=n_videos*i + k)
+
+        experiments.append(experiment)
+
+    return experiments
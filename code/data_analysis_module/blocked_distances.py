@@ -0,0 +1,198 @@
+
+import os
+import json
+import hashlib
+import numpy as np
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from scipy.spatial.distance import cdist
+
+
+
+# default memory used by the tiles being computed, in bytes, all workers together
+default_max_memory = 2 * 1024**3
+
+
+
+def compute_blocked_distances(rows, distances_directory, metric='cityblock', max_memory=default_max_memory, n_jobs=1,
+                              dtype=np.float64):
+
+    """
+    pairwise distances between the rows of a matrix, computed tile by tile and written in a condensed array on disk
+    (the same layout as scipy.spatial.distance.pdist), so that the full matrix never has to fit in memory
+
+    the state of the computation is kept in distances_directory: the rows, the condensed distances and one flag per
+    finished tile. A tile is flagged only once its distances are written to disk, so if the computation is interrupted,
+    calling the function again with the same rows resumes from the finished tiles
+
+        parameters
+        ----------
+        rows: numpy array of shape (number of rows, number of features), e.g. weighted CDFs of size distributions
+        distances_directory: directory of the files of the computation
+        metric: metric of scipy.spatial.distance.cdist
+        max_memory: maximum memory in bytes used by the tiles being computed, all workers together;
+                    it sets the size of the tiles
+        n_jobs: number of tiles computed in parallel in a process pool (default: 1; -1: as many as cpus)
+        dtype: dtype of the stored distances (np.float32 halves the size on disk)
+
+        returns
+        ----------
+        the condensed distances, as a read-only numpy memmap of length n * (n - 1) / 2
+
+    """
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+
+    rows = np.ascontiguousarray(rows, dtype=np.float64)
+    n_rows, n_features = rows.shape
+
+    if n_rows < 2:
+        raise ValueError("At least two rows are needed to compute distances", n_rows)
+
+    block_size = get_block_size(n_rows, n_features, max_memory, n_jobs)
+
+    os.makedirs(distances_directory, exist_ok=True)
+
+    rows_path = Path(distances_directory, 'rows.npy')
+    distances_path = Path(distances_directory, 'distances.npy')
+    tiles_path = Path(distances_directory, 'finished_tiles.npy')
+    infos_path = Path(distances_directory, 'infos.json')
+
+    infos = {'n_rows': n_rows, 'n_features': n_features, 'metric': metric, 'dtype': np.dtype(dtype).str,
+             'rows_hash': hashlib.sha1(rows.tobytes()).hexdigest(), 'block_size': block_size}
+
+    """
+    resume a previous computation of the same distances if any, else start from scratch
+
+    """
+
+    previous_infos = read_infos(infos_path)
+
+    if previous_infos is not None and tiles_path.exists() and distances_path.exists() and rows_path.exists() and \
+            all(previous_infos.get(key) == value for key, value in infos.items() if key != 'block_size') and \
+            previous_infos['block_size'] <= block_size:
+
+        # the finished tiles are only valid with the same tiling, kept if it fits in the memory ceiling
+        block_size = previous_infos['block_size']
+        finished_tiles = np.load(tiles_path, mmap_mode='r+')
+
+    else:
+
+        # the infos are removed first, so that an interrupted initialization is never resumed
+        if infos_path.exists():
+            os.remove(infos_path)
+
+        np.save(rows_path, rows)
+
+        distances = np.lib.format.open_memmap(distances_path, mode='w+', dtype=dtype, shape=(n_rows * (n_rows - 1) // 2,))
+        distances.flush()
+        del distances
+
+        n_blocks = -(-n_rows // block_size)
+        finished_tiles = np.lib.format.open_memmap(tiles_path, mode='w+', dtype=np.uint8, shape=(n_blocks, n_blocks))
+        finished_tiles.flush()
+
+        with open(infos_path, 'w') as write_obj:
+            json.dump(infos, write_obj)
+
+    """
+    compute the missing tiles, i.e. the blocks of rows i and columns j >= i not flagged yet
+
+    """
+
+    n_blocks = finished_tiles.shape[0]
+
+    missing_tiles = [(i, j) for i in range(n_blocks) for j in range(i, n_blocks) if not finished_tiles[i, j]]
+
+    tasks_args = [(distances_directory, i * block_size, min((i+1) * block_size, n_rows),
+                   j * block_size, min((j+1) * block_size, n_rows), metric) for i, j in missing_tiles]
+
+    if n_jobs == 1 or len(tasks_args) < 2:
+
+        for tile, task_args in zip(missing_tiles, tasks_args):
+            compute_distance_tile(*task_args)
+            set_tile_finished(finished_tiles, tile)
+
+    else:
+
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool_executor:
+
+            futures = {pool_executor.submit(compute_distance_tile, *task_args): tile
+                       for tile, task_args in zip(missing_tiles, tasks_args)}
+
+            for future in as_completed(futures):
+                # raises the exception of the worker if any, the tiles finished before stay flagged
+                future.result()
+                set_tile_finished(finished_tiles, futures[future])
+
+    del finished_tiles
+
+    return np.load(distances_path, mmap_mode='r')
+
+
+
+def get_block_size(n_rows, n_features, max_memory, n_jobs):
+
+    """
+    largest number of rows of a tile such that n_jobs tiles fit in max_memory
+    a tile of b rows uses the b x b distances and a copy of two blocks of b rows
+
+    """
+
+    # n_jobs * 8 * (b**2 + 2 * b * n_features) <= max_memory
+    block_size = int(-n_features + np.sqrt(n_features**2 + max_memory / (8 * n_jobs)))
+
+    if block_size < 1:
+        raise ValueError("The memory ceiling is too low for one row of distances", max_memory)
+
+    return min(block_size, n_rows)
+
+
+
+def read_infos(infos_path):
+
+    try:
+        with open(infos_path, 'r') as read_obj:
+            return json.load(read_obj)
+    except (OSError, ValueError):
+        return None
+
+
+
+def set_tile_finished(finished_tiles, tile):
+
+    finished_tiles[tile] = 1
+    finished_tiles.flush()
+
+
+
+def compute_distance_tile(distances_directory, row_start, row_end, column_start, column_end, metric):
+
+    """
+    compute the distances between two blocks of rows and write them in the condensed distances on disk
+    only the pairs (r, c) with r < c are stored, the rows of the tile are contiguous slices of the condensed array
+
+    """
+
+    rows = np.load(Path(distances_directory, 'rows.npy'), mmap_mode='r')
+    distances = np.load(Path(distances_directory, 'distances.npy'), mmap_mode='r+')
+
+    n_rows = rows.shape[0]
+
+    tile = cdist(rows[row_start:row_end], rows[column_start:column_end], metric=metric)
+
+    for r in range(row_start, row_end):
+
+        first_column = max(column_start, r + 1)
+
+        if first_column >= column_end:
+            continue
+
+        # index of the pair (r, first_column) in the condensed array
+        start = n_rows * r - r * (r + 1) // 2 + first_column - r - 1
+
+        distances[start:start + column_end - first_column] = tile[r - row_start, first_column - column_start:]
+
+    distances.flush()
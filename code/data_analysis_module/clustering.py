@@ -6,9 +6,134 @@ Created on Wed Sep 25 16:39:44 2024
 @author: alice
 """
 
+import os
+import numpy as np
+import pandas
 
+from scipy.integrate import cumulative_trapezoid
+from scipy.spatial.distance import cdist, squareform
+from scipy.cluster.hierarchy import linkage, leaves_list
 
+from data_analysis_module.plot_tools import plot_dendrogram, plot_distance_heatmap
+from data_analysis_module.blocked_distances import compute_blocked_distances
 
-def run_wasserstein_clustering(bin_centers, list_normalized_concentrations, list_legend_labels, name, savepath):
-    
-    return
\ No newline at end of file
+
+
+
+def run_wasserstein_clustering(bin_centers, list_normalized_concentrations, list_legend_labels, name, savepath,
+                               method='average', max_memory=None, n_jobs=1, cdfs=None):
+
+    """
+    hierarchical clustering of size distributions with the 1-D Wasserstein distance
+    the distance matrix is exported in csv format, with a dendrogram and a heatmap of the distances
+
+        parameters
+        ----------
+        bin_centers: centers of the bins shared by all distributions
+        list_normalized_concentrations: list of distributions, normalized so that their integral is 1
+        list_legend_labels: name of each distribution
+        name: prefix of the exported files
+        savepath: directory where the files are exported
+        method: linkage method of scipy.cluster.hierarchy.linkage (default: 'average')
+        max_memory: if the dense distance matrix is larger than max_memory bytes, the distances are computed by tiles
+                    with compute_blocked_distances and stored on disk in savepath/<name>_wasserstein_distances,
+                    the csv export and the heatmap are skipped (default: None, always dense)
+        n_jobs: number of tiles computed in parallel when the distances are computed by tiles
+        cdfs: CDFs of the distributions if already computed (see derived_quantities), else computed here
+
+        returns
+        ----------
+        the distance matrix as a pandas dataframe, and the linkage matrix (None with less than two distributions)
+        when the distances are computed by tiles, the condensed distances on disk are returned instead of the dataframe
+
+    """
+
+    n_distributions = len(list_legend_labels)
+
+    if max_memory is not None and n_distributions > 1 and 8 * n_distributions**2 > max_memory:
+
+        condensed_distances = compute_blocked_distances(compute_weighted_cdfs(bin_centers, list_normalized_concentrations, cdfs),
+                                                        os.path.join(savepath, name+'_wasserstein_distances'),
+                                                        metric='cityblock', max_memory=max_memory, n_jobs=n_jobs)
+
+        # note: linkage loads the condensed distances in memory (half of the dense matrix)
+        linkage_matrix = linkage(condensed_distances, method=method)
+
+        plot_dendrogram(linkage_matrix, list_legend_labels, name=name, savepath=savepath,
+                        title='Wasserstein distance, '+method+' linkage')
+
+        return condensed_distances, linkage_matrix
+
+    distance_matrix = compute_wasserstein_distance_matrix(bin_centers, list_normalized_concentrations, cdfs)
+
+    distance_matrix = pandas.DataFrame(distance_matrix, index=list_legend_labels, columns=list_legend_labels)
+    distance_matrix.to_csv(os.path.join(savepath, name+'_wasserstein_distances.csv'))
+
+    if n_distributions < 2:
+        return distance_matrix, None
+
+    linkage_matrix = linkage(squareform(distance_matrix.values, checks=False), method=method)
+
+    plot_dendrogram(linkage_matrix, list_legend_labels, name=name, savepath=savepath,
+                    title='Wasserstein distance, '+method+' linkage')
+
+    # the heatmap rows and columns follow the order of the dendrogram leaves
+    order = leaves_list(linkage_matrix)
+    plot_distance_heatmap(distance_matrix.values[np.ix_(order, order)], list(np.array(list_legend_labels)[order]),
+                          name=name, savepath=savepath, title='Wasserstein distance')
+
+    return distance_matrix, linkage_matrix
+
+
+
+def compute_wasserstein_distance_matrix(bin_centers, list_normalized_concentrations, cdfs=None):
+
+    """
+    matrix of the 1-D Wasserstein distances between all pairs of distributions of a shared bin grid
+
+    the Wasserstein distance between two distributions is the integral of the absolute difference of their
+    cumulative distribution functions; with F the matrix of CDFs (one row per distribution) and w the
+    integration weights of the grid, all distances are the cityblock distances between the rows of F * w,
+    computed at once by scipy.spatial.distance.cdist
+
+        returns
+        ----------
+        a symmetric numpy array of shape (number of distributions, number of distributions)
+
+    """
+
+    weighted_cdfs = compute_weighted_cdfs(bin_centers, list_normalized_concentrations, cdfs)
+
+    return cdist(weighted_cdfs, weighted_cdfs, metric='cityblock')
+
+
+
+def compute_weighted_cdfs(bin_centers, list_normalized_concentrations, cdfs=None):
+
+    """
+    CDF of each distribution on the bin grid, multiplied by the trapezoid integration weights of the grid
+    if cdfs is given (e.g. precomputed in derived_quantities), the distributions are not integrated again
+
+        returns
+        ----------
+        a numpy array of shape (number of distributions, number of bins)
+
+    """
+
+    bin_centers = np.asarray(bin_centers, dtype=float)
+
+    if cdfs is None:
+
+        concentrations = np.atleast_2d(np.asarray(list_normalized_concentrations, dtype=float))
+
+        cdfs = cumulative_trapezoid(concentrations, x=bin_centers, axis=1, initial=0)
+
+        # each CDF ends at 1, even if the normalization of the distribution used another integration rule
+        totals = cdfs[:, -1:]
+        cdfs = np.divide(cdfs, totals, out=np.zeros_like(cdfs), where=totals > 0)
+
+    # trapezoid weights: half of the widths of the intervals on both sides of each bin center
+    steps = np.diff(bin_centers)
+    weights = np.concatenate([steps, [0]]) / 2 + np.concatenate([[0], steps]) / 2
+
+    return cdfs * weights
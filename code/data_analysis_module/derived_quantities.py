@@ -0,0 +1,100 @@
+
+import numpy as np
+
+from scipy.integrate import simpson, cumulative_trapezoid
+
+
+
+
+def compute_derived_quantities(data):
+
+    """
+    compute once, after loading, the quantities derived from the size distributions that plots, clustering
+    and two-samples tests need, so that none of them integrates distributions again
+
+    the distributions of all files (average over videos) and of all samples (average over replicates) of the dataset
+    are stacked in contiguous 2-D numpy arrays, one row per file then one row per sample, found with the row index
+
+        parameters
+        ----------
+        data: the dictionary returned by extract_nanosight_data_from_directory
+
+        returns
+        ----------
+        a dictionary containing:
+        bin_centers: the shared bin centers
+        file_rows, sample_rows: dictionaries giving the row of each filename and each sample name
+        concentrations: average distribution of each row, shape (number of rows, number of bins)
+        stds: standard deviation of each row (over videos for files, over replicates for samples)
+        areas: integral of each row (total concentration, particles/mL)
+        normalized_concentrations: each row divided by its area (density, integral 1)
+        cdfs: cumulative distribution function of each normalized row, ending at 1
+        videos_areas: integral of each video of each file, shape (number of files, maximum number of videos), nan padded
+        replicates_areas: mean and standard deviation over replicates of the file areas of each sample,
+                          shape (number of samples, 2), and n_replicates: number of replicates of each sample
+
+    """
+
+    dataset = data['dataset']
+
+    bin_centers = dataset.bin_centers.astype(float)
+
+    n_files = len(dataset.filenames)
+
+    file_rows = dict(dataset.file_index)
+    sample_rows = {sample_name: n_files + i for sample_name, i in dataset.sample_index.items()}
+
+    """
+    stack the distributions of files and samples
+
+    """
+
+    concentrations = np.ascontiguousarray(np.concatenate([dataset.files_averages, dataset.samples_averages]), dtype=float)
+    stds = np.ascontiguousarray(np.concatenate([dataset.files_stds, dataset.samples_stds]), dtype=float)
+
+    areas = simpson(y=concentrations, x=bin_centers, axis=1)
+
+    normalized_concentrations = concentrations / areas[:, None]
+
+    cdfs = cumulative_trapezoid(normalized_concentrations, x=bin_centers, axis=1, initial=0)
+    totals = cdfs[:, -1:]
+    cdfs = np.divide(cdfs, totals, out=np.zeros_like(cdfs), where=totals > 0)
+
+    """
+    per-video totals and replicates statistics
+
+    """
+
+    # nan for the padding videos
+    videos_areas = simpson(y=dataset.concentrations, x=bin_centers, axis=2)
+
+    replicates_areas = np.array([[np.mean(areas[dataset.sample_files[sample_name]]), np.std(areas[dataset.sample_files[sample_name]])]
+                                 for sample_name in dataset.samples_names]).reshape(-1, 2)
+
+    n_replicates = np.array([len(dataset.sample_files[sample_name]) for sample_name in dataset.samples_names], dtype=int)
+
+    return {'bin_centers': bin_centers,
+            'file_rows': file_rows,
+            'sample_rows': sample_rows,
+            'concentrations': concentrations,
+            'stds': stds,
+            'areas': areas,
+            'normalized_concentrations': normalized_concentrations,
+            'cdfs': cdfs,
+            'videos_areas': videos_areas,
+            'replicates_areas': replicates_areas,
+            'n_replicates': n_replicates}
+
+
+
+def get_rows(derived_quantities, filenames=None, samples_names=None):
+
+    """
+    rows of some files or samples in the arrays of derived quantities (use derived_quantities['cdfs'][rows], ...)
+
+    """
+
+    if filenames is not None:
+        return np.array([derived_quantities['file_rows'][filename] for filename in filenames], dtype=int)
+
+    return np.array([derived_quantities['sample_rows'][sample_name] for sample_name in samples_names], dtype=int)
@@ -1,11 +1,15 @@
 import numpy as np
 import os
+import time
+import multiprocessing
 import matplotlib.pyplot as plt
 plt.rcParams["font.family"] = "serif"
+from concurrent.futures import ProcessPoolExecutor, as_completed
   
 
 
 from scipy.integrate import simpson
+from scipy.cluster.hierarchy import dendrogram
 
 list_colors = [
     "palevioletred",
@@ -33,9 +37,26 @@ list_colors = [
 
 
 
-def plot_size_distributions(bin_centers, list_concentrations, savepath, name, list_legend_labels=None, title=None):
+# parameters of the figures of each plot function, used to create figures that are reused from one plot to the next
+figures_parameters = {'plot_size_distributions': dict(nrows=2, ncols=1, figsize=(16,16), sharex=True, sharey=True),
+                      'barplot': dict(nrows=1, figsize=(20,13), sharex=True)}
 
-    fig, ax = plt.subplots(2,1, figsize=(16,16), sharex=True, sharey=True)
+# figures kept open by get_reusable_figure, one per plot function (and per process)
+reusable_figures = {}
+
+# end of the name of the file written by each plot function
+plots_filename_suffixes = {'plot_size_distributions': '_size_distributions.png', 'barplot': '_barplot.png'}
+
+
+
+
+def plot_size_distributions(bin_centers, list_concentrations, savepath, name, list_legend_labels=None, title=None,
+                            reuse_figure=False):
+
+    if reuse_figure:
+        fig, ax = get_reusable_figure('plot_size_distributions')
+    else:
+        fig, ax = plt.subplots(**figures_parameters['plot_size_distributions'])
 
     for i in range(len(list_concentrations)):
         if list_legend_labels is not None and len(list_legend_labels)<15:
@@ -66,15 +87,19 @@ def plot_size_distributions(bin_centers, list_concentrations, savepath, name, li
         ax[k].tick_params(axis='both', labelsize=13)
 
     fig.tight_layout()
-    fig.savefig(os.path.join(savepath, name+'_size_distributions.png'))
-    plt.close(fig)
+    fig.savefig(os.path.join(savepath, name+plots_filename_suffixes['plot_size_distributions']))
+    if not reuse_figure:
+        plt.close(fig)
 
 
 
 
-def barplot(list_data, list_legend_labels, name, savepath, title=None):
+def barplot(list_data, list_legend_labels, name, savepath, title=None, reuse_figure=False):
 
-    fig, ax = plt.subplots(1, figsize=(20,13), sharex=True)
+    if reuse_figure:
+        fig, ax = get_reusable_figure('barplot')
+    else:
+        fig, ax = plt.subplots(**figures_parameters['barplot'])
 
     sorted_indexes = np.argsort(np.array(list_data))
     sorted_data = np.array(list_data)[sorted_indexes]
@@ -88,5 +113,173 @@ def barplot(list_data, list_legend_labels, name, savepath, title=None):
         ax.set_title(title, fontsize=20)
 
     fig.tight_layout()
-    fig.savefig(os.path.join(savepath, name+'_barplot.png'))
-    plt.close(fig)
\ No newline at end of file
+    fig.savefig(os.path.join(savepath, name+plots_filename_suffixes['barplot']))
+    if not reuse_figure:
+        plt.close(fig)
+
+
+
+def get_reusable_figure(plot_function_name):
+
+    """
+    figure and axes of a plot function, created at the first call and reset at the next ones to the state of a new
+    figure, so that a plot rendered on a reused figure is identical to a plot rendered on a new one
+    creating a figure costs more than clearing its axes, this matters when hundreds of plots are rendered
+
+    """
+
+    if plot_function_name not in reusable_figures:
+        reusable_figures[plot_function_name] = plt.subplots(**figures_parameters[plot_function_name])
+        return reusable_figures[plot_function_name]
+
+    fig, ax = reusable_figures[plot_function_name]
+
+    for axis in np.atleast_1d(ax):
+        axis.cla()
+
+    # the title of the previous plot is removed, not emptied: an empty title still takes room in tight_layout
+    if fig._suptitle is not None:
+        fig._suptitle.remove()
+        fig._suptitle = None
+
+    # tight_layout moved the axes to fit the labels of the previous plot, they are put back at the default positions
+    fig.subplots_adjust(**{parameter: plt.rcParams['figure.subplot.'+parameter] 
+                           for parameter in ['left', 'right', 'bottom', 'top', 'wspace', 'hspace']})
+
+    return fig, ax
+
+
+
+
+def render_plots(plot_jobs, n_jobs=1, progress_callback=None):
+
+    """
+    render a list of plots, in a process pool (spawned workers) with the non-interactive Agg backend if n_jobs > 1
+    each worker renders its plots on reused figures (see get_reusable_figure)
+
+        parameters
+        ----------
+        plot_jobs: list of (plot function name, keyword arguments), the plot functions being 'plot_size_distributions'
+                   and 'barplot', e.g. ('barplot', {'list_data': ..., 'list_legend_labels': ..., 'name': ..., 'savepath': ...})
+        n_jobs: number of worker processes (default: 1, plots rendered in the current process; -1: as many as cpus)
+        progress_callback: function called with the number of plots rendered and the total number of plots, after each plot
+                           (after each chunk of plots with a process pool); an exception raised by the function stops
+                           the rendering, the plots not started are not rendered (optional)
+
+        returns
+        ----------
+        a dictionary with the number of plots, the number of workers and the total render time in seconds
+
+    """
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+
+    n_workers = max(1, min(n_jobs, len(plot_jobs)))
+
+    start = time.perf_counter()
+
+    if n_workers == 1:
+        for i, plot_job in enumerate(plot_jobs):
+            render_plot_jobs([plot_job])
+            if progress_callback is not None:
+                progress_callback(i+1, len(plot_jobs))
+
+    else:
+        # a few chunks per worker, so that workers finishing early get more plots
+        n_chunks = min(len(plot_jobs), 4 * n_workers)
+        chunks = [plot_jobs[i::n_chunks] for i in range(n_chunks)]
+
+        # the workers are started with spawn: forking the gui process, whose tkinter and background worker threads
+        # may hold locks at that moment, can deadlock the workers
+        with ProcessPoolExecutor(max_workers=n_workers, initializer=initialize_plot_worker, 
+                                 mp_context=multiprocessing.get_context('spawn')) as pool_executor:
+            futures = {pool_executor.submit(render_plot_jobs, chunk): len(chunk) for chunk in chunks}
+            n_rendered = 0
+            try:
+                for future in as_completed(futures):
+                    future.result()
+                    n_rendered += futures[future]
+                    if progress_callback is not None:
+                        progress_callback(n_rendered, len(plot_jobs))
+            except BaseException:
+                pool_executor.shutdown(wait=True, cancel_futures=True)
+                raise
+
+    return {'n_plots': len(plot_jobs), 'n_workers': n_workers, 'render_time': time.perf_counter() - start}
+
+
+
+def get_plot_filename(plot_job):
+
+    """
+    name of the file written by a plot job of render_plots
+
+    """
+
+    plot_function_name, kwargs = plot_job
+
+    return kwargs['name'] + plots_filename_suffixes[plot_function_name]
+
+
+
+def initialize_plot_worker():
+
+    # workers only write png files, the backend of the parent process (e.g. TkAgg for the gui) is not needed
+    plt.switch_backend('Agg')
+
+
+
+def render_plot_jobs(plot_jobs):
+
+    plot_functions = {'plot_size_distributions': plot_size_distributions, 'barplot': barplot}
+
+    for plot_function_name, kwargs in plot_jobs:
+        plot_functions[plot_function_name](**kwargs, reuse_figure=True)
+
+
+
+
+def plot_dendrogram(linkage_matrix, list_legend_labels, name, savepath, title=None):
+
+    fig, ax = plt.subplots(1, figsize=(20,13))
+
+    # labels are not readable above a few tens of leaves
+    labels = list_legend_labels if len(list_legend_labels) <= 100 else None
+
+    dendrogram(linkage_matrix, labels=labels, ax=ax, color_threshold=None, leaf_rotation=90, no_labels=labels is None)
+    ax.set_ylabel('Distance', fontsize=15)
+    ax.tick_params(axis='y', labelsize=13)
+
+    if title is not None:
+        ax.set_title(title, fontsize=20)
+
+    fig.tight_layout()
+    fig.savefig(os.path.join(savepath, name+'_dendrogram.png'))
+    plt.close(fig)
+
+
+
+
+def plot_distance_heatmap(distance_matrix, list_legend_labels, name, savepath, title=None):
+
+    fig, ax = plt.subplots(1, figsize=(16,14))
+
+    image = ax.imshow(distance_matrix, cmap='viridis', interpolation='nearest')
+    fig.colorbar(image, ax=ax)
+
+    if len(list_legend_labels) <= 50:
+        ax.set_xticks(np.arange(len(list_legend_labels)))
+        ax.set_xticklabels(list_legend_labels, fontsize=10, rotation=45, rotation_mode="anchor", ha="right")
+        ax.set_yticks(np.arange(len(list_legend_labels)))
+        ax.set_yticklabels(list_legend_labels, fontsize=10)
+    else:
+        ax.set_xticks([])
+        ax.set_yticks([])
+
+    if title is not None:
+        ax.set_title(title, fontsize=20)
+
+    fig.tight_layout()
+    fig.savefig(os.path.join(savepath, name+'_heatmap.png'))
+    plt.close(fig)
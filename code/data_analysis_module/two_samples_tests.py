@@ -6,9 +6,230 @@ Created on Wed Sep 25 16:50:25 2024
 @author: alice
 """
 
+import os
+import itertools
+import numpy as np
+import pandas
+from concurrent.futures import ProcessPoolExecutor
 
+from data_analysis_module.clustering import compute_wasserstein_distance_matrix
 
 
-def run_two_samples_tests(bin_centers, list_normalized_concentrations, list_legend_labels, list_class_labels, name, savepath):
-    
-    return
\ No newline at end of file
+
+# number of permutations evaluated at once, memory used is about permutations_batch_size x number of distributions x 16 bytes
+permutations_batch_size = 10000
+
+
+
+def run_two_samples_tests(bin_centers, list_normalized_concentrations, list_legend_labels, list_class_labels, name, savepath,
+                          n_permutations=9999, n_jobs=1, correction='holm', seed=0, cdfs=None):
+
+    """
+    permutation tests between each pair of classes of size distributions, exported in csv format
+
+    the statistic is the energy distance between the two groups of distributions, with the Wasserstein distance
+    between distributions: 2 x mean distance between groups - mean distance within group 1 - mean distance within group 2
+    the Wasserstein distance matrix of all distributions is computed once, each permutation then only shuffles
+    the class labels and the statistics of a batch of permutations are computed with matrix products
+
+        parameters
+        ----------
+        bin_centers: centers of the bins shared by all distributions
+        list_normalized_concentrations: list of distributions, normalized so that their integral is 1
+        list_legend_labels: name of each distribution
+        list_class_labels: class label of each distribution
+        name: prefix of the exported file
+        savepath: directory where the file is exported
+        n_permutations: number of permutations of each test
+        n_jobs: number of processes sharing the permutations of each test (default: 1; -1: as many as cpus)
+        correction: correction of the p-values for multiple testing, 'holm' (default), 'bonferroni',
+                    'benjamini-hochberg' or None
+        seed: seed of the random permutations
+        cdfs: CDFs of the distributions if already computed (see derived_quantities), else computed here
+
+        returns
+        ----------
+        a pandas dataframe with one row per pair of classes: sizes of the classes, statistic, p-value and adjusted p-value
+
+    """
+
+    if len(list_class_labels) != len(list_normalized_concentrations):
+        raise ValueError("One class label is expected per distribution", len(list_class_labels), len(list_normalized_concentrations))
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+
+    distance_matrix = compute_wasserstein_distance_matrix(bin_centers, list_normalized_concentrations, cdfs)
+
+    class_labels = np.array(list_class_labels)
+    classes = sorted(set(list_class_labels))
+
+    # independent random streams for each test and each process
+    seed_sequences = np.random.SeedSequence(seed).spawn(len(classes) * (len(classes) - 1) // 2)
+
+    results = []
+
+    for (class_1, class_2), seed_sequence in zip(itertools.combinations(classes, 2), seed_sequences):
+
+        indexes_1 = np.flatnonzero(class_labels == class_1)
+        indexes_2 = np.flatnonzero(class_labels == class_2)
+
+        statistic, p_value = run_permutation_test(distance_matrix, indexes_1, indexes_2, n_permutations, n_jobs, seed_sequence)
+
+        results.append({'Class 1': class_1, 'Class 2': class_2, 'Size 1': len(indexes_1), 'Size 2': len(indexes_2),
+                        'Energy statistic': statistic, 'p-value': p_value})
+
+    results = pandas.DataFrame(results, columns=['Class 1', 'Class 2', 'Size 1', 'Size 2', 'Energy statistic', 'p-value'])
+    results['Adjusted p-value'] = adjust_p_values(results['p-value'].values, correction)
+
+    results.to_csv(os.path.join(savepath, name+'_two_samples_tests.csv'), index=False)
+
+    return results
+
+
+
+def run_permutation_test(distance_matrix, indexes_1, indexes_2, n_permutations, n_jobs=1, seed_sequence=None):
+
+    """
+    permutation test of the energy statistic between two groups of a distance matrix
+
+        returns
+        ----------
+        the observed statistic and the p-value, (1 + number of permutations with a statistic >= observed) / (1 + n_permutations)
+        (nan, nan) if a group is empty
+
+    """
+
+    if len(indexes_1) == 0 or len(indexes_2) == 0:
+        return np.nan, np.nan
+
+    if seed_sequence is None:
+        seed_sequence = np.random.SeedSequence()
+
+    # distances between the distributions of both groups, group 1 first
+    pooled_indexes = np.concatenate([indexes_1, indexes_2])
+    pooled_distances = distance_matrix[np.ix_(pooled_indexes, pooled_indexes)]
+
+    observed_labels = np.zeros((1, len(pooled_indexes)))
+    observed_labels[0, :len(indexes_1)] = 1
+
+    statistic = compute_energy_statistics(pooled_distances, observed_labels)[0]
+
+    # the permutations are shared between processes, each with its own random stream
+    n_processes = max(1, min(n_jobs, n_permutations // permutations_batch_size))
+    list_n_permutations = [len(chunk) for chunk in np.array_split(np.arange(n_permutations), n_processes)]
+
+    tasks_args = [(pooled_distances, len(indexes_1), n, child_seed, statistic)
+                  for n, child_seed in zip(list_n_permutations, seed_sequence.spawn(n_processes))]
+
+    if n_processes == 1:
+        n_greater = sum(count_greater_statistics(*task_args) for task_args in tasks_args)
+    else:
+        with ProcessPoolExecutor(max_workers=n_processes) as pool_executor:
+            n_greater = sum(pool_executor.map(count_greater_statistics, *zip(*tasks_args)))
+
+    return statistic, (1 + n_greater) / (1 + n_permutations)
+
+
+
+def count_greater_statistics(pooled_distances, n_1, n_permutations, seed_sequence, statistic):
+
+    """
+    number of random permutations of the labels whose energy statistic is greater than or equal to statistic
+
+    """
+
+    rng = np.random.default_rng(seed_sequence)
+
+    n_pooled = pooled_distances.shape[0]
+
+    labels = np.zeros(n_pooled)
+    labels[:n_1] = 1
+
+    n_greater = 0
+
+    for start in range(0, n_permutations, permutations_batch_size):
+
+        n_batch = min(permutations_batch_size, n_permutations - start)
+
+        permuted_labels = rng.permuted(np.tile(labels, (n_batch, 1)), axis=1)
+
+        # a small tolerance, so that permutations equivalent to the observed labels are counted despite rounding errors
+        n_greater += int(np.sum(compute_energy_statistics(pooled_distances, permuted_labels) >= statistic - 1e-12 * abs(statistic)))
+
+    return n_greater
+
+
+
+def compute_energy_statistics(pooled_distances, labels):
+
+    """
+    energy statistics of a batch of labelings of the pooled distributions
+
+        parameters
+        ----------
+        pooled_distances: distance matrix of the pooled distributions
+        labels: array of shape (number of labelings, number of distributions), 1 for group 1 and 0 for group 2
+
+        returns
+        ----------
+        the energy statistic of each labeling
+
+    """
+
+    n_1 = labels[0].sum()
+    n_2 = labels.shape[1] - n_1
+
+    # sum of the distances from each distribution to the distributions of group 1
+    distances_to_group_1 = labels @ pooled_distances
+    distances_to_all = pooled_distances.sum(axis=0)
+
+    within_1 = np.sum(distances_to_group_1 * labels, axis=1)
+    between = np.sum(distances_to_group_1 * (1 - labels), axis=1)
+    within_2 = np.sum((distances_to_all - distances_to_group_1) * (1 - labels), axis=1)
+
+    return 2 * between / (n_1 * n_2) - within_1 / n_1**2 - within_2 / n_2**2
+
+
+
+def adjust_p_values(p_values, correction='holm'):
+
+    """
+    correct p-values for multiple testing
+
+        parameters
+        ----------
+        p_values: numpy array of p-values (nan values are ignored)
+        correction: 'holm', 'bonferroni', 'benjamini-hochberg' or None
+
+    """
+
+    p_values = np.asarray(p_values, dtype=float)
+    adjusted = p_values.copy()
+
+    valid = ~np.isnan(p_values)
+    n_tests = valid.sum()
+
+    if correction is None or n_tests == 0:
+        return adjusted
+
+    valid_p_values = p_values[valid]
+    order = np.argsort(valid_p_values)
+    sorted_p_values = valid_p_values[order]
+
+    if correction == 'bonferroni':
+        sorted_adjusted = sorted_p_values * n_tests
+    elif correction == 'holm':
+        # step-down: the adjusted p-values are non decreasing with the p-values
+        sorted_adjusted = np.maximum.accumulate(sorted_p_values * (n_tests - np.arange(n_tests)))
+    elif correction == 'benjamini-hochberg':
+        # step-up: the adjusted p-values are non increasing from the largest p-value
+        sorted_adjusted = np.minimum.accumulate((sorted_p_values * n_tests / np.arange(1, n_tests + 1))[::-1])[::-1]
+    else:
+        raise ValueError("Unknown correction, expected 'holm', 'bonferroni', 'benjamini-hochberg' or None", correction)
+
+    valid_adjusted = np.empty(n_tests)
+    valid_adjusted[order] = np.minimum(sorted_adjusted, 1)
+    adjusted[valid] = valid_adjusted
+
+    return adjusted
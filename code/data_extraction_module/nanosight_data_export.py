@@ -0,0 +1,194 @@
+
+import os
+import json
+import numpy as np
+import pandas
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+from data_extraction_module.nanosight_dataset import build_dataset_from_frames
+
+
+
+# version of the layout of binary exports, checked by load_nanosight_data
+export_version = 2
+
+# name of the file describing a binary export
+export_infos_filename = 'export_infos.json'
+
+# default compression of each format
+default_compressions = {'parquet': 'zstd', 'feather': 'zstd'}
+
+
+
+def export_nanosight_data(data, directory_path, export_format='parquet', compression=None, n_jobs=1):
+
+    """
+    export the dataframes of the data of a directory in a columnar binary format, with their dtypes and indexes,
+    so that they can be loaded again with load_nanosight_data without parsing the nanosight exports
+
+        parameters
+        ----------
+        data: the dictionary returned by extract_nanosight_data_from_directory
+        directory_path: directory where the files are written
+        export_format: 'parquet' (default) or 'feather'
+        compression: compression codec of pyarrow (default: 'zstd')
+        n_jobs: number of files written in parallel (threads, pyarrow writes without holding the GIL)
+
+        returns
+        ----------
+        the list of the paths of the written files
+
+    """
+
+    if export_format not in default_compressions:
+        raise ValueError("Unknown export format, expected 'parquet' or 'feather'", export_format)
+
+    if compression is None:
+        compression = default_compressions[export_format]
+
+    os.makedirs(directory_path, exist_ok=True)
+
+    # the size distributions are stored as the arrays of the dataset, the wide dataframe is generated again when loading;
+    # samples_filenames is stored as a table, one row per replicate
+    frames = {key: value for key, value in data.items() if isinstance(value, pandas.DataFrame) and key != 'size_distributions'}
+    frames['dataset_files'], frames['dataset_distributions'] = data['dataset'].to_frames()
+    frames['samples_filenames'] = samples_filenames_to_table(data['samples_filenames'])
+
+    tasks_args = [(frame, Path(directory_path, key+'.'+export_format), export_format, compression)
+                  for key, frame in frames.items()]
+
+    if n_jobs == 1:
+        for task_args in tasks_args:
+            write_frame(*task_args)
+    else:
+        with ThreadPoolExecutor(max_workers=None if n_jobs == -1 else n_jobs) as pool_executor:
+            list(pool_executor.map(write_frame, *zip(*tasks_args)))
+
+    # written last: an export without this file is incomplete and is not loaded
+    with open(Path(directory_path, export_infos_filename), 'w') as write_obj:
+        json.dump({'version': export_version, 'format': export_format, 'frames': list(frames.keys())}, write_obj)
+
+    return [task_args[1] for task_args in tasks_args]
+
+
+
+def load_nanosight_data(directory_path):
+
+    """
+    load data exported with export_nanosight_data
+
+        returns
+        ----------
+        the dictionary described in extract_nanosight_data_from_directory, with the same dataframes
+
+    """
+
+    try:
+        with open(Path(directory_path, export_infos_filename), 'r') as read_obj:
+            export_infos = json.load(read_obj)
+    except OSError:
+        raise ValueError("No complete binary export found", directory_path)
+
+    if export_infos['version'] != export_version:
+        raise ValueError("Binary export written by another version, export the data again", directory_path)
+
+    export_format = export_infos['format']
+
+    data = {}
+
+    for key in export_infos['frames']:
+        filepath = Path(directory_path, key+'.'+export_format)
+        if export_format == 'parquet':
+            data[key] = restore_lists(pandas.read_parquet(filepath))
+        else:
+            data[key] = restore_lists(restore_index(pandas.read_feather(filepath)))
+
+    samples_filenames = table_to_samples_filenames(data.pop('samples_filenames'))
+    dataset = build_dataset_from_frames(data.pop('dataset_files'), data.pop('dataset_distributions'), samples_filenames)
+
+    # the keys in the order of extract_nanosight_data_from_directory
+    return {'files_infos': data['files_infos'],
+            'samples_filenames': samples_filenames,
+            'size_distributions': dataset.to_size_distributions(),
+            'size_concentration_attributes': data['size_concentration_attributes'],
+            'metadata': data['metadata'],
+            'dataset': dataset}
+
+
+
+def write_frame(frame, filepath, export_format, compression):
+
+    frame = make_columns_writable(frame)
+
+    if export_format == 'parquet':
+        frame.to_parquet(filepath, compression=compression)
+    else:
+        # feather files have no index, it is stored as the first column
+        frame.reset_index(names='__index__').to_feather(filepath, compression=compression)
+
+
+
+def restore_index(frame):
+
+    frame = frame.set_index('__index__')
+    frame.index.name = None
+
+    return frame
+
+
+
+def restore_lists(frame):
+
+    # list columns (e.g. 'Particles per frame' in metadata) are read as numpy arrays
+    for col in frame.columns:
+        if frame[col].dtype == object and len(frame) > 0 and isinstance(frame[col].iloc[0], np.ndarray):
+            frame[col] = [value.tolist() for value in frame[col]]
+
+    return frame
+
+
+
+def make_columns_writable(frame):
+
+    """
+    columns mixing types (e.g. numbers and text in metadata values) cannot be stored in a typed column,
+    their values are written as text
+
+    """
+
+    mixed_columns = [col for col in frame.columns if frame[col].dtype == object and
+                     len(set(type(value) for value in frame[col] if value is not None)) > 1]
+
+    if len(mixed_columns) == 0:
+        return frame
+
+    frame = frame.copy()
+    frame[mixed_columns] = frame[mixed_columns].astype(str)
+
+    return frame
+
+
+
+def samples_filenames_to_table(samples_filenames):
+
+    """
+    samples_filenames dictionary as a dataframe with one row per replicate: 'Sample name', 'Replicate' (suffix)
+
+    """
+
+    rows = [(sample_name, replicate) for sample_name, replicates in samples_filenames.items() for replicate in replicates]
+
+    return pandas.DataFrame({'Sample name': pandas.Series([row[0] for row in rows], dtype='string'),
+                             'Replicate': pandas.Series([row[1] for row in rows], dtype='string')})
+
+
+
+def table_to_samples_filenames(table):
+
+    samples_filenames = {}
+
+    for sample_name, replicate in zip(table['Sample name'], table['Replicate']):
+        samples_filenames.setdefault(str(sample_name), []).append(str(replicate))
+
+    return samples_filenames
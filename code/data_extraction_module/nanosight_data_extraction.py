@@ -2,18 +2,33 @@
 from pathlib import Path
 import numpy as np
 import pandas
-import itertools
+import os
+import hashlib
+import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 
 from data_extraction_module.nanosight_export_files_listing import list_nanosight_files_in_directory
-from data_extraction_module.nanosight_export_files_reading import read_experiment_summary_file
+from data_extraction_module.parse_cache import (read_experiment_summary_file_cached, evict_cache_entries, default_max_cache_size,
+                                                get_cache_key, load_cache_entry, write_cache_entry)
+from data_extraction_module.nanosight_dataset import build_dataset_from_experiments
+from data_extraction_module.replicates_aggregation import get_replicates_matrix, aggregate_replicates, get_replicates_filenames
+from app_tools.instrumentation import instrumented, span, count, get_tracer, get_current_span, run_in_span, run_traced
 
 from scipy.integrate import simpson
 
 
 
+# version of reshape_experiment_data, to increment when its outputs change
+# (the cached reshaped outputs of previous versions are then ignored)
+reshape_version = 1
 
-def extract_nanosight_data_from_directory(directory_path, dilution_prefix, replicate_prefix):
+
+
+
+def extract_nanosight_data_from_directory(directory_path, dilution_prefix, replicate_prefix, n_jobs=1, executor='process',
+                                          resample_bin_grids=False, cache_directory=None, max_cache_size=default_max_cache_size,
+                                          replicates_aggregation='mean', replicates_weights=None, progress_callback=None):
 
     """
     extract all Nanosight data from a directory
@@ -23,175 +38,345 @@ def extract_nanosight_data_from_directory(directory_path, dilution_prefix, repli
         directory_path: path of the directory
         dilution_prefix: dilution prefix to consider when reading file names
         replicate_prefix: replicate prefix to consider when reading file names
+        n_jobs: number of experiments extracted in parallel (default: 1, no parallelism; -1: as many as cpus)
+        executor: 'process' (default) to extract experiments in a process pool, 'thread' to use a thread pool
+        resample_bin_grids: if True, size distributions whose bin grid differs from the most common one are
+                            resampled onto it, else a BinGridMismatchError is raised (default: False)
+        cache_directory: directory of the parse cache; if None (default), all files are parsed without cache
+        max_cache_size: maximum size of the parse cache in bytes, least recently used entries are removed above it
+        replicates_aggregation: 'mean' (default) to average the replicates of each sample, with their standard deviation,
+                                or 'median' for their median and median absolute deviation (see replicates_aggregation.py);
+                                the columns of the samples keep the names 'Average <sample name>' and 'Std <sample name>'
+        replicates_weights: dictionary of the weight of each filename in the mean of its sample (optional, default: 
+                            all replicates have the same weight)
+        progress_callback: function called with the number of experiments extracted and the number of experiments to
+                           extract, after each experiment; an exception raised by the function (e.g. when the user cancels
+                           the loading) stops the extraction (optional, see run_extraction_tasks)
     
         returns
         ----------
         a dictionary containing: 
-        files_infos: a pandas dataframe containing files information (replicates if any, samples, dilutions)
+        files_infos: a pandas dataframe containing files information (replicates if any, samples, dilutions, bin grid hash)
         samples_filenames: a dictionary where the keys are sample names and the values are the corresponding list of replicates filenames
         size_distributions: a pandas dataframe containing size_distributions for all samples
         size_concentration_attributes: a pandas dataframe containing all size and concentration attributes for all samples
         metadata: a pandas dataframe containing detailed metadata for all samples
+        dataset: a NanosightDataset storing the size distributions by file, video and sample (see nanosight_dataset.py)
+
+    """    
+
+    data, _, _ = extract_nanosight_data_incrementally(directory_path, dilution_prefix, replicate_prefix, 
+                                                      previous_experiments=None, n_jobs=n_jobs, executor=executor, 
+                                                      resample_bin_grids=resample_bin_grids, 
+                                                      cache_directory=cache_directory, max_cache_size=max_cache_size,
+                                                      replicates_aggregation=replicates_aggregation, 
+                                                      replicates_weights=replicates_weights,
+                                                      progress_callback=progress_callback)
+
+    return data
+
+
+
+@instrumented('extraction', 'extraction', arguments=('directory_path',))
+def extract_nanosight_data_incrementally(directory_path, dilution_prefix, replicate_prefix, previous_experiments=None, 
+                                         n_jobs=1, executor='process', resample_bin_grids=False, 
+                                         cache_directory=None, max_cache_size=default_max_cache_size,
+                                         replicates_aggregation='mean', replicates_weights=None, progress_callback=None):
+
+    """
+    extract all Nanosight data from a directory, extracting again only the experiments added or changed since a previous extraction
+    the result is identical to a full extraction with extract_nanosight_data_from_directory
+        
+        parameters
+        ----------
+        previous_experiments: the experiments returned by a previous call on the same directory, with the same prefixes
+                              (None: all experiments are extracted)
+        other parameters: see extract_nanosight_data_from_directory
+    
+        returns
+        ----------
+        the dictionary described in extract_nanosight_data_from_directory
+        experiments: a dictionary where the keys are filenames and the values are the signature (path, size, modification time)
+                     of the ExperimentSummary.csv file and the output of extract_experiment_data, to pass to the next call
+        changes: a dictionary listing the 'added', 'changed' and 'removed' filenames
 
     """    
 
     files_dic = list_nanosight_files_in_directory(directory_path)
+
+    filenames = sorted(list(files_dic.keys()))
+
+    if len(filenames) == 0:
+        raise ValueError("No ExperimentSummary.csv file found", directory_path)
+
+    if previous_experiments is None:
+        previous_experiments = {}
+
+    """
+    find added, changed and removed experiments
     
+    """
 
-    # iterate over each file found in the directory
-    for i, filename in enumerate(sorted(list(files_dic.keys()))):
-        
-        # store file infos to create file_infos pandas dataframe
-        file_infos = []      
-        
-        # try to find dilution factor in filename
-        # if dilution factor is not found, it is set to 1
-        dilution_factor, has_dilution_been_found = get_dilution_infos(filename, dilution_prefix)
-        
-        if has_dilution_been_found:
-            file_infos += [dilution_factor]
+    with span('signatures', 'extraction'):
+        signatures = {filename: get_file_signature(Path(directory_path, files_dic[filename]["experiment_summary_file"])) 
+                      for filename in filenames}
+
+    changes = {'added': [filename for filename in filenames if filename not in previous_experiments],
+               'changed': [filename for filename in filenames if filename in previous_experiments 
+                           and previous_experiments[filename][0] != signatures[filename]],
+               'removed': sorted([filename for filename in previous_experiments if filename not in signatures])}
+
+    """
+    extract the data of new or changed experiments, as independent tasks if several jobs are requested
+    
+    """
+
+    filenames_to_extract = sorted(changes['added'] + changes['changed'])
+
+    count('experiments extracted', len(filenames_to_extract))
+    count('experiments reused', len(filenames) - len(filenames_to_extract))
+
+    tasks_args = [(directory_path, filename, files_dic[filename]["experiment_summary_file"], dilution_prefix, replicate_prefix, 
+                   cache_directory)
+                  for filename in filenames_to_extract]
+
+    extracted_experiments_data = run_extraction_tasks(tasks_args, n_jobs=n_jobs, executor=executor, 
+                                                      progress_callback=progress_callback)
+
+    # keep the parse cache below its maximum size
+    evict_cache_entries(cache_directory, max_cache_size)
+
+    experiments = {filename: previous_experiments[filename] for filename in filenames if filename not in filenames_to_extract}
+    experiments.update({filename: (signatures[filename], experiment_data) 
+                        for filename, experiment_data in zip(filenames_to_extract, extracted_experiments_data)})
+
+    """
+    assemble the data of all experiments, in sorted filename order
+    
+    """
+
+    data = assemble_nanosight_data([experiments[filename][1] for filename in filenames], directory_path, 
+                                   resample_bin_grids=resample_bin_grids, replicates_aggregation=replicates_aggregation,
+                                   replicates_weights=replicates_weights)
+
+    return data, experiments, changes
+
+
+
+@instrumented('experiments extraction', 'extraction')
+def run_extraction_tasks(tasks_args, n_jobs=1, executor='process', progress_callback=None):
+
+    """
+    run extract_experiment_data for each task, in a process or thread pool if n_jobs > 1
+
+        parameters
+        ----------
+        tasks_args: list of the arguments of extract_experiment_data, one tuple per experiment
+        n_jobs: number of experiments extracted in parallel (default: 1, no parallelism; -1: as many as cpus)
+        executor: 'process' (default) or 'thread' pool
+        progress_callback: function called in this thread with the number of experiments extracted and the total number
+                           of experiments, after each experiment; an exception raised by the function stops the extraction,
+                           the experiments not started are not extracted (optional)
+
+        returns
+        ----------
+        the list of the outputs of extract_experiment_data, in the order of the tasks
+
+    """
+
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+
+    if n_jobs == 1 or len(tasks_args) < 2:
+
+        experiments_data = []
+        for task_args in tasks_args:
+            experiments_data.append(extract_experiment_data(*task_args))
+            if progress_callback is not None:
+                progress_callback(len(experiments_data), len(tasks_args))
+
+        return experiments_data
+
+    if executor == 'process':
+        pool_executor = ProcessPoolExecutor(max_workers=n_jobs)
+    elif executor == 'thread':
+        pool_executor = ThreadPoolExecutor(max_workers=n_jobs)
+    else:
+        raise ValueError("Unknown executor, expected 'process' or 'thread'", executor)
+
+    # group tasks in chunks to limit the communication overhead between processes
+    chunksize = max(1, len(tasks_args) // (4 * n_jobs))
+
+    tracer = get_tracer()
+
+    # map returns the results in the order of the tasks, i.e. in sorted filename order
+    with pool_executor:
+
+        if tracer is None:
+            results = pool_executor.map(extract_experiment_data, *zip(*tasks_args), chunksize=chunksize)
+
+        # the threads share the tracer of this process, the spans of each task are children of the span of this function
+        elif executor == 'thread':
+            parent_span = get_current_span()
+            results = pool_executor.map(run_in_span, [parent_span]*len(tasks_args), [extract_experiment_data]*len(tasks_args), 
+                                        *zip(*tasks_args))
+
+        # the spans of the worker processes are recorded by a tracer of each task, then merged in the tracer of this process
         else:
-            file_infos += ['Not found']
+            results = pool_executor.map(run_traced, [extract_experiment_data]*len(tasks_args), 
+                                        [tracer.trace_memory]*len(tasks_args), *zip(*tasks_args), chunksize=chunksize)
 
-        # try to find replicate group in filename, if yes get corresponding sample name
-        # if replicate group is not found, filename is kept as sample name
-        sample_name, has_replicate_group_been_found = get_replicate_group(filename, replicate_prefix)
-        file_infos += [sample_name]
-        
-        file_infos = pandas.DataFrame([file_infos])
-        file_infos.columns = ['Dilution factor', 'Sample name']
-        file_infos.index = [filename]
+        experiments_data = []
 
-        """ 
-        read the file 'experiment summary' which contains the data
-        
-        """
-        experiment_summary_file = files_dic[filename]["experiment_summary_file"]    
-        experiment_summary_data = read_experiment_summary_file(Path(directory_path, experiment_summary_file))
-        size_distributions, size_concentration_attributes, metadata = experiment_summary_data
+        try:
+            for result in results:
 
-        """ 
-        multiply concentrations by the dilution factor and add info in experiment infos
-        
-        """        
+                if tracer is not None and executor == 'process':
+                    result, records = result
+                    tracer.merge(records)
 
-        for col in [column for column in size_distributions.columns if "Bin centre" not in column]:
-            size_distributions[col] = size_distributions[col] * dilution_factor 
+                experiments_data.append(result)
 
-        """ 
-        calculate total concentration for each video
-        
-        """
-        total_concentrations = ['Total concentration']
-        videos_cols = [col for col in size_distributions.columns if 'Concentration Video' in col]
-        for col in videos_cols:
-            area = simpson(x=size_distributions['Bin centre (nm)'], y=size_distributions[col])
-            total_concentrations.append(area)
-        total_concentrations = pandas.DataFrame(np.array(total_concentrations).reshape(1,-1), 
-                                                columns=['key']+[col.replace('Concentration ','') for col in videos_cols])
-        size_concentration_attributes = pandas.concat([total_concentrations, size_concentration_attributes])
-        size_concentration_attributes.reset_index(inplace=True, drop=True)
-
-        """ 
-        add average and standard deviation over all videos
-        """
-        
-        # in size_distributions dataframe (at each bin center)
-        videos_cols = [col for col in size_distributions.columns if 'Concentration Video' in col]
-        size_distributions['Average'] = np.mean(size_distributions[videos_cols], axis=1)
-        size_distributions['Std'] = np.std(size_distributions[videos_cols], axis=1)
-        
-        # in size_concentration_attributes dataframe
-        size_concentration_attributes = size_concentration_attributes.apply(pandas.to_numeric, errors='ignore')
-        size_concentration_attributes['Average'] = np.mean(size_concentration_attributes.iloc[:,1:], axis=1)
-        size_concentration_attributes['Std'] = np.std(size_concentration_attributes.iloc[:,1:], axis=1)
-
-        """
-        reorganize dataframes to easily concatenate the results for all samples
-        """
-
-        # reorganize size concentration attributes dataframe to have only one row 
-        # and a column for each combination of key info and video (or average/std over videos)
-        # also add sample name as index
-
-        size_concentration_attributes = pandas.DataFrame({f"{key} {col}": size_concentration_attributes[size_concentration_attributes['key'] == key][col].values 
-                                          for key in size_concentration_attributes['key'].unique() 
-                                          for col in size_concentration_attributes.columns if col != 'key'})
-        size_concentration_attributes.index = [filename]
-
-        # do the same for experiment_infos    
-        metadata = pandas.DataFrame({f"{key} {col}": metadata[metadata['key'] == key][col].values 
-                                          for key in metadata['key'].unique() 
-                                          for col in metadata.columns if col != 'key'})
-        metadata.index = [filename]
-        
-        # add filename in the column names of each concentration column
-        size_distributions.columns = [col for col in size_distributions.columns + ' ' + filename]
+                if progress_callback is not None:
+                    progress_callback(len(experiments_data), len(tasks_args))
+
+        except BaseException:
+            # e.g. the task was cancelled by the progress callback: the experiments not started are dropped
+            pool_executor.shutdown(wait=True, cancel_futures=True)
+            raise
 
-        """
-        concatenate results of new sample with others
+        return experiments_data
+
+
+
+def get_file_signature(filepath):
+
+    """
+    signature of a file, which changes when the file is rewritten
+
+    """
+
+    stat = os.stat(filepath)
+
+    return (str(filepath), stat.st_size, stat.st_mtime_ns)
+
+
+
+@instrumented('assembly', 'extraction')
+def assemble_nanosight_data(experiments_data, directory_path, resample_bin_grids=False, replicates_aggregation='mean', 
+                            replicates_weights=None):
+
+    """
+    assemble the data extracted from each experiment of a directory
         
-        """
+        parameters
+        ----------
+        experiments_data: list of the outputs of extract_experiment_data, in sorted filename order
+        directory_path: path of the directory (used in error messages)
+        resample_bin_grids: if True, resample size distributions whose bin grid differs from the most common one
+        replicates_aggregation, replicates_weights: see extract_nanosight_data_from_directory
+    
+        returns
+        ----------
+        the dictionary described in extract_nanosight_data_from_directory
 
-        if i==0:
-            all_size_distributions = size_distributions.copy()
-            all_size_concentration_attributes = size_concentration_attributes.copy()
-            all_metadata = metadata.copy()
-            all_files_infos = file_infos.copy()
-            
-        else:
-            # for size_distributions, concatenation is in columns
-            all_size_distributions = pandas.concat([all_size_distributions, size_distributions], axis=1)
-            # for size concentration attributes and experiment infos, concatenation is in rows
-            all_size_concentration_attributes = pandas.concat([all_size_concentration_attributes, size_concentration_attributes], axis=0)
-            all_metadata = pandas.concat([all_metadata, metadata], axis=0)
-            all_files_infos = pandas.concat([all_files_infos, file_infos], axis=0)
+    """
 
     """
-    add a column summarizing particles per frame infos and noise infos over all videos
+    verify that all files share the same bin grid. Raise error if not, unless resampling is requested
     
     """
 
-    particles_per_frame = [all_metadata.loc[filename][[col for col in all_metadata.columns if 'Particles per frame Video' in col]].tolist()
-                           for filename in all_metadata.index]
+    experiments_data = verify_bin_grids(experiments_data, directory_path, resample=resample_bin_grids)
 
-    noise_infos = [all_metadata.loc[filename][[col for col in all_metadata.columns if 'Noise level Video' in col]].tolist()
-                           for filename in all_metadata.index]
+    """
+    concatenate the rows of the files infos, attributes and metadata of all files
+    
+    """
 
-    # defined the sample measure as reliable if 'OK' was written for all videos in nanosight exports
-    no_noise_detected = [np.all(np.array(noise_infos[i]) == 'No') for i in range(len(noise_infos))]
-    noise_infos = ['' if no_noise_detected[i] else 'Noise detected' for i in range(len(no_noise_detected))]
+    filenames = [file_infos.index[0] for file_infos, _, _, _ in experiments_data]
 
-    all_metadata['Particles per frame'] = np.array(particles_per_frame).tolist()
-    all_metadata['Noise detected'] = np.array(noise_infos)
+    all_files_infos, all_size_concentration_attributes, all_metadata = concatenate_experiments_data(experiments_data)
 
+    """
+    add a column summarizing particles per frame infos and noise infos over all videos
+    
+    """
+
+    all_metadata = add_metadata_summary(all_metadata)
 
+
+    """
+    create all_samples_filenames dict
     """
-    verify the equality of bin center columns. Raise error if not. Then keep only one bin centre column
     
+    all_samples_filenames = group_samples_filenames(all_files_infos)
+
+    """
+    store the size distributions of all files in the dataset, with the average over replicates of each sample, then add
+    the average size concentration attributes over replicates if any
     """
 
-    bin_centre_columns = [col for col in all_size_distributions.columns if 'Bin centre' in col]
+    dataset = build_dataset_from_experiments([size_distributions for _, size_distributions, _, _ in experiments_data], 
+                                             filenames, all_samples_filenames, 
+                                             aggregation=replicates_aggregation, weights=replicates_weights)
 
-    for i, j in list(itertools.combinations(np.arange(len(bin_centre_columns)), 2)):
-        
-        i_values = all_size_distributions[bin_centre_columns[i]].values
-        j_values = all_size_distributions[bin_centre_columns[j]].values
+    all_size_concentration_attributes = add_replicates_average_attributes(all_size_concentration_attributes, all_samples_filenames, 
+                                                                          aggregation=replicates_aggregation, 
+                                                                          weights=replicates_weights)
 
-        if (i_values==j_values).sum() != len(i_values):
-            raise ValueError("Error: different bin sizes", directory_path)
+    # the wide dataframe of the size distributions, written in the csv export, is generated from the dataset
+    return {'files_infos': all_files_infos, 
+            'samples_filenames': all_samples_filenames,
+            'size_distributions': dataset.to_size_distributions(), 
+            'size_concentration_attributes': all_size_concentration_attributes, 
+            'metadata': all_metadata,
+            'dataset': dataset
+            }
 
-    for col in bin_centre_columns[1:]:
-        all_size_distributions.drop(col, axis=1, inplace=True)
-        
-    # rename remaining column to remove filename
-    all_size_distributions.rename(columns={bin_centre_columns[0]: 'Bin centers'}, inplace=True)
 
+@instrumented('metadata summary', 'extraction')
+def add_metadata_summary(all_metadata):
 
     """
-    create all_samples_filenames dict
+    add the columns 'Particles per frame' (list of the values of all videos, as text) and 'Noise detected' 
+    ('Noise detected', or '' if the noise level is 'No' for all videos) to the metadata of all files
+    the columns of all videos are selected once, the values of all files are read as one numpy array
+
     """
+
+    particles_per_frame_cols = [col for col in all_metadata.columns if 'Particles per frame Video' in col]
+    noise_cols = [col for col in all_metadata.columns if 'Noise level Video' in col]
+
+    # videos missing in a file (nan) are written 'nan'
+    particles_per_frame = all_metadata[particles_per_frame_cols].to_numpy(dtype=object).astype(str)
+
+    # defined the sample measure as reliable if 'No' was written for all videos in nanosight exports
+    no_noise_detected = np.all(all_metadata[noise_cols].to_numpy(dtype=object) == 'No', axis=1)
+
+    all_metadata = all_metadata.copy()
+    all_metadata['Particles per frame'] = particles_per_frame.tolist()
+    all_metadata['Noise detected'] = np.where(no_noise_detected, '', 'Noise detected')
+
+    return all_metadata
+
+
+
+def group_samples_filenames(all_files_infos):
+
+    """
+    group filenames by sample name
+
+        parameters
+        ----------
+        all_files_infos: a pandas dataframe indexed by filename, with a 'Sample name' column
     
+        returns
+        ----------
+        a dictionary where the keys are sorted sample names and the values are the corresponding list of replicates suffixes
+
+    """
+
     # group all files infos by sample name
     all_samples_filenames = all_files_infos.groupby('Sample name').apply(lambda x: sorted(list(x.index))).to_dict()
     # transform dict in OrderedDict to have sorted samples
@@ -201,39 +386,407 @@ def extract_nanosight_data_from_directory(directory_path, dilution_prefix, repli
     all_samples_filenames = {sample_name: [filename.replace(sample_name,'') for filename in replicate_filenames] 
                              for sample_name, replicate_filenames in all_samples_filenames.items()}
 
+    return all_samples_filenames
+
+
+
+@instrumented('replicates', 'extraction')
+def add_replicates_average_size_distributions(all_size_distributions, all_samples_filenames, aggregation='mean', weights=None):
+
     """
-    add average size distributions and size concentration attributes over replicates if any
+    add the average and standard deviation over replicates of the size distributions of each sample
+    (columns 'Average <sample name>' and 'Std <sample name>', after the columns of the files) to a wide dataframe
+    without dataset, e.g. the distributions computed from per-particle exports (the distributions of ExperimentSummary.csv
+    files are aggregated in the dataset, see aggregate_samples_distributions)
+    all samples are aggregated at once, with the sparse matrix of their replicates (see replicates_aggregation.py)
+
+        parameters
+        ----------
+        all_size_distributions: dataframe with the columns 'Average <filename>' of all files
+        all_samples_filenames: see group_samples_filenames
+        aggregation, weights: see aggregate_replicates and get_replicates_matrix ('mean' or 'median', weight of each filename)
+
+        returns
+        ----------
+        all_size_distributions with the columns of the samples with replicates
+
     """
 
-    # iterate over samples and average data of all replicates
-    for sample_name, replicates_filenames in all_samples_filenames.items():
-        
-        # if no replicate was detected for this sample, continue
-        if replicates_filenames==[sample_name]:
-            continue
-        
-        all_replicates_size_distributions = all_size_distributions[['Average '+sample_name+filename 
-                                                                    for filename in replicates_filenames]]
-        all_size_distributions['Average '+sample_name] = np.mean(all_replicates_size_distributions, axis=1)
-        all_size_distributions['Std '+sample_name] = np.mean(all_replicates_size_distributions, axis=1)
-        
-        all_replicates_values = all_size_concentration_attributes.loc[[sample_name+filename 
-                                                                       for filename in replicates_filenames]]
-        
+    filenames = [filename for sample_name, replicates in all_samples_filenames.items() 
+                 for filename in get_replicates_filenames(sample_name, replicates)]
+
+    replicates_matrix, samples_names = get_replicates_matrix(filenames, all_samples_filenames, weights=weights)
+
+    if len(samples_names) == 0:
+        return all_size_distributions
+
+    # (file x bin) matrix of the average distribution of each file
+    files_averages = all_size_distributions[['Average '+filename for filename in filenames]].values.T
+
+    samples_averages, samples_stds = aggregate_replicates(files_averages, replicates_matrix, aggregation=aggregation)
+
+    samples_columns = {}
+    for i, sample_name in enumerate(samples_names):
+        samples_columns['Average '+sample_name] = samples_averages[i]
+        samples_columns['Std '+sample_name] = samples_stds[i]
+
+    return pandas.concat([all_size_distributions, pandas.DataFrame(samples_columns, index=all_size_distributions.index)], axis=1)
+
+
+
+@instrumented('replicates', 'extraction')
+def add_replicates_average_attributes(all_size_concentration_attributes, all_samples_filenames, aggregation='mean', weights=None):
+
+    """
+    add a row 'sample name' to the size and concentration attributes of each sample with replicates, holding the average
+    over its replicates (or the median, see add_replicates_average_size_distributions)
+    the average of videos values and the average of std over videos values make no sense for samples, they are NaN
+
+    """
+
+    filenames = list(all_size_concentration_attributes.index)
+
+    replicates_matrix, samples_names = get_replicates_matrix(filenames, all_samples_filenames, weights=weights)
+
+    if len(samples_names) == 0:
+        return all_size_concentration_attributes
+
+    samples_values, _ = aggregate_replicates(all_size_concentration_attributes.values, replicates_matrix, aggregation=aggregation)
+
+    samples_attributes = pandas.DataFrame(samples_values, index=samples_names, columns=all_size_concentration_attributes.columns)
+
+    cols_to_write_nan = [col for col in all_size_concentration_attributes.columns if ('Video' in col or 'Std' in col)]
+    samples_attributes[cols_to_write_nan] = np.nan
+
+    return pandas.concat([all_size_concentration_attributes, samples_attributes])
+
+
+
+class BinGridMismatchError(ValueError):
+
+    """
+    raised when the files of a directory do not share the same bin grid
+    the report attribute is a pandas dataframe describing the bin grid of each file
+
+    """
+
+    def __init__(self, directory_path, report):
+
+        self.directory_path = directory_path
+        self.report = report
+
+        mismatching_filenames = list(report.index[~report['Same as reference']])
+
+        super().__init__("Error: different bin sizes", directory_path, mismatching_filenames)
+
+
+
+@instrumented('bin grids', 'extraction')
+def verify_bin_grids(experiments_data, directory_path, resample=False):
+
+    """
+    compare the bin grid of each file to a reference grid, which is the most common grid in the directory
+    the comparison uses the hash of the grids computed when the files were read
         
-        all_size_concentration_attributes.loc[sample_name] = all_replicates_values.mean()
+        parameters
+        ----------
+        experiments_data: list of the outputs of extract_experiment_data
+        directory_path: path of the directory (used in error messages)
+        resample: if True, the size distributions of mismatching files are linearly interpolated onto the reference grid
+                  (concentrations are set to 0 outside of their original grid), else a BinGridMismatchError is raised
+    
+        returns
+        ----------
+        experiments_data, with resampled size distributions if needed
+
+    """
+
+    filenames = [file_infos.index[0] for file_infos, _, _, _ in experiments_data]
+    hashes = np.array([file_infos['Bin grid hash'].iloc[0] for file_infos, _, _, _ in experiments_data])
+
+    # the reference is the most common grid (the first one in filename order in case of tie)
+    unique_hashes, first_indexes, counts = np.unique(hashes, return_index=True, return_counts=True)
+    reference_index = first_indexes[np.lexsort((first_indexes, -counts))[0]]
+
+    same_as_reference = hashes == hashes[reference_index]
+
+    if np.all(same_as_reference):
+        return experiments_data
+
+    list_bin_centers = [size_distributions['Bin centre (nm) '+filename].values 
+                        for filename, (_, size_distributions, _, _) in zip(filenames, experiments_data)]
+
+    if not resample:
+
+        report = pandas.DataFrame({'Bin grid hash': hashes,
+                                   'Number of bins': [len(bin_centers) for bin_centers in list_bin_centers],
+                                   'First bin centre': [bin_centers[0] if len(bin_centers) else np.nan for bin_centers in list_bin_centers],
+                                   'Last bin centre': [bin_centers[-1] if len(bin_centers) else np.nan for bin_centers in list_bin_centers],
+                                   'Same as reference': same_as_reference},
+                                  index=filenames)
+
+        raise BinGridMismatchError(directory_path, report)
+
+    reference_bin_centers = list_bin_centers[reference_index]
+
+    resampled_experiments_data = []
+
+    for i, (file_infos, size_distributions, size_concentration_attributes, metadata) in enumerate(experiments_data):
+
+        if not same_as_reference[i]:
+
+            bin_centers = list_bin_centers[i]
+            order = np.argsort(bin_centers)
+
+            size_distributions = pandas.DataFrame({col: reference_bin_centers if 'Bin centre' in col else 
+                                                   np.interp(reference_bin_centers, bin_centers[order], size_distributions[col].values[order], 
+                                                             left=0, right=0)
+                                                   for col in size_distributions.columns})
+
+        resampled_experiments_data.append((file_infos, size_distributions, size_concentration_attributes, metadata))
+
+    return resampled_experiments_data
+
+
+
+@instrumented('concatenation', 'extraction')
+def concatenate_experiments_data(experiments_data):
+
+    """
+    concatenate the rows of the data extracted from each experiment, the size distributions are stored in the dataset
+    (see build_dataset_from_experiments)
+    each piece is collected first, then concatenated once, to avoid copying the accumulated data for each new file
         
-        # the average of videos values and the average of std over videos values makes no sense for samples, fill with NaN
-        cols_to_write_nan = [col for col in all_size_concentration_attributes.columns if ('Video' in col or 'Std' in col)]
-        all_size_concentration_attributes.loc[sample_name][cols_to_write_nan] = np.nan
+        parameters
+        ----------
+        experiments_data: list of the outputs of extract_experiment_data
+    
+        returns
+        ----------
+        the concatenated files_infos, size_concentration_attributes and metadata dataframes
+
+    """
+
+    list_files_infos, _, list_size_concentration_attributes, list_metadata = zip(*experiments_data)
+
+    all_size_concentration_attributes = pandas.concat(list_size_concentration_attributes, axis=0)
+    all_metadata = pandas.concat(list_metadata, axis=0)
+    all_files_infos = pandas.concat(list_files_infos, axis=0)
+
+    return all_files_infos, all_size_concentration_attributes, all_metadata
+
+
+
+@instrumented('experiment', 'extraction', arguments=('filename',))
+def extract_experiment_data(directory_path, filename, experiment_summary_file, dilution_prefix, replicate_prefix, cache_directory=None):
+
+    """
+    extract the data of one experiment of a directory
+    this function is independent of the other experiments, so that it can run in a worker process
         
+        parameters
+        ----------
+        directory_path: path of the directory
+        filename: root name of the experiment
+        experiment_summary_file: path of the experiment ExperimentSummary.csv file
+        dilution_prefix: dilution prefix to consider when reading file names
+        replicate_prefix: replicate prefix to consider when reading file names
+        cache_directory: directory of the parse cache (None: the file is parsed without cache); the reshaped outputs
+                         are cached too, for the same file and prefixes
+    
+        returns
+        ----------
+        a pandas dataframe containing file information (dilution, sample name), with one row indexed by filename
+        a pandas dataframe containing the size distributions of all videos, the filename is added to the column names
+        a pandas dataframe containing size and concentration attributes, with one row indexed by filename
+        a pandas dataframe containing metadata, with one row indexed by filename
+
+    """
+
+    experiment_summary_filepath = Path(directory_path, experiment_summary_file)
+
+    """ 
+    reuse the reshaped outputs of a previous extraction if they are cached: reshaping costs more than reading
+    the parsed file from the cache
+
+    """
+    if cache_directory is not None and os.path.exists(experiment_summary_filepath):
+
+        entry_path = Path(cache_directory, get_cache_key(experiment_summary_filepath, 'reshaped', reshape_version, filename,
+                                                         dilution_prefix, replicate_prefix) + '.pkl')
+
+        experiment_data = load_cache_entry(entry_path, is_valid_experiment_data)
+
+        if experiment_data is not None:
+            count('reshape cache hits')
+            return experiment_data
+
+        count('reshape cache misses')
+
+    """ 
+    read the file 'experiment summary' which contains the data
+
+    """
+    experiment_summary_data = read_experiment_summary_file_cached(experiment_summary_filepath, cache_directory)
+
+    experiment_data = reshape_experiment_data(experiment_summary_data, filename, dilution_prefix, replicate_prefix)
+
+    if cache_directory is not None:
+        write_cache_entry(entry_path, experiment_data, experiment_summary_filepath)
+
+    return experiment_data
+
+
+
+def is_valid_experiment_data(experiment_data):
+
+    """
+    check that a cache entry is the outputs of extract_experiment_data, a tuple of four DataFrames
+
+    """
+
+    return (isinstance(experiment_data, tuple) and len(experiment_data) == 4
+            and all(isinstance(element, pandas.DataFrame) for element in experiment_data))
+
+
+
+def reshape_experiment_data(experiment_summary_data, filename, dilution_prefix, replicate_prefix):
+
+    """
+    reshape the parsed ExperimentSummary.csv file of an experiment to the rows and columns of the extracted data
+
+        parameters
+        ----------
+        experiment_summary_data: the outputs of read_experiment_summary_file (they are not modified)
+        filename: root name of the experiment
+        dilution_prefix: dilution prefix to consider when reading file names
+        replicate_prefix: replicate prefix to consider when reading file names
+
+        returns
+        ----------
+        the same outputs as extract_experiment_data
+
+    """
+
+    # store file infos to create file_infos pandas dataframe
+    file_infos = []      
+
+    # try to find dilution factor in filename
+    # if dilution factor is not found, it is set to 1
+    dilution_factor, has_dilution_been_found = get_dilution_infos(filename, dilution_prefix)
+
+    if has_dilution_been_found:
+        file_infos += [dilution_factor]
+    else:
+        file_infos += ['Not found']
+
+    # try to find replicate group in filename, if yes get corresponding sample name
+    # if replicate group is not found, filename is kept as sample name
+    sample_name, has_replicate_group_been_found = get_replicate_group(filename, replicate_prefix)
+    file_infos += [sample_name]
+
+    file_infos = pandas.DataFrame([file_infos])
+    file_infos.columns = ['Dilution factor', 'Sample name']
+    file_infos.index = [filename]
+
+    size_distributions, size_concentration_attributes, metadata = experiment_summary_data
+
+    # store a hash of the bin grid, to compare the grids of all files without comparing all bins
+    file_infos['Bin grid hash'] = hash_bin_grid(size_distributions['Bin centre (nm)'].values)
+
+    """ 
+    multiply concentrations by the dilution factor and add info in experiment infos
+
+    """        
+
+    # all concentration columns as one (column x bin) array
+    concentrations_cols = [col for col in size_distributions.columns if "Bin centre" not in col]
+    concentrations = np.ascontiguousarray(size_distributions[concentrations_cols].to_numpy(dtype=float).T) * dilution_factor
+
+    videos_cols = [col for col in concentrations_cols if 'Concentration Video' in col]
+    videos_concentrations = concentrations[[concentrations_cols.index(col) for col in videos_cols]]
+
+    """ 
+    calculate total concentration for each video
+
+    """
+    with span('integration', 'extraction'):
+        total_concentrations = simpson(x=size_distributions['Bin centre (nm)'].to_numpy(dtype=float), y=videos_concentrations, axis=1)
+
+    """ 
+    add average and standard deviation over all videos
+    """
+
+    # in size_distributions dataframe (at each bin center), videos without value at a bin (nan) are ignored
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        average_concentrations = np.nanmean(videos_concentrations, axis=0)
+        std_concentrations = np.nanstd(videos_concentrations, axis=0)
+
+    size_distributions = pandas.DataFrame({'Bin centre (nm)': size_distributions['Bin centre (nm)'].values, 
+                                           **dict(zip(concentrations_cols, concentrations)),
+                                           'Average': average_concentrations, 
+                                           'Std': std_concentrations})
+
+    # in size_concentration_attributes: a (key x video) array of floats, the total concentration being the first key;
+    # values that are not numbers are nan, and are ignored by the average and the standard deviation over videos
+    attributes_videos_cols = [col for col in size_concentration_attributes.columns if col != 'key']
+    attributes_values = pandas.to_numeric(size_concentration_attributes[attributes_videos_cols].to_numpy().ravel(), 
+                                          errors='coerce').astype(float).reshape(len(size_concentration_attributes), -1)
+
+    attributes_keys = ['Total concentration'] + list(size_concentration_attributes['key'])
+    attributes_values = np.vstack([total_concentrations.reshape(1, -1), attributes_values])
+
+    with np.errstate(invalid='ignore'), warnings.catch_warnings():
+        # keys without any value in all videos have a nan average, without warning
+        warnings.simplefilter('ignore', RuntimeWarning)
+        attributes_values = np.hstack([attributes_values, 
+                                       np.nanmean(attributes_values, axis=1, keepdims=True), 
+                                       np.nanstd(attributes_values, axis=1, keepdims=True)])
+
+    """
+    reorganize dataframes to easily concatenate the results for all samples
+    """
+
+    # reorganize size concentration attributes to have only one row, indexed by filename,
+    # and a column for each combination of key info and video (or average/std over videos)
+    size_concentration_attributes = reshape_to_one_row(attributes_values, attributes_keys, attributes_videos_cols + ['Average', 'Std'], 
+                                                       filename, dtype=float)
+
+    # do the same for metadata, whose values are kept as text
+    metadata_videos_cols = [col for col in metadata.columns if col != 'key']
+    metadata = reshape_to_one_row(metadata[metadata_videos_cols].to_numpy(dtype=object), list(metadata['key']), metadata_videos_cols, 
+                                  filename, dtype=object)
+
+    # add filename in the column names of each concentration column
+    size_distributions.columns = [col for col in size_distributions.columns + ' ' + filename]
+
+    return file_infos, size_distributions, size_concentration_attributes, metadata
+
+
+
+def reshape_to_one_row(values, keys, columns, filename, dtype):
+
+    """
+    reshape a (key x column) array to a dataframe with one row indexed by filename and one column '<key> <column>' for
+    each value, in the order of the keys then of the columns
+
+    """
+
+    return pandas.DataFrame(np.asarray(values, dtype=dtype).reshape(1, -1), index=[filename], 
+                            columns=[f"{key} {col}" for key in keys for col in columns])
+
+
+
+def hash_bin_grid(bin_centers):
+
+    """
+    hash of a bin grid, two files have the same bin grid if and only if they have the same hash
+
+    """
+
+    return hashlib.sha1(np.ascontiguousarray(bin_centers, dtype=float).tobytes()).hexdigest()
 
-    return {'files_infos': all_files_infos, 
-            'samples_filenames': all_samples_filenames,
-            'size_distributions': all_size_distributions, 
-            'size_concentration_attributes': all_size_concentration_attributes, 
-            'metadata': all_metadata
-            }
 
 
 def get_dilution_infos(filename, dilution_prefix):
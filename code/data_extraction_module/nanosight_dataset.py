@@ -0,0 +1,245 @@
+
+import numpy as np
+import pandas
+
+from data_extraction_module.replicates_aggregation import get_replicates_filenames, get_replicates_matrix, aggregate_replicates
+from app_tools.instrumentation import instrumented
+
+
+
+
+class NanosightDataset():
+
+    """
+    size distributions of all files of a directory, stored by coordinates instead of column names
+
+    the videos of all files are stored in one 3-D numpy array (file x video x bin, nan padded when files have fewer
+    videos), with the averages and standard deviations over videos of each file and over replicates of each sample
+    in 2-D arrays (file x bin, sample x bin); files and samples are found by name with dictionaries, in O(1)
+
+    the dataset is built from the distributions of each experiment (see build_dataset_from_experiments);
+    to_size_distributions exports the wide dataframe data['size_distributions'] (columns 'Concentration Video k <filename>',
+    'Average <filename>', 'Std <filename>', 'Average <sample name>'...), which is only written in the csv export
+
+    """
+
+    def __init__(self, bin_centers, filenames, concentrations, n_videos, files_averages, files_stds,
+                 samples_filenames, samples_averages, samples_stds):
+
+        self.bin_centers = bin_centers
+
+        # files coordinates
+        self.filenames = list(filenames)
+        self.file_index = {filename: i for i, filename in enumerate(self.filenames)}
+
+        # videos of each file, shape (number of files, maximum number of videos, number of bins)
+        self.concentrations = concentrations
+        self.n_videos = n_videos
+
+        # shape (number of files, number of bins)
+        self.files_averages = files_averages
+        self.files_stds = files_stds
+
+        # samples coordinates, samples_filenames gives the replicates suffixes of each sample as in data['samples_filenames']
+        self.samples_filenames = samples_filenames
+        self.samples_names = list(samples_filenames.keys())
+        self.sample_index = {sample_name: i for i, sample_name in enumerate(self.samples_names)}
+        self.sample_files = {sample_name: np.array([self.file_index[filename] for filename in get_replicates_filenames(sample_name, replicates)])
+                             for sample_name, replicates in samples_filenames.items()}
+
+        # shape (number of samples, number of bins)
+        self.samples_averages = samples_averages
+        self.samples_stds = samples_stds
+
+
+    def get_videos(self, filename):
+
+        """
+        distributions of the videos of a file, shape (number of videos, number of bins)
+
+        """
+
+        i = self.file_index[filename]
+
+        return self.concentrations[i, :self.n_videos[i]]
+
+
+    def get_file_average(self, filename):
+
+        return self.files_averages[self.file_index[filename]]
+
+
+    def get_file_std(self, filename):
+
+        return self.files_stds[self.file_index[filename]]
+
+
+    def get_sample_average(self, sample_name):
+
+        return self.samples_averages[self.sample_index[sample_name]]
+
+
+    def get_sample_std(self, sample_name):
+
+        return self.samples_stds[self.sample_index[sample_name]]
+
+
+    def get_sample_filenames(self, sample_name):
+
+        return [self.filenames[i] for i in self.sample_files[sample_name]]
+
+
+    def has_replicates(self, sample_name):
+
+        # a sample without replicate prefix is its own file
+        return get_replicates_filenames(sample_name, self.samples_filenames[sample_name]) != [sample_name]
+
+
+    def to_size_distributions(self):
+
+        """
+        export the size distributions as the wide dataframe of extract_nanosight_data_from_directory
+
+        """
+
+        columns = {'Bin centers': self.bin_centers}
+
+        for i, filename in enumerate(self.filenames):
+            for k in range(self.n_videos[i]):
+                columns['Concentration Video '+str(k+1)+' '+filename] = self.concentrations[i, k]
+            columns['Average '+filename] = self.files_averages[i]
+            columns['Std '+filename] = self.files_stds[i]
+
+        for j, sample_name in enumerate(self.samples_names):
+            if self.has_replicates(sample_name):
+                columns['Average '+sample_name] = self.samples_averages[j]
+                columns['Std '+sample_name] = self.samples_stds[j]
+
+        return pandas.DataFrame(columns)
+
+
+    def to_frames(self):
+
+        """
+        the arrays of the dataset as two dataframes, to store them in columnar files (see nanosight_data_export.py)
+
+            returns
+            ----------
+            a dataframe indexed by filename, with the number of videos of each file
+            a dataframe with one column per bin and one row per distribution: the bin centers, the videos of each file
+            (nan padded), the averages then the standard deviations of the files, then of the samples
+
+        """
+
+        files = pandas.DataFrame({'Number of videos': self.n_videos}, index=self.filenames)
+
+        distributions = np.vstack([self.bin_centers.reshape(1, -1),
+                                   self.concentrations.reshape(-1, len(self.bin_centers)),
+                                   self.files_averages, self.files_stds, self.samples_averages, self.samples_stds])
+
+        distributions = pandas.DataFrame(distributions, columns=[str(k) for k in range(len(self.bin_centers))])
+
+        return files, distributions
+
+
+
+@instrumented('dataset', 'extraction')
+def build_dataset_from_experiments(list_size_distributions, filenames, samples_filenames, aggregation='mean', weights=None):
+
+    """
+    build a NanosightDataset from the size distributions of each experiment (outputs of extract_experiment_data,
+    all on the same bin grid, see verify_bin_grids), and aggregate the replicates of each sample
+
+        parameters
+        ----------
+        list_size_distributions: the size distributions dataframe of each experiment, whose columns are, in this order,
+                                 the bin centers, the videos, and the average and standard deviation over videos;
+                                 they are read by position
+        filenames: the filename of each experiment
+        samples_filenames: see group_samples_filenames
+        aggregation, weights: aggregation of the replicates ('mean' or 'median') and weight of each filename in the mean
+                              (see get_replicates_matrix and aggregate_replicates)
+
+    """
+
+    # (column x bin) array of each experiment, the bin centers of the first one are shared by all
+    list_values = [size_distributions.to_numpy(dtype=float).T for size_distributions in list_size_distributions]
+
+    bin_centers = list_values[0][0]
+
+    n_videos = np.array([len(values) - 3 for values in list_values], dtype=int)
+
+    concentrations = np.full((len(filenames), max(n_videos, default=0), len(bin_centers)), np.nan)
+    for i, values in enumerate(list_values):
+        concentrations[i, :n_videos[i]] = values[1:-2]
+
+    files_averages = np.array([values[-2] for values in list_values]).reshape(len(filenames), len(bin_centers))
+    files_stds = np.array([values[-1] for values in list_values]).reshape(len(filenames), len(bin_centers))
+
+    samples_averages, samples_stds = aggregate_samples_distributions(filenames, files_averages, files_stds, samples_filenames,
+                                                                     aggregation=aggregation, weights=weights)
+
+    return NanosightDataset(bin_centers, filenames, concentrations, n_videos, files_averages, files_stds,
+                            samples_filenames, samples_averages, samples_stds)
+
+
+
+@instrumented('replicates', 'extraction')
+def aggregate_samples_distributions(filenames, files_averages, files_stds, samples_filenames, aggregation='mean', weights=None):
+
+    """
+    average and standard deviation (or median and median absolute deviation) of the distributions of each sample,
+    shape (number of samples, number of bins); all samples with replicates are aggregated at once with the sparse matrix
+    of their replicates (see replicates_aggregation.py), a sample without replicates has the distributions of its file
+
+    """
+
+    file_index = {filename: i for i, filename in enumerate(filenames)}
+
+    samples_averages = np.empty((len(samples_filenames), files_averages.shape[1]))
+    samples_stds = np.empty((len(samples_filenames), files_averages.shape[1]))
+
+    sample_index = {sample_name: j for j, sample_name in enumerate(samples_filenames)}
+
+    for sample_name, replicates in samples_filenames.items():
+        if get_replicates_filenames(sample_name, replicates) == [sample_name]:
+            samples_averages[sample_index[sample_name]] = files_averages[file_index[sample_name]]
+            samples_stds[sample_index[sample_name]] = files_stds[file_index[sample_name]]
+
+    replicates_matrix, replicated_samples_names = get_replicates_matrix(filenames, samples_filenames, weights=weights)
+
+    if len(replicated_samples_names) > 0:
+        rows = [sample_index[sample_name] for sample_name in replicated_samples_names]
+        samples_averages[rows], samples_stds[rows] = aggregate_replicates(files_averages, replicates_matrix, aggregation=aggregation)
+
+    return samples_averages, samples_stds
+
+
+
+def build_dataset_from_frames(files, distributions, samples_filenames):
+
+    """
+    build a NanosightDataset from the dataframes returned by NanosightDataset.to_frames, and the samples_filenames
+    dictionary
+
+    """
+
+    filenames = list(files.index)
+    n_videos = files['Number of videos'].to_numpy(dtype=int)
+
+    values = distributions.to_numpy(dtype=float)
+
+    n_files = len(filenames)
+    n_samples = len(samples_filenames)
+    n_bins = values.shape[1]
+    max_videos = max(n_videos, default=0)
+
+    # rows in the order of to_frames
+    bounds = np.cumsum([1, n_files * max_videos, n_files, n_files, n_samples, n_samples])
+
+    bin_centers = values[0]
+    concentrations = values[bounds[0]:bounds[1]].reshape(n_files, max_videos, n_bins)
+    files_averages, files_stds, samples_averages, samples_stds = [values[bounds[k]:bounds[k+1]] for k in range(1, 5)]
+
+    return NanosightDataset(bin_centers, filenames, concentrations, n_videos, files_averages, files_stds,
+                            samples_filenames, samples_averages, samples_stds)
@@ -1,28 +1,41 @@
 
-
-import numpy as np
+import re
 from pathlib import Path
 import os
 
+from app_tools.instrumentation import instrumented, count
+
+
+
+# name of an export file: <experiment>-<kind><suffix>.csv, for example 'sample 2024-05-06 14-22-10-ExperimentSummary_raw.csv'
+export_filename_regex = re.compile(r"^(?P<experiment>.*)-(?P<kind>ExperimentSummary|AllTracks|ParticleData|Summary)(?P<suffix>[^-]*)\.csv$")
 
+# dates (yyyy-mm-dd) and times (hh-mm-ss) added by the Nanosight software at the end of the experiment name
+trailing_datetimes_regex = re.compile(r"(?: (?:\d{4}-\d{2}-\d{2}|\d{2}-\d{2}-\d{2}))+$")
 
+# characters separating the root name of an experiment from the rest of a file name
+separator_regex = re.compile(r"[ _-]")
 
+
+
+@instrumented('listing', 'extraction', arguments=('directory_path',))
 def list_nanosight_files_in_directory(directory_path, raw_suffix="_raw"):
 
     """
     find all nanosight export files in a directory
-        
+    each file name is parsed once, and the files are grouped by experiment root name in a dictionary
+
         parameters
         ----------
         directory_path
         raw_suffix: raw suffix to consider when searching for raw export files
-    
+
         returns
         ----------
-        a dictionary where the keys are the root names of the experiments 
+        a dictionary where the keys are the root names of the experiments
         and the values are all the files found
         note: the experiment_summary.csv file is the one used in the app afterward
-        
+
     """
 
 
@@ -32,102 +45,109 @@ def list_nanosight_files_in_directory(directory_path, raw_suffix="_raw"):
         list_dir += dirnames
         for file in filenames:
             path_dic[file] = Path(dirpath, file)
-            
 
-    experiments = [file.replace("-ExperimentSummary.csv","") for file in path_dic 
-                    if "ExperimentSummary.csv" in file and "~lock" not in file]
+    count('files listed', len(path_dic))
 
+    """
+    parse each file name into (root, kind, raw flag)
 
-    files_dic = {}
- 
-    for experiment in experiments:
+    """
 
-        last_element = experiment.split(" ")[-1]
-        
-        datetime_at_the_end = (is_date(last_element) or is_time(last_element))
+    experiments = []
+    other_files = []
 
-        experiment_root = experiment
-            
-        while datetime_at_the_end:
+    for file in path_dic:
 
-            experiment_root = experiment_root.replace(" "+last_element, "")
+        if "~lock" in file:
+            continue
 
-            last_element = experiment_root.split(" ")[-1]
-            
-            datetime_at_the_end = (is_date(last_element) or is_time(last_element))
-            
- 
-        all_tracks_files = [path_dic[file] for file in path_dic
-                    if experiment_root in file and "AllTracks" in file and "~lock" not in file]      
-        
-        particle_data_files = [path_dic[file] for file in path_dic
-                    if experiment_root in file and "ParticleData" in file and "~lock" not in file]      
+        match = export_filename_regex.match(file)
 
-        summary_files = [path_dic[file] for file in path_dic
-                    if experiment_root in file and "Summary" in file 
-                    and "ExperimentSummary" not in file and "~lock" not in file]        
+        if match is None:
+            continue
 
-        experiment_summary_file =  path_dic[experiment + "-ExperimentSummary.csv"]
+        experiment, kind, suffix = match.group('experiment', 'kind', 'suffix')
+
+        if kind == "ExperimentSummary" and suffix == "":
+            experiments.append(experiment)
+
+        elif kind != "ExperimentSummary":
+            other_files.append((get_experiment_root(experiment), kind, suffix == raw_suffix, path_dic[file]))
+
+    """
+    group the files by experiment root
+
+    """
+
+    files_dic = {}
+
+    for experiment in experiments:
+
+        experiment_root = get_experiment_root(experiment)
 
- 
         if experiment + "-ExperimentSummary"+raw_suffix+".csv" in path_dic:
             experiment_summary_raw_file =  path_dic[experiment + "-ExperimentSummary"+raw_suffix+".csv"]
         else:
             experiment_summary_raw_file = None
-            
-            
-        particle_data_raw_files = [file for file in particle_data_files if raw_suffix+".csv" in str(file)]
-        particle_data_files = [file for file in particle_data_files if raw_suffix+".csv" not in str(file)]
- 
-        
-        files_dic[experiment_root] = {"all_tracks_file":all_tracks_files,
-                                 "particle_data_raw_file":particle_data_raw_files,
-                                 "particle_data_file":particle_data_files,
-                                 "summary_file":summary_files,
-                                 "experiment_summary_file":experiment_summary_file,
+
+        files_dic[experiment_root] = {"all_tracks_file":[],
+                                 "particle_data_raw_file":[],
+                                 "particle_data_file":[],
+                                 "summary_file":[],
+                                 "experiment_summary_file":path_dic[experiment + "-ExperimentSummary.csv"],
                                  "experiment_summary_raw_file":experiment_summary_raw_file}
-   
+
+    for root, kind, is_raw, path in other_files:
+
+        experiment_root = find_experiment_root(root, files_dic)
+
+        if experiment_root is None:
+            continue
+
+        if kind == "AllTracks":
+            files_dic[experiment_root]["all_tracks_file"].append(path)
+        elif kind == "ParticleData" and is_raw:
+            files_dic[experiment_root]["particle_data_raw_file"].append(path)
+        elif kind == "ParticleData":
+            files_dic[experiment_root]["particle_data_file"].append(path)
+        else:
+            files_dic[experiment_root]["summary_file"].append(path)
+
+    count('experiments found', len(files_dic))
+
     return files_dic
 
 
 
+def get_experiment_root(experiment):
+
+    """
+    remove the dates and times at the end of an experiment name
+
+    """
+
+    return trailing_datetimes_regex.sub("", experiment)
+
+
+
+def find_experiment_root(root, experiment_roots):
+
+    """
+    find the experiment a file belongs to
+    if the root of the file is not an experiment root (for example 'sample_001' for the video files of 'sample'),
+    the longest experiment root that the file root starts with, followed by a separator, is used
+
+        returns
+        ----------
+        the experiment root, None if the file does not belong to any experiment
+
+    """
+
+    if root in experiment_roots:
+        return root
+
+    for separator in reversed(list(separator_regex.finditer(root))):
+        if root[:separator.start()] in experiment_roots:
+            return root[:separator.start()]
 
-            
-def is_date(string):
-    
-    split = string.split("-")
-    
-    if len(split)!=3:
-        return False
-
-    if np.sum([split[u].isdigit() for u in range(len(split))])!=3:
-        return False
-        
-    if len(split[0])!=4 or len(split[1])!=2 or len(split[2])!=2:
-        return False
-    
-    return True
-
-
-
-def is_time(string):
-    
-    split = string.split("-")
-    
-    if len(split)!=3:
-        return False
-    
-    if np.sum([split[u].isdigit() for u in range(len(split))])!=3:
-        return False
-    
-    if len(split[0])!=2 or len(split[1])!=2 or len(split[2])!=2:
-        return False
-    
-    return True
-
-        
-            
-            
-            
-        
-        
+    return None
@@ -5,115 +5,107 @@ import numpy as np
 import pandas
 from csv import reader
 
+from app_tools.instrumentation import instrumented, count
 
+
+
+# version of the parser, to increment when the outputs of read_experiment_summary_file change
+# (the cached outputs of previous versions are then ignored)
+parser_version = 1
+
+
+@instrumented('reading', 'extraction', arguments=('filepath',))
 def read_experiment_summary_file(filepath):
- 
+
     """
     read an Nanosight export ExperimentSummary.csv file
-        
+    the file is read only once, its sections are then located in a single scan of the rows
+
         parameters
         ----------
         filepath: path of the file
-    
+
         returns
         ----------
         a pandas dataframe containing size distributions
         a pandas dataframe containing size attributes (mean, mode, etc.) and concentration attributes (total concentration)
         a pandas dataframe containing experiment infos (particles per frame, etc.)
-        
+
     """
 
     if not os.path.exists(filepath):
         raise ValueError("File not found", filepath)
 
     """
-    read the csv file to find where data start and end
+    read the whole file at once and split it in csv rows
     """
 
-    # open file in read mode
-    with open(filepath, 'r', encoding="ISO-8859-1") as read_obj:
-        # pass the file object to reader() to get the reader object
-        csv_reader = reader(read_obj)
-        # iterate over each row in the csv using reader object
-        rows_list = []
-        for row in csv_reader:
-            # rows_list contains each row of the csv
-            rows_list.append(row)
-
-    # transform each row in character string to help processing
-    rows_list = np.array(["-".join(row) for row in rows_list]).astype(str)
-
-    # find the row index marking the start of the size distribution data
-    is_start = [True if row=='Graph Data-' else False for row in rows_list]
-    start_index = np.where(is_start)[0][0]
-        
+    with open(filepath, 'rb') as read_obj:
+        buffer = read_obj.read()
+
+    rows_list = list(reader(buffer.decode("ISO-8859-1").splitlines()))
+
+    count('bytes read', len(buffer))
+    count('rows read', len(rows_list))
+
     """
-    extract size distributions data
+    find where each section starts and ends in one scan of the rows
     """
 
-    # extract size distributions data as a pandas dataframe
-    size_distributions = pandas.read_csv(filepath, skiprows=start_index+1, sep=",", 
-                                         encoding = "ISO-8859-1", header=0)
+    sections = index_experiment_summary_sections(rows_list)
 
-    # drop unnamed column
-    for col in [column for column in size_distributions.columns if "Unnamed:" in column]:
-        size_distributions.drop(col, axis=1, inplace=True)
+    """
+    extract size distributions data
+    """
+
+    # the row following 'Graph Data' contains the column names
+    header = rows_list[sections['Graph Data']+1]
 
-    # search stop index
-    for i in range(len(size_distributions)):
-        if str(size_distributions.iloc[i]["Bin centre (nm)"])=="nan" or str(size_distributions.iloc[i]["Bin centre (nm)"])=="Percentile":
-            stop_index = i   
-            break
-        
-    # slice the dataframe to end at stop index
-    size_distributions = size_distributions.iloc[:stop_index]
+    # keep only named columns (the rows end with a separator, which creates an unnamed column)
+    named_columns = [k for k in range(len(header)) if header[k] != '']
 
-    # convert dataframe to float as it contains only numerical information
-    size_distributions = size_distributions.astype(float)
-    
-    n_videos = len([col for col in size_distributions.columns if 'Concentration (particles / ml)' in col])
+    # blank rows are ignored, as pandas.read_csv would do
+    distribution_rows = [row for row in rows_list[sections['Graph Data']+2:sections['Percentile']] if len(row) > 0]
 
     # rename the columns to make the names more explicit and concise."
-    videos_cols = [col for col in size_distributions.columns if "Concentration (particles / ml)" in col] 
-    new_videos_cols = ['Concentration Video '+str(k+1) for k in range(len(videos_cols))]
-    size_distributions.rename(columns = {videos_cols[k]: new_videos_cols[k] for k in range(len(videos_cols))}, inplace=True)
-    
+    # each video column has the same name in the file, they are numbered in order of appearance
+    columns = []
+    n_videos = 0
+    for k in named_columns:
+        if "Concentration (particles / ml)" in header[k]:
+            n_videos += 1
+            columns.append('Concentration Video '+str(n_videos))
+        else:
+            columns.append(header[k])
+
+    # convert data to float as it contains only numerical information
+    size_distributions = pandas.DataFrame(rows_to_float_array(distribution_rows, named_columns), columns=columns)
+
     # drop nanosight average and standard errors calculations, we will recalculate everything
     # they are present only for non autosampler exports
     if 'Concentration average' in size_distributions.columns:
         size_distributions.drop(columns=['Concentration average', 'Standard Error'], axis=1, inplace=True)
-        
+
     # columns are now : [Bin centre (nm), Concentration Video 1, ..., Concentration Video 5]
 
     """
     extract other results
     """
-    
-    # details_experiment = pandas.read_csv(filepath, sep=",", usecols=range(2), encoding = "ISO-8859-1")      
-
-    # extract all available results        
-    is_start_experiment_infos = [True if '[Results]' in row else False for row in rows_list]
-    start_experiment_infos_index = np.where(is_start_experiment_infos)[0][0]
-    experiment_infos = pandas.read_csv(filepath, sep=",", skiprows=start_experiment_infos_index, usecols=range(n_videos+1), encoding = 'ISO-8859-1')   
-    experiment_infos.columns = ['key'] + ['Video '+str(k+1) for k in range(n_videos)]
-    
+
+    # all available results are the non blank rows after '[Results]', restricted to the key column and one column per video
+    experiment_infos = [[value if value != '' else np.nan for value in row[:n_videos+1]] + [np.nan] * (n_videos+1-len(row))
+                        for row in rows_list[sections['[Results]']+1:] if len(row) > 0]
+    experiment_infos = pandas.DataFrame(experiment_infos, columns=['key'] + ['Video '+str(k+1) for k in range(n_videos)],
+                                        dtype=object)
+
     # extract size_data
     index_start_size_data = np.where(experiment_infos['key']=='[Size Data]')[0][0]
     index_end_size_data = np.where(experiment_infos['key']=='Graph Data')[0][0]
     size_concentration_attributes = experiment_infos[index_start_size_data+1:index_end_size_data]
     information_indexes = [True if key in ['Mean', 'Mode', 'SD', 'D50', 'D90'] else False for key in size_concentration_attributes['key']]
 
-    size_concentration_attributes = size_concentration_attributes[information_indexes]
-    size_concentration_attributes['key'] = size_concentration_attributes['key'].apply(lambda s: s + ' size')
-    
-    # # add total concentration
-    # not necessary because we recalculate it later in nanosight_data_extraction.py
-    # key_of_interest = ['Concentration (Particles / ml)']
-    # key_of_interest_indexes = [True if key in key_of_interest else False for key in experiment_infos['key']]
-    # size_concentration_attributes = pandas.concat([experiment_infos[key_of_interest_indexes], size_concentration_attributes])
-    # # rename the column
-    # size_concentration_attributes['key'] = size_concentration_attributes['key'].apply(lambda s: 
-    #                                             s.replace('Concentration (Particles / ml)', 'Total concentration'))
+    size_concentration_attributes = size_concentration_attributes[information_indexes].copy()
+    size_concentration_attributes['key'] = size_concentration_attributes['key'] + ' size'
 
     # extract metadata results
     key_of_interest = ['Particles per frame', 'Noise level']
@@ -121,13 +113,11 @@ def read_experiment_summary_file(filepath):
     experiment_infos = experiment_infos[key_of_interest_indexes]
 
     # keep only first row of particles frame and noise level, which contains the desired information
-    particles_per_frame_rows = (experiment_infos['key']=='Particles per frame')
-    indexes = np.where(particles_per_frame_rows)[0]
-    experiment_infos.drop(experiment_infos.index[indexes[1]], axis=0, inplace=True)
-    particles_per_frame_rows = (experiment_infos['key']=='Noise level')
-    indexes = np.where(particles_per_frame_rows)[0]
-    experiment_infos.drop(experiment_infos.index[indexes[1]], axis=0, inplace=True)
-    
+    for key in key_of_interest:
+        indexes = np.where(experiment_infos['key']==key)[0]
+        if len(indexes) > 1:
+            experiment_infos = experiment_infos.drop(experiment_infos.index[indexes[1]], axis=0)
+
     # regenerate indexes for easier manipulation
     size_concentration_attributes.reset_index(inplace=True, drop=True)
 
@@ -137,3 +127,65 @@ def read_experiment_summary_file(filepath):
 
 
 
+def index_experiment_summary_sections(rows_list):
+
+    """
+    locate the sections of an ExperimentSummary.csv file in a single scan of its rows
+
+        parameters
+        ----------
+        rows_list: list of the csv rows of the file
+
+        returns
+        ----------
+        a dictionary giving the row index of '[Results]', '[Size Data]', 'Graph Data'
+        and of the end of the size distributions ('Percentile')
+
+    """
+
+    sections = {}
+
+    for i, row in enumerate(rows_list):
+
+        key = row[0] if len(row) > 0 else None
+
+        if '[Results]' not in sections:
+            if '[Results]' in "-".join(row):
+                sections['[Results]'] = i
+
+        elif '[Size Data]' not in sections:
+            if key == '[Size Data]':
+                sections['[Size Data]'] = i
+
+        # the size distributions start after the row 'Graph Data'
+        elif 'Graph Data' not in sections:
+            if key == 'Graph Data':
+                sections['Graph Data'] = i
+
+        # and end at the first row without bin centre (blank rows are ignored) or at the percentiles
+        elif key is not None and i > sections['Graph Data']+1:
+            if key.strip() in ['', 'nan', 'Percentile']:
+                sections['Percentile'] = i
+                break
+
+    for section in ['[Results]', '[Size Data]', 'Graph Data']:
+        if section not in sections:
+            raise ValueError("Section not found: "+section)
+
+    if 'Percentile' not in sections:
+        sections['Percentile'] = len(rows_list)
+
+    return sections
+
+
+
+def rows_to_float_array(rows_list, columns):
+
+    """
+    convert the selected columns of csv rows to a float array, missing and empty values are converted to NaN
+
+    """
+
+    array = np.array([[row[k] if k < len(row) and row[k] != '' else 'nan' for k in columns] for row in rows_list], dtype=str)
+
+    return array.reshape(len(rows_list), len(columns)).astype(float)
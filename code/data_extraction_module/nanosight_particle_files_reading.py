@@ -0,0 +1,176 @@
+
+import os
+import time
+import numpy as np
+import pandas
+from csv import reader
+
+
+
+# possible names of the columns of AllTracks.csv and ParticleData.csv exports, for each column read by the app
+# (compared case insensitively)
+particle_files_columns = {'track_id': ['Track ID', 'Particle ID', 'Track', 'Particle', 'ID'],
+                          'frame': ['Frame', 'Frame Number', 'Frame number', 'Frame no.', 'Frame No'],
+                          'x': ['x', 'x (px)', 'x Position', 'Position x', 'X Position (px)'],
+                          'y': ['y', 'y (px)', 'y Position', 'Position y', 'Y Position (px)'],
+                          'size': ['Size', 'Size (nm)', 'Estimated Size (nm)', 'Diameter (nm)', 'Size/nm']}
+
+particle_files_dtypes = {'track_id': np.int64, 'frame': np.int64, 'x': np.float64, 'y': np.float64, 'size': np.float64}
+
+# default number of rows read at once, memory used is about chunk_size x number of columns read x 8 bytes
+default_chunk_size = 200000
+
+
+
+def iter_particle_file_chunks(filepath, columns=('track_id', 'frame', 'x', 'y', 'size'), size_range=None, frame_range=None,
+                              chunk_size=default_chunk_size, column_names=None, sorted_by_frame=False, stats=None):
+
+    """
+    read an AllTracks.csv or ParticleData.csv export chunk by chunk, with bounded memory
+
+        parameters
+        ----------
+        filepath: path of the file
+        columns: columns to yield, among 'track_id', 'frame', 'x', 'y' and 'size' (column projection)
+        size_range: (min, max) sizes in nm, only the rows with min <= size <= max are yielded (default: all sizes)
+        frame_range: (min, max) frames, only the rows with min <= frame <= max are yielded (default: all frames)
+        chunk_size: number of rows read at once
+        column_names: dictionary giving the name in the file of some columns, when it is not in particle_files_columns
+        sorted_by_frame: if True, the file is assumed sorted by frame and reading stops after frame_range
+        stats: optional dictionary, filled during the iteration with the number of rows read and yielded,
+               the elapsed time and the throughput in rows per second
+
+        yields
+        ----------
+        dictionaries whose keys are the requested columns and values typed numpy arrays of the same length
+
+    """
+
+    if not os.path.exists(filepath):
+        raise ValueError("File not found", filepath)
+
+    for column in columns:
+        if column not in particle_files_columns:
+            raise ValueError("Unknown column", column, list(particle_files_columns.keys()))
+
+    # the columns used by predicates are read even if they are not yielded
+    read_columns = list(columns)
+    if size_range is not None and 'size' not in read_columns:
+        read_columns.append('size')
+    if frame_range is not None and 'frame' not in read_columns:
+        read_columns.append('frame')
+
+    header_index, file_columns = find_particle_file_header(filepath, read_columns, column_names)
+
+    if stats is None:
+        stats = {}
+    stats.update({'rows_read': 0, 'rows_yielded': 0, 'elapsed_time': 0., 'rows_per_second': 0.})
+
+    start = time.perf_counter()
+
+    # all columns are parsed as float, so that empty values do not make the parsing fail, integers are cast afterwards
+    chunks = pandas.read_csv(filepath, skiprows=header_index, header=0, usecols=list(file_columns.values()),
+                             dtype={file_column: np.float64 for file_column in file_columns.values()},
+                             encoding="ISO-8859-1", chunksize=chunk_size, on_bad_lines='skip')
+
+    with chunks:
+
+        for chunk in chunks:
+
+            values = {column: chunk[file_columns[column]].to_numpy() for column in read_columns}
+
+            n_rows = len(chunk)
+
+            # rows without value for a requested column (e.g. summary rows at the end of the file) are ignored
+            keep = np.ones(n_rows, dtype=bool)
+            for column in read_columns:
+                keep &= ~np.isnan(values[column])
+
+            if size_range is not None:
+                keep &= (values['size'] >= size_range[0]) & (values['size'] <= size_range[1])
+
+            if frame_range is not None:
+                keep &= (values['frame'] >= frame_range[0]) & (values['frame'] <= frame_range[1])
+
+            stats['rows_read'] += n_rows
+
+            if keep.any():
+                block = {column: values[column][keep].astype(particle_files_dtypes[column]) for column in columns}
+                stats['rows_yielded'] += int(keep.sum())
+                update_throughput(stats, start)
+                yield block
+            else:
+                update_throughput(stats, start)
+
+            # frames after frame_range will not be yielded, stop reading
+            if sorted_by_frame and frame_range is not None and n_rows > 0 and np.nanmin(values['frame']) > frame_range[1]:
+                break
+
+    update_throughput(stats, start)
+
+
+
+def update_throughput(stats, start):
+
+    stats['elapsed_time'] = time.perf_counter() - start
+    stats['rows_per_second'] = stats['rows_read'] / stats['elapsed_time'] if stats['elapsed_time'] > 0 else 0.
+
+
+
+def find_particle_file_header(filepath, columns, column_names=None, max_header_rows=100):
+
+    """
+    find the header row of an AllTracks.csv or ParticleData.csv export, and the name of the requested columns in the file
+    some exports start with a description of the experiment, the header is the first row containing all requested columns
+
+        returns
+        ----------
+        the index of the header row
+        a dictionary giving the name in the file of each requested column
+
+    """
+
+    candidates = {column: [name.lower() for name in particle_files_columns[column]] for column in columns}
+
+    if column_names is not None:
+        for column, name in column_names.items():
+            if column in candidates:
+                candidates[column] = [name.lower()]
+
+    with open(filepath, 'r', encoding="ISO-8859-1", newline='') as read_obj:
+
+        for header_index, row in enumerate(reader(read_obj)):
+
+            if header_index >= max_header_rows:
+                break
+
+            names = {name.strip().lower(): name for name in row}
+
+            file_columns = {}
+            for column in columns:
+                for candidate in candidates[column]:
+                    if candidate in names:
+                        file_columns[column] = names[candidate]
+                        break
+
+            if len(file_columns) == len(columns):
+                return header_index, file_columns
+
+    raise ValueError("Columns not found in the file header", filepath, columns)
+
+
+
+def measure_particle_file_throughput(filepath, **kwargs):
+
+    """
+    read a whole AllTracks.csv or ParticleData.csv export with iter_particle_file_chunks and return the reading stats
+    (number of rows read and yielded, elapsed time and rows per second)
+
+    """
+
+    stats = {}
+
+    for _ in iter_particle_file_chunks(filepath, stats=stats, **kwargs):
+        pass
+
+    return stats
@@ -0,0 +1,152 @@
+
+import numpy as np
+import pandas
+
+from data_extraction_module.nanosight_export_files_listing import list_nanosight_files_in_directory
+from data_extraction_module.nanosight_particle_files_reading import iter_particle_file_chunks, default_chunk_size
+from data_extraction_module.nanosight_data_extraction import (get_dilution_infos, get_replicate_group, group_samples_filenames,
+                                                              add_replicates_average_size_distributions)
+
+
+
+
+def compute_particle_size_distributions(directory_path, dilution_prefix, replicate_prefix, bin_centers, source='all_tracks',
+                                        scattering_volume_ml=None, chunk_size=default_chunk_size):
+
+    """
+    compute the size distributions of all experiments of a directory from the per-particle exports, on any bin grid
+    each video file is read once, by chunks, and its histogram is accumulated chunk by chunk
+
+    each row of an AllTracks.csv file is a particle seen in a frame, so the histogram divided by the number of frames
+    gives particles per frame in each bin; dividing by the bin widths and by the scattering volume gives concentrations
+    (particles / ml / nm, as in the 'Graph Data' of ExperimentSummary.csv), which are finally multiplied by the dilution factor
+    each row of a ParticleData.csv file is a track, the same normalization then gives tracks per frame instead of particles
+
+        parameters
+        ----------
+        directory_path: path of the directory
+        dilution_prefix: dilution prefix to consider when reading file names
+        replicate_prefix: replicate prefix to consider when reading file names
+        bin_centers: centers of the bins in nm, in increasing order (the bin edges are the midpoints between centers)
+        source: 'all_tracks' (default) to use AllTracks.csv files, 'particle_data' to use ParticleData.csv files;
+                each file of an experiment is one video
+        scattering_volume_ml: volume in ml in which particles are detected; if None, distributions are given
+                              per unit volume (particles per frame / nm, multiplied by the dilution factor)
+        chunk_size: number of rows read at once
+
+        returns
+        ----------
+        a pandas dataframe shaped like the size_distributions dataframe of extract_nanosight_data_from_directory:
+        'Bin centers', then for each experiment 'Concentration Video k <filename>', 'Average <filename>', 'Std <filename>',
+        then 'Average <sample name>' and 'Std <sample name>' for samples with replicates
+        experiments without per-particle files are skipped
+
+    """
+
+    if source == 'all_tracks':
+        files_key = 'all_tracks_file'
+    elif source == 'particle_data':
+        files_key = 'particle_data_file'
+    else:
+        raise ValueError("Unknown source, expected 'all_tracks' or 'particle_data'", source)
+
+    bin_centers = np.asarray(bin_centers, dtype=float)
+    bin_edges = get_bin_edges(bin_centers)
+    bin_widths = np.diff(bin_edges)
+
+    files_dic = list_nanosight_files_in_directory(directory_path)
+
+    list_size_distributions = [pandas.DataFrame({'Bin centers': bin_centers})]
+    files_infos = []
+
+    for filename in sorted(files_dic.keys()):
+
+        video_files = sorted(files_dic[filename][files_key], key=str)
+
+        if len(video_files) == 0:
+            continue
+
+        dilution_factor, _ = get_dilution_infos(filename, dilution_prefix)
+        sample_name, _ = get_replicate_group(filename, replicate_prefix)
+
+        # one row per video: particles per frame in each bin, divided by bin widths
+        videos_concentrations = np.array([histogram_particle_file(video_file, bin_edges, chunk_size=chunk_size)
+                                          for video_file in video_files]) / bin_widths
+
+        if scattering_volume_ml is not None:
+            videos_concentrations = videos_concentrations / scattering_volume_ml
+
+        videos_concentrations = videos_concentrations * dilution_factor
+
+        size_distributions = {'Concentration Video '+str(k+1)+' '+filename: videos_concentrations[k]
+                              for k in range(len(video_files))}
+        size_distributions['Average '+filename] = np.mean(videos_concentrations, axis=0)
+        size_distributions['Std '+filename] = np.std(videos_concentrations, axis=0)
+
+        list_size_distributions.append(pandas.DataFrame(size_distributions))
+        files_infos.append((filename, sample_name))
+
+    if len(files_infos) == 0:
+        raise ValueError("No per-particle export file found", directory_path, source)
+
+    all_size_distributions = pandas.concat(list_size_distributions, axis=1)
+
+    # add averages over replicates, as for the distributions of ExperimentSummary.csv files
+    files_infos = pandas.DataFrame({'Sample name': [sample_name for _, sample_name in files_infos]},
+                                   index=[filename for filename, _ in files_infos])
+
+    return add_replicates_average_size_distributions(all_size_distributions, group_samples_filenames(files_infos))
+
+
+
+def histogram_particle_file(filepath, bin_edges, chunk_size=default_chunk_size):
+
+    """
+    histogram of the particle sizes of an AllTracks.csv or ParticleData.csv file, divided by its number of frames
+
+        returns
+        ----------
+        the number of rows per frame in each bin
+
+    """
+
+    n_bins = len(bin_edges) - 1
+    counts = np.zeros(n_bins, dtype=np.int64)
+
+    first_frame = np.inf
+    last_frame = -np.inf
+
+    for block in iter_particle_file_chunks(filepath, columns=('frame', 'size'), chunk_size=chunk_size):
+
+        # the number of frames is counted on all rows, including the particles outside of the grid
+        first_frame = min(first_frame, block['frame'].min())
+        last_frame = max(last_frame, block['frame'].max())
+
+        sizes = block['size'][(block['size'] >= bin_edges[0]) & (block['size'] <= bin_edges[-1])]
+
+        # index of the bin of each particle; a size equal to the last edge belongs to the last bin
+        bin_indexes = np.minimum(np.searchsorted(bin_edges, sizes, side='right') - 1, n_bins - 1)
+        counts += np.bincount(bin_indexes, minlength=n_bins)
+
+    if counts.sum() == 0:
+        return counts.astype(float)
+
+    n_frames = last_frame - first_frame + 1
+
+    return counts / n_frames
+
+
+
+def get_bin_edges(bin_centers):
+
+    """
+    bin edges of a grid of bin centers: midpoints between centers, the first and last bins are symmetric around their centers
+
+    """
+
+    if len(bin_centers) < 2 or np.any(np.diff(bin_centers) <= 0):
+        raise ValueError("Bin centers must be at least two increasing values")
+
+    midpoints = (bin_centers[1:] + bin_centers[:-1]) / 2
+
+    return np.concatenate([[2 * bin_centers[0] - midpoints[0]], midpoints, [2 * bin_centers[-1] - midpoints[-1]]])
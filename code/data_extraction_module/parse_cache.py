@@ -0,0 +1,204 @@
+
+import os
+import pickle
+import hashlib
+import warnings
+import threading
+from pathlib import Path
+
+import numpy as np
+import pandas
+
+from data_extraction_module.nanosight_export_files_reading import read_experiment_summary_file, parser_version
+from app_tools.instrumentation import instrumented, count
+
+
+
+# maximum size of the cache on disk, in bytes; least recently used entries are removed above it
+default_max_cache_size = 1024**3
+
+
+
+def read_experiment_summary_file_cached(filepath, cache_directory):
+
+    """
+    read an Nanosight export ExperimentSummary.csv file, using an on-disk cache of the parsed data
+    exports never change after the instrument writes them, so an entry stays valid as long as
+    the path, size and modification time of the file, the parser version and the pandas and numpy versions are the same
+
+        parameters
+        ----------
+        filepath: path of the file
+        cache_directory: directory of the cache entries (if None, the file is read without cache)
+
+        returns
+        ----------
+        the same outputs as read_experiment_summary_file
+
+    """
+
+    if cache_directory is None:
+        return read_experiment_summary_file(filepath)
+
+    if not os.path.exists(filepath):
+        raise ValueError("File not found", filepath)
+
+    entry_path = Path(cache_directory, get_cache_key(filepath) + '.pkl')
+
+    experiment_summary_data = load_cache_entry(entry_path, is_valid_entry)
+
+    if experiment_summary_data is not None:
+        count('parse cache hits')
+        return experiment_summary_data
+
+    count('parse cache misses')
+
+    experiment_summary_data = read_experiment_summary_file(filepath)
+
+    write_cache_entry(entry_path, experiment_summary_data, filepath)
+
+    return experiment_summary_data
+
+
+
+def load_cache_entry(entry_path, is_valid):
+
+    """
+    load a cache entry
+
+        parameters
+        ----------
+        entry_path: path of the entry
+        is_valid: function returning True if the loaded object is the expected outputs
+
+        returns
+        ----------
+        the cached outputs, None if there is no valid entry
+
+    """
+
+    try:
+        with open(entry_path, 'rb') as read_obj:
+            cached_data = pickle.load(read_obj)
+
+    except Exception:
+        # no entry, or an entry that could not be read (truncated, or pickled by incompatible library versions):
+        # the outputs are computed again
+        return None
+
+    # an entry that is not the expected outputs (e.g. written by another version of the code) is computed again
+    if not is_valid(cached_data):
+        return None
+
+    # mark the entry as recently used, the least recently used entries are evicted first
+    try:
+        os.utime(entry_path)
+    except OSError:
+        pass
+
+    return cached_data
+
+
+
+def write_cache_entry(entry_path, cached_data, filepath):
+
+    """
+    write a cache entry of the outputs computed from a file
+
+    """
+
+    # write in a temporary file first, so that other processes never read a partially written entry
+    tmp_path = Path(entry_path.parent, f"{entry_path.stem}.{os.getpid()}.{threading.get_ident()}.tmp")
+
+    # the cache only saves time: if the entry cannot be written (e.g. disk full, read-only results directory),
+    # the outputs are still returned
+    try:
+        os.makedirs(entry_path.parent, exist_ok=True)
+        with open(tmp_path, 'wb') as write_obj:
+            pickle.dump(cached_data, write_obj, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, entry_path)
+
+    except OSError as exception:
+        warnings.warn(f"The cache entry of {filepath} could not be written: {exception}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+
+def is_valid_entry(experiment_summary_data):
+
+    """
+    check that a cache entry is the outputs of read_experiment_summary_file, a tuple of three DataFrames
+
+    """
+
+    return (isinstance(experiment_summary_data, tuple) and len(experiment_summary_data) == 3
+            and all(isinstance(element, pandas.DataFrame) for element in experiment_summary_data))
+
+
+
+def get_cache_key(filepath, *parameters):
+
+    """
+    key of the cache entry of a file, built from its path, size, modification time, the parser version, and the
+    pandas and numpy versions (the DataFrames pickled by a version may not load in another one)
+    the parameters of outputs computed from the parsed file (e.g. the prefixes of the reshaped data) are added to the key
+
+    """
+
+    stat = os.stat(filepath)
+
+    key = f"{os.path.abspath(filepath)}|{stat.st_size}|{stat.st_mtime_ns}|{parser_version}|{pandas.__version__}|{np.__version__}"
+    key += "".join(f"|{parameter!r}" for parameter in parameters)
+
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+
+@instrumented('cache eviction', 'extraction')
+def evict_cache_entries(cache_directory, max_cache_size=default_max_cache_size):
+
+    """
+    remove the least recently used entries until the cache size is below max_cache_size (in bytes)
+
+    """
+
+    if cache_directory is None or not os.path.exists(cache_directory):
+        return
+
+    entries = []
+    for entry in os.scandir(cache_directory):
+        if entry.name.endswith('.pkl'):
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    cache_size = sum(size for _, size, _ in entries)
+
+    # the entries are sorted from the least recently used to the most recently used
+    for _, size, path in sorted(entries):
+
+        if cache_size <= max_cache_size:
+            break
+
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+
+        cache_size -= size
+
+
+
+def clear_parse_cache(cache_directory):
+
+    """
+    remove all entries of the cache
+
+    """
+
+    if cache_directory is None or not os.path.exists(cache_directory):
+        return
+
+    for entry in os.scandir(cache_directory):
+        if entry.name.endswith('.pkl') or entry.name.endswith('.tmp'):
+            os.remove(entry.path)
@@ -0,0 +1,150 @@
+
+import numpy as np
+from scipy import sparse
+
+
+
+# aggregations of the replicates of a sample: weighted mean and standard deviation, or median and median absolute deviation
+replicates_aggregations = ('mean', 'median')
+
+# scale of the median absolute deviation, so that it estimates the standard deviation of normally distributed replicates
+mad_scale = 1.4826
+
+
+
+
+def get_replicates_matrix(filenames, samples_filenames, weights=None):
+
+    """
+    sparse indicator matrix of the replicates of each sample, one row per sample with replicates and one column per file:
+    the row of a sample holds the weights of its replicates, 0 elsewhere; the product of this matrix with a
+    (file x value) matrix sums the values of the replicates of all samples at once
+
+        parameters
+        ----------
+        filenames: filenames of the columns of the matrix (rows of the values to aggregate)
+        samples_filenames: dictionary where the keys are sample names and the values are the replicates suffixes
+                           (see group_samples_filenames), samples without replicates are skipped
+        weights: dictionary of the weight of each filename, positive or 0, with a positive total for each sample
+                 (optional, default: all replicates have the same weight, files missing from the dictionary have weight 1)
+
+        returns
+        ----------
+        the matrix (scipy.sparse csr matrix, shape (number of samples with replicates, number of files))
+        the sample names of its rows
+
+    """
+
+    file_index = {filename: j for j, filename in enumerate(filenames)}
+
+    # a sample without replicates is its own file (its replicates suffixes are [''] or [sample name])
+    samples_names = [sample_name for sample_name, replicates in samples_filenames.items() 
+                     if get_replicates_filenames(sample_name, replicates) != [sample_name]]
+
+    rows = []
+    columns = []
+    for i, sample_name in enumerate(samples_names):
+        for filename in get_replicates_filenames(sample_name, samples_filenames[sample_name]):
+            rows.append(i)
+            columns.append(file_index[filename])
+
+    if weights is None:
+        values = np.ones(len(columns))
+    else:
+        values = np.array([weights.get(filenames[j], 1.0) for j in columns], dtype=float)
+
+        # a replicate can be left out with a weight of 0, but the weighted mean of a sample needs a positive total weight
+        # (nan weights are rejected too)
+        if not np.all(values >= 0):
+            raise ValueError("Replicates weights must be positive or 0", weights)
+
+        totals = np.bincount(np.array(rows, dtype=int), weights=values, minlength=len(samples_names))
+        if np.any(totals <= 0):
+            raise ValueError("The replicates of a sample must not all have a weight of 0", 
+                             [sample_name for sample_name, total in zip(samples_names, totals) if total <= 0])
+
+    replicates_matrix = sparse.csr_matrix((values, (rows, columns)), shape=(len(samples_names), len(filenames)))
+
+    return replicates_matrix, samples_names
+
+
+
+def aggregate_replicates(values, replicates_matrix, aggregation='mean'):
+
+    """
+    aggregate the values of the replicates of each sample
+
+        parameters
+        ----------
+        values: numpy array of shape (number of files, number of values), e.g. the average distribution of each file
+        replicates_matrix: the matrix returned by get_replicates_matrix
+        aggregation: 'mean' (default) for the weighted mean and standard deviation, 'median' for the median and the
+                     median absolute deviation (scaled by mad_scale), which are not sensitive to one outlier replicate
+
+        returns
+        ----------
+        centers: mean or median of each sample, shape (number of samples, number of values)
+        spreads: standard deviation or scaled median absolute deviation of each sample, same shape
+
+    """
+
+    if aggregation not in replicates_aggregations:
+        raise ValueError("Unknown replicates aggregation, expected 'mean' or 'median'", aggregation)
+
+    values = np.asarray(values, dtype=float)
+
+    if aggregation == 'mean':
+
+        totals = np.asarray(replicates_matrix.sum(axis=1)).reshape(-1, 1)
+
+        centers = replicates_matrix @ values / totals
+
+        # each file belongs to one sample: the deviations to the mean of its sample are computed for all files at once,
+        # which is more accurate than the mean of the squares minus the square of the mean for large concentrations
+        file_samples = replicates_matrix.T.tocsr()
+        files_centers = np.zeros_like(values)
+        aggregated_files = np.diff(file_samples.indptr) > 0
+        files_centers[aggregated_files] = centers[file_samples.indices]
+
+        spreads = np.sqrt(replicates_matrix @ (values - files_centers)**2 / totals)
+
+        return centers, spreads
+
+    """
+    median: the samples are grouped by number of replicates, each group is a (samples x replicates x values) array
+
+    """
+
+    if not np.all(replicates_matrix.data == 1):
+        raise ValueError("Replicates weights are only supported by the 'mean' aggregation", aggregation)
+
+    centers = np.empty((replicates_matrix.shape[0], values.shape[1]))
+    spreads = np.empty((replicates_matrix.shape[0], values.shape[1]))
+
+    n_replicates = np.diff(replicates_matrix.indptr)
+
+    for n in np.unique(n_replicates):
+
+        samples = np.flatnonzero(n_replicates == n)
+        files = replicates_matrix.indices[replicates_matrix.indptr[samples][:, None] + np.arange(n)]
+
+        replicates_values = values[files]
+        centers[samples] = np.median(replicates_values, axis=1)
+        spreads[samples] = mad_scale * np.median(np.abs(replicates_values - centers[samples][:, None]), axis=1)
+
+    return centers, spreads
+
+
+
+def get_replicates_filenames(sample_name, replicates):
+
+    """
+    filenames of the replicates of a sample from their suffixes (see group_samples_filenames)
+
+    """
+
+    # a file without replicate prefix is its own sample, its suffix is ''
+    if replicates == [sample_name] or replicates == ['']:
+        return [sample_name]
+
+    return [sample_name+replicate for replicate in replicates]
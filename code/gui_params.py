@@ -7,3 +7,6 @@ bg_color = 'peachpuff'
 # ratio pady and ratio padx relatively determine the vertical and horizontal space to leave between elements
 ratio_padx = 1
 ratio_pady = 1
+
+# number of rows of the list of samples displayed at once, the other rows are reached by scrolling
+n_visible_rows = 20
@@ -1,17 +1,55 @@
 
+import argparse
 
-
-from paths import datapath
+from paths import datapath, parse_cache_path
 from nanosight_app import NanosightApp
+from data_extraction_module.parse_cache import clear_parse_cache
+from app_tools.instrumentation import enable_instrumentation, disable_instrumentation
+
+
+# the plots are rendered by worker processes started with spawn, which import this module again: the app must
+# only run in the main process
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='run the Nanosight data analysis without graphical interface')
+    parser.add_argument('--no-cache', action='store_true', help='parse all export files again, without reading or writing the parse cache')
+    parser.add_argument('--clear-cache', action='store_true', help='remove all entries of the parse cache before running')
+    parser.add_argument('--force', nargs='+', metavar='PATTERN', default=None,
+                        help="write again the outputs matching these patterns even if their inputs did not change, e.g. '*_barplot.png' ('*' for all)")
+    parser.add_argument('--binary-export', choices=['parquet', 'feather'], default=None,
+                        help='also export the data in this binary format, reloaded faster than csv files')
+    parser.add_argument('--trace', metavar='FILE', default=None,
+                        help='record the duration, counters and memory of each extraction and analysis stage, and write them in this JSON file')
+    parser.add_argument('--chrome-trace', metavar='FILE', default=None,
+                        help='write the recorded stages in this file in the Chrome trace format (chrome://tracing, ui.perfetto.dev)')
+    parser.add_argument('--trace-memory', action='store_true', help='also measure the python memory allocated by each stage with tracemalloc (slower)')
+    args = parser.parse_args()
+
+    if args.clear_cache:
+        clear_parse_cache(parse_cache_path)
 
-    
+    # the stages are only instrumented when a trace is requested
+    if args.trace is not None or args.chrome_trace is not None:
+        enable_instrumentation(trace_memory=args.trace_memory)
 
-directory = 'data directory'
 
+    directory = 'data directory'
 
-app = NanosightApp(mode='manual', chosen_directory=directory, dilution_prefix='D', replicate_prefix='rep')
 
-app.run()
+    app = NanosightApp(mode='manual', chosen_directory=directory, dilution_prefix='D', replicate_prefix='rep', 
+                       use_cache=not args.no_cache, force_outputs=args.force,
+                       binary_export_format=args.binary_export)
 
 
+    # the trace of a failed run is written too, it shows the stage that failed
+    try:
+        app.run()
+    finally:
+        tracer = disable_instrumentation()
 
+        if tracer is not None:
+            print(tracer.format_summary())
+            if args.trace is not None:
+                tracer.export_json_trace(args.trace)
+            if args.chrome_trace is not None:
+                tracer.export_chrome_trace(args.chrome_trace)
@@ -2,24 +2,30 @@
 import os
 import tkinter
 import tkinter.font as TkFont
+import tkinter.ttk as ttk
 from pathlib import Path
 import numpy as np
 import pandas
-from scipy.integrate import simpson
 
 import matplotlib.pyplot as plt
 plt.rcParams["font.family"] = "serif"
 
 from paths import datapath, resultspath
 
-from gui_params import bg_color, ratio_padx, ratio_pady
+from gui_params import bg_color, ratio_padx, ratio_pady, n_visible_rows
 
 from app_tools.gui_tools import initialize_tkinter_graphical_interface, ask_data_directory, ask_and_store
 from app_tools.other_tools import create_directory
+from app_tools.output_manifest import compute_fingerprint, load_manifest, save_manifest, is_output_up_to_date
+from app_tools.background_tasks import BackgroundWorker, format_timings
+from app_tools.virtual_table import VirtualTable
+from app_tools.instrumentation import instrumented, span, count
 
-from data_extraction_module.nanosight_data_extraction import extract_nanosight_data_from_directory
+from data_extraction_module.nanosight_data_extraction import extract_nanosight_data_incrementally
+from data_extraction_module.nanosight_data_export import export_nanosight_data, load_nanosight_data, export_infos_filename
 
-from data_analysis_module.plot_tools import plot_size_distributions, barplot
+from data_analysis_module.plot_tools import render_plots, get_plot_filename
+from data_analysis_module.derived_quantities import compute_derived_quantities, get_rows
 from data_analysis_module.clustering import run_wasserstein_clustering
 from data_analysis_module.two_samples_tests import run_two_samples_tests
 
@@ -30,7 +36,14 @@ class NanosightApp():
                  mode='gui', 
                  chosen_directory='', 
                  dilution_prefix=None,
-                 replicate_prefix=None):
+                 replicate_prefix=None,
+                 use_cache=True,
+                 n_plot_jobs=-1,
+                 force_outputs=None,
+                 binary_export_format=None,
+                 n_export_jobs=-1,
+                 data_root=None,
+                 results_root=None):
                 
         self.mode=mode
    
@@ -43,8 +56,40 @@ class NanosightApp():
         # prefix preceding the replicate number if any (optional)
         self.replicate_prefix = replicate_prefix
 
+        # directory containing the data directories, and directory where the results of each data directory are written
+        # (optional, default = the 'data' and 'nanosight_app_results' directories next to the code directory, see paths.py)
+        self.datapath = Path(datapath if data_root is None else data_root)
+        self.resultspath = Path(resultspath if results_root is None else results_root)
+
+        # parsed export files are cached on disk to speed up reloading (optional, default = True),
+        # the cache is shared by all data directories
+        self.cache_directory = Path(self.resultspath, '.parse_cache') if use_cache else None
+
+        # number of processes rendering plots (optional, default = -1, as many as cpus)
+        self.n_plot_jobs = n_plot_jobs
+
+        # csv files and plots are only written again when their inputs changed (see output_manifest.py),
+        # except the outputs matching force_outputs: True for all, or a list of patterns such as ['*_barplot.png'] (optional)
+        self.force_outputs = force_outputs
+
+        # data are also exported in a binary format keeping dtypes, 'parquet' or 'feather', to be reloaded
+        # with load_exported_data without parsing the nanosight exports again (optional, default = None, csv only)
+        self.binary_export_format = binary_export_format
+
+        # number of files of the binary export written in parallel (optional, default = -1, as many as cpus)
+        self.n_export_jobs = n_export_jobs
+
         # will store data exports
         self.data = None
+
+        # will store the quantities derived from size distributions (areas, normalized distributions, CDFs...),
+        # computed once after loading data and read by plots, clustering and two-samples tests
+        self.derived_quantities = None
+
+        # will store the data extracted from each experiment, to reload only new or changed experiments
+        self.experiments = None
+        # will store the experiments added, changed or removed at the last loading
+        self.data_changes = None
         
         # indicates if there exist replicates of the sample sample, will be defined after loading data
         self.any_replicates = None
@@ -57,6 +102,9 @@ class NanosightApp():
         self.sample_class_labels = None
         self.files_class_labels = None
 
+        # in gui mode, runs extraction, exports, plots, clustering and tests in a background thread (see run_task)
+        self.background_worker = None
+
 
     def run(self):
         
@@ -87,6 +135,10 @@ class NanosightApp():
         self.gui_root = initialize_tkinter_graphical_interface(bg_color=bg_color,
                                                             title='Nanosight data analysis') 
 
+        # plots are only saved in files, and are rendered in the background thread: the tkinter backend of matplotlib
+        # can only be used from the main thread
+        plt.switch_backend('Agg')
+
         # create a frame dedicated to data loading, attached to self.gui_root created at the previous step
         self.load_data_frame = tkinter.LabelFrame(self.gui_root, 
                                                   text="Load data", 
@@ -113,7 +165,7 @@ class NanosightApp():
         button_chose_path = tkinter.Button(self.load_data_frame, 
                                            text = "Choose directory", 
                                            command = lambda: ask_data_directory(self.chosen_directory_tkinter_var, 
-                                                                                initial_directory=datapath), 
+                                                                                initial_directory=self.datapath), 
                                            bg=bg_color, 
                                            fg="black")
         
@@ -182,18 +234,140 @@ class NanosightApp():
         button_export_nanosight = tkinter.Button(self.load_data_frame, text = 'Load', command = self.execute_workflow, bg="white", fg="black")
         button_export_nanosight.grid(row=5, columnspan=3, column=0, pady=40*ratio_pady)
 
+        # create a button 'Reload'; when clicked only the experiments added or changed since the last loading are processed
+        button_reload = tkinter.Button(self.load_data_frame, text = 'Reload', 
+                                       command = lambda: self.execute_workflow(incremental=True), bg="white", fg="black")
+        button_reload.grid(row=6, columnspan=3, column=0)
+
+        """
+        add a frame showing the progress of the running task, with a button to cancel it
+        
+        """ 
+
+        self.create_progress_display()
+
         tkinter.mainloop()
 
 
-    def execute_workflow(self):
+    def create_progress_display(self):
+
+        # the long tasks run in a background thread and report their progress in this frame (see run_task)
+        self.background_worker = BackgroundWorker(self.gui_root, on_progress=self.on_task_progress)
+
+        self.progress_frame = tkinter.LabelFrame(self.gui_root, text="Progress", font = TkFont.Font(weight="bold"), bg=bg_color)
+        self.progress_frame.grid(row=1, column=0, pady=20*ratio_pady, padx=20*ratio_padx, sticky="nswe")
+
+        self.progress_bar = ttk.Progressbar(self.progress_frame, orient='horizontal', length=250, mode='determinate', maximum=1)
+        self.progress_bar.grid(row=0, column=0, pady=10*ratio_pady, padx=10*ratio_padx)
+
+        button_cancel = tkinter.Button(self.progress_frame, text = 'Cancel', command = self.background_worker.cancel, bg="white", fg="black")
+        button_cancel.grid(row=0, column=1, pady=10*ratio_pady, padx=10*ratio_padx)
+
+        # name of the running task and stage, or outcome of the last task
+        self.task_status_tkinter_var = tkinter.StringVar(value='Ready')
+        task_status_label = tkinter.Label(self.progress_frame, textvariable=self.task_status_tkinter_var, bg=bg_color, fg="orangered")
+        task_status_label.grid(row=1, column=0, columnspan=2, padx=10*ratio_padx)
+
+        # duration of each stage of the running or last task
+        self.task_timings_tkinter_var = tkinter.StringVar(value='')
+        task_timings_label = tkinter.Label(self.progress_frame, textvariable=self.task_timings_tkinter_var, bg=bg_color, fg="black",
+                                           wraplength=350, justify='left')
+        task_timings_label.grid(row=2, column=0, columnspan=2, pady=10*ratio_pady, padx=10*ratio_padx)
+
+
+    def run_task(self, name, stages, on_done=None, on_cancelled=None):
+
+        """
+        run the stages of a task, (stage name, function without arguments), in the background thread in gui mode
+        (the gui keeps responding, the progress is displayed and the task can be cancelled), directly otherwise
+        on_done is called with the value returned by the last stage, on_cancelled if the user cancelled the task
+
+        """
+
+        if self.background_worker is None:
+            result = None
+            for stage, function in stages:
+                result = function()
+            if on_done is not None:
+                on_done(result)
+            return
+
+        def on_task_done(result, timings):
+            self.display_task_outcome(name+' done in '+f"{sum(timings.values()):.1f} s", 1, timings)
+            if on_done is not None:
+                on_done(result)
+
+        def on_task_error(error, error_traceback):
+            print(error_traceback)
+            self.display_task_outcome('Error in '+name+': '+str(error), 0, self.background_worker.timings)
+
+        def on_task_cancelled():
+            self.display_task_outcome(name+' cancelled', 0, self.background_worker.timings)
+            if on_cancelled is not None:
+                on_cancelled()
+
+        if not self.background_worker.submit(name, stages, on_done=on_task_done, on_error=on_task_error, on_cancelled=on_task_cancelled):
+            self.task_status_tkinter_var.set('Wait for '+self.background_worker.task['name']+' to finish, or cancel it')
+            return
+
+        self.task_status_tkinter_var.set(name+'...')
+
+
+    def report_progress(self, fraction=None, stage=None):
+
+        """
+        report the progress of the running task, called by the long methods (no effect in manual mode)
+        a task cancelled by the user stops here, with a TaskCancelledError
+
+        """
+
+        if self.background_worker is not None:
+            self.background_worker.report_progress(fraction=fraction, stage=stage)
+
+
+    def on_task_progress(self, stage, fraction, timings):
+
+        if fraction is None:
+            self.progress_bar.config(mode='indeterminate')
+            self.progress_bar.step(0.05)
+        else:
+            self.progress_bar.config(mode='determinate')
+            self.progress_bar['value'] = fraction
+
+        self.task_status_tkinter_var.set(self.background_worker.task['name']+': '+stage+'...')
+        self.task_timings_tkinter_var.set(format_timings(timings))
+
+
+    def display_task_outcome(self, status, fraction, timings):
+
+        self.progress_bar.config(mode='determinate')
+        self.progress_bar['value'] = fraction
+        self.task_status_tkinter_var.set(status)
+        self.task_timings_tkinter_var.set(format_timings(timings))
+
+
+    def execute_workflow(self, incremental=False):
         
         """
         extract data and run all consecutive actions
+        if incremental is True, only the experiments added or changed since the last loading are extracted
         
         """ 
 
-        # extract_data
-        self.extract_data()
+        # clear the display of previously loaded data if any
+        self.clear_data_display()
+
+        # extract_data in the background, then display the data; a cancelled loading leaves no data
+        self.run_task('Loading', [('extraction', lambda: self.extract_data(incremental=incremental))],
+                      on_done=lambda result: self.display_loaded_data(), on_cancelled=self.reset_data)
+
+
+    def display_loaded_data(self):
+
+        """
+        display the loaded data and the actions available
+        
+        """ 
         
         # display export_infos (samples list and ather relevant information)
         self.display_export_infos()
@@ -203,9 +377,6 @@ class NanosightApp():
         
         # propose data analysis options
         self.propose_analysis_options()
-
-        # adjust canvas size to limit height to 0.8 x screen height and manage other settings
-        self.adjust_canvas_frame()
         
     
             
@@ -260,11 +431,21 @@ class NanosightApp():
 
 
     def reset_data(self):
+
+        # a running task uses the previous data, its result is not needed anymore
+        if self.background_worker is not None:
+            self.background_worker.cancel()
         
         # reset data attribute
         self.data = None
+        self.experiments = None
+        self.derived_quantities = None
 
         # clear old data display on the gui if any
+        self.clear_data_display()
+
+
+    def clear_data_display(self):
 
         if hasattr(self, 'list_samples_frame'):
             self.list_samples_frame.destroy()
@@ -274,15 +455,22 @@ class NanosightApp():
             
         if hasattr(self, "data_correctly_loaded"):
             self.data_correctly_loaded.destroy()
+
+        # class labels were entered for the previous list of samples
+        self.samples_class_labels = None
+        self.files_class_labels = None
             
 
-    def extract_data(self):
+    @instrumented('loading', 'app')
+    def extract_data(self, incremental=False):
         
         """
         extract all data from self.chosen_directory
         it uses the export settings stored in the class attributes (dilution_prefix, replicate_prefix)
         in manual mode, these settings are provided during class instantiation
         in gui mode, the user is asked to provide these settings
+        if incremental is True, only the experiments added or changed since the last extraction are extracted again,
+        the data of removed experiments are dropped; the result is the same as a full extraction
 
         store in self.data
         ----------
@@ -292,12 +480,51 @@ class NanosightApp():
         size_distributions: a pandas dataframe containing size_distributions for all samples
         size_concentration_attributes: a pandas dataframe containing all size and concentration attributes for all samples
         metadata: a pandas dataframe containing detailed metadata for all samples
+        dataset: a NanosightDataset storing the size distributions by file, video and sample (see nanosight_dataset.py)
         
         """
 
-        self.data = extract_nanosight_data_from_directory(directory_path=Path(datapath, self.chosen_directory),
-                                                             dilution_prefix=self.dilution_prefix,
-                                                             replicate_prefix=self.replicate_prefix)
+        # the experiments extracted previously can be reused only for the same directory and prefixes (see reset_data)
+        previous_experiments = self.experiments if incremental else None
+
+        self.data, self.experiments, self.data_changes = extract_nanosight_data_incrementally(directory_path=Path(self.datapath, self.chosen_directory),
+                                                                                            dilution_prefix=self.dilution_prefix,
+                                                                                            replicate_prefix=self.replicate_prefix,
+                                                                                            previous_experiments=previous_experiments,
+                                                                                            cache_directory=self.cache_directory,
+                                                                                            progress_callback=lambda n_extracted, n_experiments: self.report_progress(n_extracted/n_experiments))
+
+        self.set_data_attributes()
+
+
+    @instrumented('binary loading', 'app')
+    def load_exported_data(self, export_format=None):
+
+        """
+        load self.data from the binary export of self.chosen_directory written by export_data (see binary_export_format),
+        instead of extracting it from the nanosight exports
+
+        """
+
+        if export_format is None:
+            export_format = self.binary_export_format
+
+        self.data = load_nanosight_data(Path(self.resultspath, self.chosen_directory, 'data_'+str(export_format)+'_export'))
+
+        # the experiments are not known, the next incremental extraction is a full extraction
+        self.experiments = None
+        self.data_changes = None
+
+        self.set_data_attributes()
+
+
+    @instrumented('derived quantities', 'app')
+    def set_data_attributes(self):
+
+        """
+        define the attributes depending on self.data, after extracting or loading it
+
+        """
 
         self.filenames = self.data['files_infos'].index
         
@@ -307,11 +534,16 @@ class NanosightApp():
         
         self.samples_names = list(self.data['samples_filenames'].keys())
 
+        # integrate and normalize all distributions once
+        self.report_progress(stage='derived quantities')
+        self.derived_quantities = compute_derived_quantities(self.data)
+
 
     def display_export_infos(self):
         
         """
         display samples list and other relevant information (dilution, replicates, particules per frame...)
+        the list is a VirtualTable: only the visible rows have widgets, it is displayed as fast for thousands of files
         
         """ 
 
@@ -323,205 +555,94 @@ class NanosightApp():
         self.list_samples_frame = tkinter.LabelFrame(self.gui_root, text="List of samples", font = TkFont.Font(weight="bold"), bg=bg_color)
         self.list_samples_frame.grid(row=0, column=1, padx=40*ratio_padx, pady=20*ratio_pady, sticky='nswe')
 
-        # add a canvas in that frame, (mandatory to add a scrollbar later)
-        # the scrollbar will help to see all samples if the list is too long to fully appear on the screen
-        self.canvas = tkinter.Canvas(self.list_samples_frame, bg=bg_color)
-        self.canvas.grid(row=0, column=0, sticky='nswe')
-        
-        # create a window inside canvas to add content (mandatory)
-        self.canvas_window = tkinter.Frame(self.canvas, bg=bg_color)
-        self.canvas.create_window((0, 0), window=self.canvas_window, anchor='nw')
-
-        # link a scrollbar to the canvas frame
-        vsb = tkinter.Scrollbar(self.list_samples_frame, orient="vertical", command=self.canvas.yview)
-        vsb.grid(row=0, column=1, sticky='ns')
-        #synchronizes the canvas with the vertical scrollbar so they work together
-        self.canvas.config(yscrollcommand=vsb.set, bg=bg_color)
+        # column titles: 'Name', ('Replicate name'), 'Dilution', 'Particles per frame', 'Noise detected'
+        columns = ['Name'] + (['Replicate name'] if self.any_replicates else []) + ['Dilution', 'Particles per frame', 'Noise detected']
 
-        # add column titles for display: 'Name', ('Replicate name'), 'Dilution', 'Particles per frame', 'Noise detected'
-        names_title = tkinter.Label(self.canvas_window, text = "Name", bg=bg_color, fg="black")
-        names_title.grid(row=0, column=0, pady=40*ratio_pady)
-        index_col = 0
+        dilution_factors = self.data['files_infos']['Dilution factor'].to_dict()
+        particles_per_frame = self.data['metadata']['Particles per frame'].to_dict()
+        noise_detected = self.data['metadata']['Noise detected'].to_dict()
 
-        # if replicates exist, display a column title for replicates names
-        if self.any_replicates:
-            replicate_names_title = tkinter.Label(self.canvas_window, text = 'Replicate name', bg=bg_color, fg="black")
-            replicate_names_title.grid(row=0, column=1, pady=40*ratio_pady, padx=2*ratio_padx, sticky='nswe')
-            index_col += 1
-                         
-        dilutions_title = tkinter.Label(self.canvas_window, text = 'Dilution', bg=bg_color, fg="black")
-        dilutions_title.grid(row=0, column=index_col+1, pady=40*ratio_pady, padx=2*ratio_padx, sticky='nswe')
+        # one row per file, the key of a row is its sample name (class labels are given by sample)
+        rows = []
+        keys = []
 
-        particles_per_frame_title = tkinter.Label(self.canvas_window, text = 'Particles per frame', bg=bg_color, fg="black")
-        particles_per_frame_title.grid(row=0, column=index_col+2, pady=40*ratio_pady, padx=2*ratio_padx, sticky='nswe')
+        for sample_name, replicate_filenames in self.data['samples_filenames'].items():
 
-        validity_title = tkinter.Label(self.canvas_window, text = 'Noise detected', bg=bg_color, fg="black")
-        validity_title.grid(row=0, column=index_col+3, pady=40*ratio_pady, padx=2*ratio_padx, sticky='nswe')
-      
-        # iterate over samples and display all information
-        
-        sample_row_index = 1
+            for filename, replicate_filename in zip(self.data['dataset'].get_sample_filenames(sample_name), replicate_filenames):
 
-        for i, (sample_name, replicate_filenames) in enumerate(self.data['samples_filenames'].items()):
+                replicate_columns = [replicate_filename] if self.any_replicates else []
 
-            sample_name_label = tkinter.Label(self.canvas_window, text = sample_name, bg=bg_color, fg="black")
-            sample_name_label.grid(row=sample_row_index, column=0, pady=2*ratio_pady)
+                rows.append(tuple([sample_name] + replicate_columns + [str(dilution_factors[filename]), 
+                                                                      ', '.join(str(value) for value in particles_per_frame[filename]),
+                                                                      # '-' rather than an empty text, also in the filter menu
+                                                                      str(noise_detected[filename]) if noise_detected[filename] != '' else '-']))
+                keys.append(sample_name)
 
-            if self.any_replicates:
-                           
-                for r, replicate_filename in enumerate(replicate_filenames):
-
-                    files_infos = self.data['files_infos'].loc[sample_name+replicate_filename]
-                    metadata = self.data['metadata'].loc[sample_name+replicate_filename]
-
-                    replicate_name_label = tkinter.Label(self.canvas_window, text = replicate_filename, bg=bg_color, fg="black")
-                    replicate_name_label.grid(row=sample_row_index+r, column=1, pady=2*ratio_pady, padx=10*ratio_padx, sticky='nswe')
-      
-                    dilution_label = tkinter.Label(self.canvas_window, text = str(files_infos['Dilution factor']), bg=bg_color, fg="black")
-                    dilution_label.grid(row=sample_row_index+r, column=2, pady=2*ratio_pady, padx=10*ratio_padx, sticky='nswe')
-            
-                    particle_per_frame_label = tkinter.Label(self.canvas_window, text = ', '.join(metadata['Particles per frame']), bg=bg_color, fg="black")
-                    particle_per_frame_label.grid(row=sample_row_index+r, column=3, pady=2*ratio_pady, padx=10*ratio_padx, sticky='nswe')
-            
-                    valid_label = tkinter.Label(self.canvas_window, text = metadata['Noise detected'], bg=bg_color, fg="black")
-                    valid_label.grid(row=sample_row_index+r, column=4, pady=2*ratio_pady, padx=10*ratio_padx, sticky='nswe')
-            
-                sample_row_index += r+1
-    
-            else:
-                files_infos = self.data['files_infos'].loc[sample_name]
-
-                metadata = self.data['metadata'].loc[sample_name]
-
-                dilution_label = tkinter.Label(self.canvas_window, text = str(files_infos['Dilution factor']), bg=bg_color, fg="black")
-                dilution_label.grid(row=sample_row_index, column=1, pady=2*ratio_pady, padx=10*ratio_padx, sticky='nswe')
-        
-                particle_per_frame_label = tkinter.Label(self.canvas_window, text = ', '.join(metadata['Particles per frame']), bg=bg_color, fg="black")
-                particle_per_frame_label.grid(row=sample_row_index, column=2, pady=10*ratio_pady, padx=2*ratio_padx, sticky='nswe')
-        
-                valid_label = tkinter.Label(self.canvas_window, text = metadata['Noise detected'], bg=bg_color, fg="black")
-                valid_label.grid(row=sample_row_index, column=3, pady=2*ratio_pady, padx=10*ratio_padx, sticky='nswe')
-        
-                sample_row_index +=1
-
-        self.adjust_canvas_frame()
+        self.samples_table = VirtualTable(self.list_samples_frame, columns, rows, keys, bg_color=bg_color, n_visible_rows=n_visible_rows, 
+                                          filter_column='Noise detected', ratio_padx=ratio_padx, ratio_pady=ratio_pady)
+        self.samples_table.grid(row=0, column=0, columnspan=2, sticky='nswe')
 
 
     def propose_to_add_labels(self):
 
-        self.add_labels_button = tkinter.Button(self.canvas_window, text = 'Add class label', command=self.ask_labels, bg='white')
-        self.add_labels_button.grid(row=0, column=5, pady=10*ratio_pady, padx=30*ratio_padx)
+        self.add_labels_button = tkinter.Button(self.list_samples_frame, text = 'Add class label', command=self.ask_labels, bg='white')
+        self.add_labels_button.grid(row=1, column=1, pady=10*ratio_pady, padx=30*ratio_padx)
         
         
     def ask_labels(self):
         
         self.add_labels_button.destroy()
 
-        self.label_title = tkinter.Label(self.canvas_window, text = 'Enter class label (0 or 1)', bg='white')
-        self.label_title.grid(row=0, column=5, pady=10*ratio_pady, padx=30*ratio_padx)
-        
-        # all are set to 0 by default
-        self.samples_class_labels_tkinter_vars = [tkinter.StringVar(value='0') for i in range(len(self.samples_names))]
-        
-        self.samples_class_labels_entries = []
-        
-        
-        row_index = 1
-        
-        for i, sample_name in enumerate(self.samples_names):
-            
-            nb_replicates = len(self.data['samples_filenames'][sample_name])
-            
-            label_entry = tkinter.Entry(self.canvas_window, textvariable=self.samples_class_labels_tkinter_vars[i], width=3)
-            
-            label_entry.grid(row=row_index, column=5, pady=2*ratio_pady, padx=10*ratio_padx)
+        # all are set to 0 by default, the values are edited in the last column of the samples table
+        self.samples_class_labels_values = {sample_name: '0' for sample_name in self.samples_names}
 
-            self.samples_class_labels_entries.append(label_entry)
-            
-            row_index += nb_replicates
-
-        self.ok_labels_button = tkinter.Button(self.canvas_window, text = 'Ok', command=self.store_labels, bg='white')
-        self.ok_labels_button.grid(row=len(self.filenames)+1, column=5, pady=2*ratio_pady, padx=10*ratio_padx)
+        self.samples_table.set_values(self.samples_class_labels_values, title='Enter class label (0 or 1)', editable=True)
 
-        self.adjust_canvas_frame()
+        self.ok_labels_button = tkinter.Button(self.list_samples_frame, text = 'Ok', command=self.store_labels, bg='white')
+        self.ok_labels_button.grid(row=1, column=1, pady=10*ratio_pady, padx=30*ratio_padx)
        
         
     def store_labels(self):
         
-        # class_labels will be filled with the values entered by the user
-        self.samples_class_labels = []
-
-        # fill with the values entered by the user
-        for i in range(len(self.samples_names)):
-
-            # only if 0 or 1
-            if (self.samples_class_labels_tkinter_vars[i].get()!='0' and self.samples_class_labels_tkinter_vars[i].get()!='1'):
-            
+        # only 0 or 1, otherwise the first sample with another value is shown to the user
+        for sample_name in self.samples_names:
+            if self.samples_class_labels_values[sample_name] not in ['0', '1']:
+                self.samples_table.show_row(self.samples_table.keys.index(sample_name))
                 return
-            
-            self.samples_class_labels.append(int(self.samples_class_labels_tkinter_vars[i].get()))
 
-            # class_label_entries[i] is not necessary anymore and will be created again if needed
-            self.samples_class_labels_entries[i].destroy()
+        # class_labels are filled with the values entered by the user
+        self.samples_class_labels = [int(self.samples_class_labels_values[sample_name]) for sample_name in self.samples_names]
         
-        # change column title to indicate that class labels have been entered
-        self.label_title.destroy()
-        self.label_title = tkinter.Label(self.canvas_window, text = 'Class labels', bg=bg_color)
-        self.label_title.grid(row=0, column=5, pady=2*ratio_pady, padx=10*ratio_padx)
-
-        # show the user the class labels that have been stored
-        self.samples_class_labels_displays = []        
-        
-        row_index = 1
-        for i, sample_name in enumerate(self.samples_names):
-            
-            nb_replicates = len(self.data['samples_filenames'][sample_name])
-
-            label_display = tkinter.Label(self.canvas_window, text=str(self.samples_class_labels[i]), bg=bg_color)
-            label_display.grid(row=row_index, column=5, pady=2*ratio_pady, padx=10*ratio_padx)
-            
-            row_index += nb_replicates
-                    
-            self.samples_class_labels_displays.append(label_display)
+        # show the user the class labels that have been stored, they cannot be edited anymore
+        self.samples_table.set_values(self.samples_class_labels_values, title='Class labels', editable=False)
 
         # destroy the button to validate labels and replace it by a remove button to erase entered class labels
         self.ok_labels_button.destroy()
-        self.remove_labels_button = tkinter.Button(self.canvas_window, text = 'Remove', command=self.remove_labels, bg='white')
-        self.remove_labels_button.grid(row=len(self.filenames)+1, column=5, pady=2*ratio_pady, padx=10*ratio_padx)
+        self.remove_labels_button = tkinter.Button(self.list_samples_frame, text = 'Remove', command=self.remove_labels, bg='white')
+        self.remove_labels_button.grid(row=1, column=1, pady=10*ratio_pady, padx=30*ratio_padx)
 
         # now that labels have been stored, propose to run two-samples tests
-        self.button_tests = tkinter.Button(self.analysis_frame, text = 'Two-sample tests', command = self.run_two_samples_tests, bg='white', fg='black')
+        self.button_tests = tkinter.Button(self.analysis_frame, text = 'Two-sample tests', command = lambda: self.run_analysis_task('Two-sample tests', self.run_two_samples_tests, 'ok_tests', row=3), bg='white', fg='black')
         self.button_tests.grid(row=3, column=0, pady=40*ratio_pady, padx=20*ratio_padx)    
         
         # labels have been defined for each sample, we need to expand the information to all replicates
         # it will be usefull if we dont want to group replicates in two-samples tests
-        self.files_class_labels = []
-        for i, filename in enumerate(self.filenames):
-            corresponding_sample_name = self.data['files_infos'].loc[filename]['Sample name']
-            index_sample_name = self.samples_names.index(corresponding_sample_name)
-            class_label = self.samples_class_labels[index_sample_name]
-            self.files_class_labels.append(class_label)
-            
-        self.adjust_canvas_frame()
+        samples_class_labels = dict(zip(self.samples_names, self.samples_class_labels))
+        self.files_class_labels = [samples_class_labels[sample_name] for sample_name in self.data['files_infos'].loc[self.filenames]['Sample name']]
                 
         
     def remove_labels(self):
         
-        self.label_title.destroy()
-    
         if hasattr(self, 'ok_tests'):
             self.ok_tests.destroy()
 
-        for i in range(len(self.samples_names)):
-            self.samples_class_labels_displays[i].destroy()
+        self.samples_table.set_values(None, title='')
             
         self.remove_labels_button.destroy()
         
         self.propose_to_add_labels()
         
         self.button_tests.destroy()
-
-        self.adjust_canvas_frame()
         
         self.samples_class_labels = None
               
@@ -534,16 +655,37 @@ class NanosightApp():
         self.analysis_frame.grid(row=0, column=2, sticky='nw', padx=20*ratio_padx, pady=20*ratio_pady)
 
         # export button, when clicked the extracted data are exported in csv files in the results directory
-        button_export = tkinter.Button(self.analysis_frame, text = 'Data csv export' , command = self.export_data, bg='white', fg='black')
+        button_export = tkinter.Button(self.analysis_frame, text = 'Data csv export' , command = lambda: self.run_analysis_task('Export', self.export_data, 'ok_export', row=0), bg='white', fg='black')
         button_export.grid(row=0, column=0, pady=40*ratio_pady, padx=20*ratio_padx)
         
-        button_plot = tkinter.Button(self.analysis_frame, text = 'Data illustrations' , command = self.plot, bg='white', fg='black')
+        button_plot = tkinter.Button(self.analysis_frame, text = 'Data illustrations' , command = lambda: self.run_analysis_task('Plots', self.plot, 'ok_plots', row=1), bg='white', fg='black')
         button_plot.grid(row=1, column=0, pady=40*ratio_pady, padx=20*ratio_padx)
 
-        button_clustering = tkinter.Button(self.analysis_frame, text = 'Clustering' , command = self.run_clustering, bg='white', fg='black')
+        button_clustering = tkinter.Button(self.analysis_frame, text = 'Clustering' , command = lambda: self.run_analysis_task('Clustering', self.run_clustering, 'ok_clustering', row=2), bg='white', fg='black')
         button_clustering.grid(row=2, column=0, pady=40*ratio_pady, padx=20*ratio_padx)        
 
 
+    def run_analysis_task(self, name, analysis, confirmation_name, row):
+
+        """
+        run an analysis method (export_data, plot...) with run_task, and display 'Ok' next to its button when it is done
+        the confirmation label is stored in the attribute confirmation_name (e.g. 'ok_plots')
+        
+        """ 
+
+        # remove the confirmation of the previous run if any
+        if hasattr(self, confirmation_name):
+            getattr(self, confirmation_name).destroy()
+
+        def display_confirmation(report):
+            text = "Ok" if report is None else "Ok, "+report
+            confirmation = tkinter.Label(self.analysis_frame, text = text, bg=bg_color, fg="orangered")
+            confirmation.grid(row=row, column=1, pady=40*ratio_pady, padx=20*ratio_padx)
+            setattr(self, confirmation_name, confirmation)
+
+        self.run_task(name, [(name.lower(), analysis)], on_done=display_confirmation)
+
+
     def run_data_analysis(self):
         
         # only used in manual mode
@@ -553,94 +695,165 @@ class NanosightApp():
 
 
 
+    @instrumented('csv export', 'app')
     def export_data(self):
         
         """
         export all self.data in elements in csv format in the results directory
         
         """ 
-        
-        if self.mode=='gui':
-            # remove the confirmation of previous export if any
-            if hasattr(self, 'ok_export'):
-                self.ok_export.destroy()
 
         # create a directory for csv exports
-        create_directory([resultspath, self.chosen_directory, 'data_csv_export'])
-        csv_savepath = os.path.join(resultspath, self.chosen_directory, 'data_csv_export')
+        create_directory([self.resultspath, self.chosen_directory, 'data_csv_export'])
+        csv_savepath = os.path.join(self.resultspath, self.chosen_directory, 'data_csv_export')
         
+        # fingerprints of the files written by previous exports, unchanged files are not written again
+        manifest = load_manifest(csv_savepath)
+
+        # fingerprints of all dataframes, reused for the binary export
+        fingerprints = {}
+
         # export all self.data elements in csv format
-        for key in self.data:
+        for i, key in enumerate(self.data):
+            self.report_progress(i/len(self.data))
             if isinstance(self.data[key], pandas.DataFrame):
                 # save index in the csv only if it contains information
                 if type(self.data[key].index[0])==str:
                     index = True
                 else:
                     index = False
+
+                fingerprint = compute_fingerprint(self.data[key], index)
+                fingerprints[key] = fingerprint
+                if is_output_up_to_date(manifest, csv_savepath, key+'.csv', fingerprint, force=self.force_outputs):
+                    continue
+
                 self.data[key].to_csv(os.path.join(csv_savepath, key+'.csv'), index=index)
+                manifest[key+'.csv'] = fingerprint
+                count('csv files written')
 
-        if self.mode=='gui': 
-            # display 'Ok' when export is successfull
-            self.ok_export = tkinter.Label(self.analysis_frame, text = "Ok", bg=bg_color, fg="orangered")
-            self.ok_export.grid(row=0, column=1, pady=40*ratio_pady, padx=20*ratio_padx)
-            
+        if manifest != load_manifest(csv_savepath):
+            save_manifest(csv_savepath, manifest)
+
+        if self.binary_export_format is not None:
+            self.report_progress(stage=self.binary_export_format+' export')
+            self.export_binary_data(fingerprints)
+
+
+
+    @instrumented('binary export', 'app')
+    def export_binary_data(self, fingerprints):
+
+        """
+        export all self.data dataframes in self.binary_export_format (see nanosight_data_export.py), next to the csv export
+        the export is written again only if one of the dataframes changed
+
+        """
+
+        create_directory([self.resultspath, self.chosen_directory, 'data_'+self.binary_export_format+'_export'])
+        binary_savepath = os.path.join(self.resultspath, self.chosen_directory, 'data_'+self.binary_export_format+'_export')
+
+        manifest = load_manifest(binary_savepath)
+
+        # the export is complete when export_infos.json exists, it is used as the output name of the whole export
+        fingerprint = compute_fingerprint(fingerprints, self.data['samples_filenames'])
+        if is_output_up_to_date(manifest, binary_savepath, export_infos_filename, fingerprint, force=self.force_outputs):
+            return
+
+        export_nanosight_data(self.data, binary_savepath, export_format=self.binary_export_format, n_jobs=self.n_export_jobs)
 
+        manifest[export_infos_filename] = fingerprint
+        save_manifest(binary_savepath, manifest)
 
+
+
+    @instrumented('plots', 'app')
     def plot(self):
         
         """
         generate all plots
+
+        returns
+        ----------
+        a report with the number of plots rendered and the rendering time
         
         """ 
 
-        # remove the confirmation of previous plot if any
-        if self.mode == 'gui':
-            if hasattr(self, 'ok_plot'):
-                self.ok_plot.destroy()
-
-        # create a directory for csv exports
-        create_directory([resultspath, self.chosen_directory, 'data_illustrations'])
+        # create a directory for plots
+        create_directory([self.resultspath, self.chosen_directory, 'data_illustrations'])
+        plots_savepath = os.path.join(self.resultspath, self.chosen_directory, 'data_illustrations')
         
-        # generate plots
-        self.plot_size_distributions()
-        self.plot_size_concentration_attributes()
+        # list all plots, then render them (in parallel if n_plot_jobs > 1)
+        with span('plot jobs', 'app'):
+            plot_jobs = self.get_size_distributions_plot_jobs() + self.get_size_concentration_attributes_plot_jobs()
+
+        # plots whose data and parameters did not change since they were written are skipped
+        manifest = load_manifest(plots_savepath)
+        with span('plot fingerprints', 'app'):
+            fingerprints = [compute_fingerprint(plot_job) for plot_job in plot_jobs]
+
+        plots_to_render = [(plot_job, fingerprint) for plot_job, fingerprint in zip(plot_jobs, fingerprints) 
+                           if not is_output_up_to_date(manifest, plots_savepath, get_plot_filename(plot_job), fingerprint, 
+                                                       force=self.force_outputs)]
+
+        self.report_progress(0, stage='rendering')
+        with span('rendering', 'app'):
+            self.plots_report = render_plots([plot_job for plot_job, _ in plots_to_render], n_jobs=self.n_plot_jobs,
+                                             progress_callback=lambda n_rendered, n_plots: self.report_progress(n_rendered/n_plots))
+            count('plots rendered', self.plots_report['n_plots'])
+            count('plots unchanged', len(plot_jobs) - len(plots_to_render))
+
+        if len(plots_to_render) > 0:
+            for plot_job, fingerprint in plots_to_render:
+                manifest[get_plot_filename(plot_job)] = fingerprint
+            save_manifest(plots_savepath, manifest)
+
+        report = f"{self.plots_report['n_plots']} plots in {self.plots_report['render_time']:.1f} s ({self.plots_report['n_workers']} workers), " \
+                 f"{len(plot_jobs) - len(plots_to_render)} unchanged"
+
+        if self.mode=='manual':
+            print(report)
 
-        # display 'Ok' when export is successfull
-        if self.mode=='gui': 
-            self.ok_plots = tkinter.Label(self.analysis_frame, text = "Ok", bg=bg_color, fg="orangered")
-            self.ok_plots.grid(row=1, column=1, pady=40*ratio_pady, padx=20*ratio_padx)
+        return report
                     
         
-    def plot_size_distributions(self):
+    def get_size_distributions_plot_jobs(self):
 
-        plots_savepath = os.path.join(resultspath, self.chosen_directory, 'data_illustrations')
+        """
+        list the plots of size distributions, as (plot function name, keyword arguments) for render_plots
+        
+        """ 
+
+        plot_jobs = []
+
+        plots_savepath = os.path.join(self.resultspath, self.chosen_directory, 'data_illustrations')
+
+        dataset = self.data['dataset']
 
-        bin_centers = self.data['size_distributions']['Bin centers'].values
+        bin_centers = dataset.bin_centers
         
         """
         generate plots for all files (plot all video distribs and average/std)
         
         """ 
         for filename in self.filenames:
-            videos_cols = [col for col in self.data['size_distributions'].columns if filename in col and ' Video' in col]
-            list_concentrations = [self.data['size_distributions'][col] for col in videos_cols]
-            list_legend_labels = [col.replace(filename,'').replace('Concentration ','') for col in videos_cols]
+            list_concentrations = list(dataset.get_videos(filename))
+            list_legend_labels = ['Video '+str(k+1) for k in range(len(list_concentrations))]
             
-            plot_size_distributions(bin_centers, list_concentrations, savepath=plots_savepath, 
-                                       list_legend_labels=list_legend_labels, name=filename, title=filename)
+            plot_jobs.append(('plot_size_distributions', dict(bin_centers=bin_centers, list_concentrations=list_concentrations, savepath=plots_savepath, 
+                                                              list_legend_labels=list_legend_labels, name=filename, title=filename)))
 
         # all file average distributions in one plot
-        list_concentrations = [self.data['size_distributions']['Average '+filename] for filename in self.filenames]
+        list_concentrations = [dataset.get_file_average(filename) for filename in self.filenames]
         list_legend_labels = self.filenames
-        plot_size_distributions(bin_centers, list_concentrations, savepath=plots_savepath, 
-                                    list_legend_labels=list_legend_labels, name='all_files')
+        plot_jobs.append(('plot_size_distributions', dict(bin_centers=bin_centers, list_concentrations=list_concentrations, savepath=plots_savepath, 
+                                                          list_legend_labels=list_legend_labels, name='all_files')))
 
         # all file average distributions in one plot + normalize distributions (divide by area to have densities)
-        list_concentrations = [self.data['size_distributions']['Average '+filename] for filename in self.filenames]
-        list_normalized_concentrations = [distrib / simpson(x=bin_centers, y=distrib) for distrib in list_concentrations]
+        list_normalized_concentrations = list(self.derived_quantities['normalized_concentrations'][get_rows(self.derived_quantities, filenames=self.filenames)])
         list_legend_labels = [filename+', normalized' for filename in self.filenames]
-        plot_size_distributions(bin_centers, list_normalized_concentrations, savepath=plots_savepath, 
-                                    list_legend_labels=list_legend_labels, name='all_files_normalized')
+        plot_jobs.append(('plot_size_distributions', dict(bin_centers=bin_centers, list_concentrations=list_normalized_concentrations, savepath=plots_savepath, 
+                                                          list_legend_labels=list_legend_labels, name='all_files_normalized')))
 
         """
         if replicates exist, plot replicates distributions and average/std for all samples
@@ -658,32 +871,40 @@ class NanosightApp():
                 if len(list_replicates) < 2 :
                     continue
 
-                replicate_average_concentrations = [self.data['size_distributions']['Average '+sample_name+filename] 
-                                                                                   for filename in list_replicates]
+                replicate_average_concentrations = [dataset.get_file_average(filename) for filename in dataset.get_sample_filenames(sample_name)]
                 
-                plot_size_distributions(bin_centers, replicate_average_concentrations, savepath=plots_savepath, 
-                                            list_legend_labels=list_replicates, name=sample_name, title=sample_name)
+                plot_jobs.append(('plot_size_distributions', dict(bin_centers=bin_centers, list_concentrations=replicate_average_concentrations, savepath=plots_savepath, 
+                                                                  list_legend_labels=list_replicates, name=sample_name, title=sample_name)))
 
             # plot all samples average distributions
-            list_concentrations = [self.data['size_distributions']['Average '+sample_name] 
+            list_concentrations = [dataset.get_sample_average(sample_name) 
                                            for sample_name in self.samples_names if len(self.data['samples_filenames'][sample_name])>=2]
             list_legend_labels = [sample_name for sample_name in self.samples_names if len(self.data['samples_filenames'][sample_name])>=2]
-            plot_size_distributions(bin_centers, list_concentrations, list_legend_labels=list_legend_labels, name='all_samples', 
-                                        savepath=plots_savepath)
+            plot_jobs.append(('plot_size_distributions', dict(bin_centers=bin_centers, list_concentrations=list_concentrations, list_legend_labels=list_legend_labels, 
+                                                              name='all_samples', savepath=plots_savepath)))
 
             # plot all samples average distributions + normalize distributions (divide by area to have densities)
-            list_concentrations = [self.data['size_distributions']['Average '+sample_name] 
-                                           for sample_name in self.samples_names if len(self.data['samples_filenames'][sample_name])>=2]
-            list_normalized_concentrations = [distrib / simpson(x=bin_centers, y=distrib) for distrib in list_concentrations]
+            samples_rows = get_rows(self.derived_quantities, samples_names=[sample_name for sample_name in self.samples_names 
+                                                                            if len(self.data['samples_filenames'][sample_name])>=2])
+            list_normalized_concentrations = list(self.derived_quantities['normalized_concentrations'][samples_rows])
             list_legend_labels = [sample_name+', normalized' for sample_name in self.samples_names if len(self.data['samples_filenames'][sample_name])>=2]
-            plot_size_distributions(bin_centers, list_normalized_concentrations, list_legend_labels=list_legend_labels, name='all_samples_normalized', 
-                                        savepath=plots_savepath)
+            plot_jobs.append(('plot_size_distributions', dict(bin_centers=bin_centers, list_concentrations=list_normalized_concentrations, list_legend_labels=list_legend_labels, 
+                                                              name='all_samples_normalized', savepath=plots_savepath)))
+
+        return plot_jobs
 
 
 
-    def plot_size_concentration_attributes(self):
+    def get_size_concentration_attributes_plot_jobs(self):
 
-        plots_savepath = os.path.join(resultspath, self.chosen_directory, 'data_illustrations')
+        """
+        list the bar plots of size and concentration attributes, as (plot function name, keyword arguments) for render_plots
+        
+        """ 
+
+        plot_jobs = []
+
+        plots_savepath = os.path.join(self.resultspath, self.chosen_directory, 'data_illustrations')
         
         """
         bar plots for each attribute across all files
@@ -696,8 +917,8 @@ class NanosightApp():
 
             attribute_data = self.data['size_concentration_attributes'].loc[self.filenames][attribute+' Average'].values
             
-            barplot(attribute_data, name='all_files_'+attribute, list_legend_labels = self.filenames, 
-                    savepath=plots_savepath, title=attribute)
+            plot_jobs.append(('barplot', dict(list_data=attribute_data, name='all_files_'+attribute, list_legend_labels=list(self.filenames), 
+                                              savepath=plots_savepath, title=attribute)))
 
 
         """
@@ -711,41 +932,46 @@ class NanosightApp():
     
                 attribute_data = self.data['size_concentration_attributes'].loc[self.samples_names][attribute+' Average'].values
 
-                barplot(attribute_data, name='all_samples_'+attribute, list_legend_labels = list(self.samples_names), 
-                        savepath=plots_savepath, title=attribute)
+                plot_jobs.append(('barplot', dict(list_data=attribute_data, name='all_samples_'+attribute, list_legend_labels=list(self.samples_names), 
+                                                  savepath=plots_savepath, title=attribute)))
+
+        return plot_jobs
 
 
 
 
+    @instrumented('clustering', 'app')
     def run_clustering(self):
         
         """
         run clustering of size distributions and size concentration attributes
         
         """ 
-        
-        if self.mode=='gui':
-            # remove the confirmation of previous export if any
-            if hasattr(self, 'ok_clustering'):
-                self.ok_clustering.destroy()
 
         # create a directory for clustering exports
-        create_directory([resultspath, self.chosen_directory, 'clustering'])
-        clustering_savepath = os.path.join(resultspath, self.chosen_directory, 'clustering')
+        create_directory([self.resultspath, self.chosen_directory, 'clustering'])
+        clustering_savepath = os.path.join(self.resultspath, self.chosen_directory, 'clustering')
+
+        # the clustering is run again only if its inputs changed, the csv file stands for all its outputs
+        manifest = load_manifest(clustering_savepath)
 
         """
         run clustering of all files size distributions
         
         """ 
         
-        bin_centers = self.data['size_distributions']['Bin centers'].values
+        bin_centers = self.derived_quantities['bin_centers']
 
-        list_concentrations = [self.data['size_distributions']['Average '+filename] for filename in self.filenames]
-        list_normalized_concentrations = [distrib / simpson(x=bin_centers, y=distrib) for distrib in list_concentrations]
+        files_rows = get_rows(self.derived_quantities, filenames=self.filenames)
+        list_normalized_concentrations = list(self.derived_quantities['normalized_concentrations'][files_rows])
         list_legend_labels = self.filenames        
 
-        run_wasserstein_clustering(bin_centers, list_normalized_concentrations, list_legend_labels, name='all_files', 
-                                   savepath=clustering_savepath)
+        fingerprint = compute_fingerprint(bin_centers, list_normalized_concentrations, list(list_legend_labels))
+
+        if not is_output_up_to_date(manifest, clustering_savepath, 'all_files_wasserstein_distances.csv', fingerprint, force=self.force_outputs):
+            run_wasserstein_clustering(bin_centers, list_normalized_concentrations, list_legend_labels, name='all_files', 
+                                       savepath=clustering_savepath, cdfs=self.derived_quantities['cdfs'][files_rows])
+            manifest['all_files_wasserstein_distances.csv'] = fingerprint
         
         
         
@@ -756,20 +982,24 @@ class NanosightApp():
 
         if self.any_replicates:
 
-            list_concentrations = [self.data['size_distributions']['Average '+sample_name] for sample_name in self.samples_names]
-            list_normalized_concentrations = [distrib / simpson(x=bin_centers, y=distrib) for distrib in list_concentrations]
+            self.report_progress(0.5)
+
+            samples_rows = get_rows(self.derived_quantities, samples_names=self.samples_names)
+            list_normalized_concentrations = list(self.derived_quantities['normalized_concentrations'][samples_rows])
             list_legend_labels = self.samples_names
     
-            run_wasserstein_clustering(bin_centers, list_normalized_concentrations, list_legend_labels, name='all_samples', 
-                                       savepath=clustering_savepath)
-            
+            fingerprint = compute_fingerprint(bin_centers, list_normalized_concentrations, list(list_legend_labels))
+
+            if not is_output_up_to_date(manifest, clustering_savepath, 'all_samples_wasserstein_distances.csv', fingerprint, force=self.force_outputs):
+                run_wasserstein_clustering(bin_centers, list_normalized_concentrations, list_legend_labels, name='all_samples', 
+                                           savepath=clustering_savepath, cdfs=self.derived_quantities['cdfs'][samples_rows])
+                manifest['all_samples_wasserstein_distances.csv'] = fingerprint
 
-        if self.mode=='gui': 
-            # display 'Ok' when export is successfull
-            self.ok_clustering = tkinter.Label(self.analysis_frame, text = "Ok", bg=bg_color, fg="orangered")
-            self.ok_clustering.grid(row=2, column=1, pady=40*ratio_pady, padx=20*ratio_padx)
+        if manifest != load_manifest(clustering_savepath):
+            save_manifest(clustering_savepath, manifest)
             
             
+    @instrumented('two-samples tests', 'app')
     def run_two_samples_tests(self):
         
         """
@@ -777,75 +1007,36 @@ class NanosightApp():
         
         """ 
 
-        if self.mode=='gui':
-            # remove the confirmation of previous export if any
-            if hasattr(self, 'ok_tests'):
-                self.ok_tests.destroy()
-
-        # create a directory for clustering exports
-        create_directory([resultspath, self.chosen_directory, 'two-samples test'])
-        tests_savepath = os.path.join(resultspath, self.chosen_directory, 'two-samples tests')
+        # create a directory for two-samples tests exports
+        create_directory([self.resultspath, self.chosen_directory, 'two-samples tests'])
+        tests_savepath = os.path.join(self.resultspath, self.chosen_directory, 'two-samples tests')
 
         """
         run two-samples tests between classes, considering all files size distributions
         
         """ 
         
-        bin_centers = self.data['size_distributions']['Bin centers'].values
+        bin_centers = self.derived_quantities['bin_centers']
 
-        list_concentrations = [self.data['size_distributions']['Average '+filename] for filename in self.filenames]
-        list_normalized_concentrations = [distrib / simpson(x=bin_centers, y=distrib) for distrib in list_concentrations]
+        files_rows = get_rows(self.derived_quantities, filenames=self.filenames)
+        list_normalized_concentrations = list(self.derived_quantities['normalized_concentrations'][files_rows])
         list_legend_labels = self.filenames        
 
         run_two_samples_tests(bin_centers, list_normalized_concentrations, list_legend_labels, 
                                    list_class_labels=self.files_class_labels, name='all_files', 
-                                   savepath=tests_savepath)
+                                   savepath=tests_savepath, cdfs=self.derived_quantities['cdfs'][files_rows])
 
         """
         run two-samples tests between classes, considering all samples size distributions
         
         """ 
         
-        bin_centers = self.data['size_distributions']['Bin centers'].values
+        self.report_progress(0.5)
 
-        list_concentrations = [self.data['size_distributions']['Average '+filename] for filename in self.samples_names]
-        list_normalized_concentrations = [distrib / simpson(x=bin_centers, y=distrib) for distrib in list_concentrations]
+        samples_rows = get_rows(self.derived_quantities, samples_names=self.samples_names)
+        list_normalized_concentrations = list(self.derived_quantities['normalized_concentrations'][samples_rows])
         list_legend_labels = self.samples_names        
 
         run_two_samples_tests(bin_centers, list_normalized_concentrations, list_legend_labels, 
-                                   list_class_labels=self.samples_class_labels, name='all_files', 
-                                   savepath=tests_savepath)
-
-        if self.mode=='gui': 
-            # display 'Ok' when export is successfull
-            self.ok_tests = tkinter.Label(self.analysis_frame, text = "Ok", bg=bg_color, fg="orangered")
-            self.ok_tests.grid(row=3, column=1, pady=40*ratio_pady, padx=20*ratio_padx)
-            
-            
-    def adjust_canvas_frame(self):
-
-        # # ensure all content is rendered before updating the scroll region
-        self.canvas_window.update_idletasks()
-        
-        # ensure the canvas window columns can expand to prevent label content from being hidden
-        max_column_index = max(widget.grid_info()['column'] for widget in self.canvas_window.winfo_children())
-
-        for i in range(max_column_index+1):
-
-            self.canvas_window.grid_columnconfigure(i, weight=1)  # First column
-            
-            
-    
-        # get the required width and height of the content inside the canvas
-        content_width = self.canvas_window.winfo_reqwidth() 
-        content_height = self.canvas_window.winfo_reqheight()
-    
-        # set a maximum height for the canvas (e.g., 50% of the screen height)
-        max_height = 0.5 * self.gui_root.winfo_screenheight()
-    
-        # Update canvas size: use full width of the content but limit height
-        self.canvas.config(width=content_width, height=min(content_height, max_height))
-    
-        # Configure the canvas scrolling region based on the content size
-        self.canvas.config(scrollregion=self.canvas.bbox("all"))
-        
+                                   list_class_labels=self.samples_class_labels, name='all_samples', 
+                                   savepath=tests_savepath, cdfs=self.derived_quantities['cdfs'][samples_rows])
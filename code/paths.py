@@ -1,12 +1,12 @@
 
 from pathlib import Path
-import os
 
 
 
 
 
-source = Path().resolve().parent
+# root of the repository (parent of the code directory), whatever the working directory the app is run from
+source = Path(__file__).resolve().parent.parent
 
 
 
@@ -15,10 +15,8 @@ datapath = Path(source, "data")
 codepath = Path(source, "code")
 
 
-
-
-for dir_ in ["nanosight_app_results"]:
-    if not os.path.exists(Path(source, dir_)):
-        os.mkdir(Path(source, dir_))
-
+# the results directory is created when the first results are written (see create_directory), not at import
 resultspath = Path(source, "nanosight_app_results")
+
+# cache of the parsed export files, shared by all data directories
+parse_cache_path = Path(resultspath, ".parse_cache")
@@ -1,7 +1,42 @@
 
+import argparse
 
+from paths import parse_cache_path
 from nanosight_app import NanosightApp
+from data_extraction_module.parse_cache import clear_parse_cache
+from app_tools.instrumentation import enable_instrumentation, disable_instrumentation
 
 
-app = NanosightApp()
-app.run()
\ No newline at end of file
+# the plots are rendered by worker processes started with spawn, which import this module again: the app must
+# only run in the main process
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='run the Nanosight data analysis graphical interface')
+    parser.add_argument('--no-cache', action='store_true', help='parse all export files again, without reading or writing the parse cache')
+    parser.add_argument('--clear-cache', action='store_true', help='remove all entries of the parse cache before running')
+    parser.add_argument('--trace', metavar='FILE', default=None,
+                        help='record the duration, counters and memory of each extraction and analysis stage, and write them in this JSON file')
+    parser.add_argument('--chrome-trace', metavar='FILE', default=None,
+                        help='write the recorded stages in this file in the Chrome trace format (chrome://tracing, ui.perfetto.dev)')
+    parser.add_argument('--trace-memory', action='store_true', help='also measure the python memory allocated by each stage with tracemalloc (slower)')
+    args = parser.parse_args()
+
+    if args.clear_cache:
+        clear_parse_cache(parse_cache_path)
+
+    # the stages are only instrumented when a trace is requested
+    if args.trace is not None or args.chrome_trace is not None:
+        enable_instrumentation(trace_memory=args.trace_memory)
+
+
+    app = NanosightApp(use_cache=not args.no_cache)
+    app.run()
+
+    tracer = disable_instrumentation()
+
+    if tracer is not None:
+        print(tracer.format_summary())
+        if args.trace is not None:
+            tracer.export_json_trace(args.trace)
+        if args.chrome_trace is not None:
+            tracer.export_chrome_trace(args.chrome_trace)
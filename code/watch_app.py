@@ -0,0 +1,63 @@
+
+import os
+import argparse
+import logging
+from pathlib import Path
+
+# plots are only saved, no display is needed
+import matplotlib
+matplotlib.use('Agg')
+
+from paths import datapath, resultspath, parse_cache_path
+from app_tools.watch_tools import watch_directory
+
+
+def main():
+
+    """
+    parse the arguments, then watch the directory until interrupted
+
+    """
+
+    parser = argparse.ArgumentParser(description='watch a data directory and process each new Nanosight export as soon as it is written')
+    parser.add_argument('directory', help='data directory to watch (absolute, or relative to the data directory)')
+    parser.add_argument('--dilution-prefix', default=None, help='dilution prefix to consider when reading file names')
+    parser.add_argument('--replicate-prefix', default=None, help='replicate prefix to consider when reading file names')
+    parser.add_argument('--n-workers', type=int, default=2, help='number of worker processes (default: 2)')
+    parser.add_argument('--batch-size', type=int, default=8, help='maximum number of experiments sent to a worker at once (default: 8)')
+    parser.add_argument('--queue-size', type=int, default=32, help='maximum number of finished files waiting for a worker (default: 32)')
+    parser.add_argument('--settle-time', type=float, default=5., help='seconds without modification after which a file is finished (default: 5)')
+    parser.add_argument('--poll-interval', type=float, default=2., help='seconds between two scans of the directory (default: 2)')
+    parser.add_argument('--process-existing', action='store_true', help='also process the files present when the watch starts')
+    parser.add_argument('--polling', action='store_true', help='poll the directory even if inotify is available')
+    parser.add_argument('--no-cache', action='store_true', help='do not use the parse cache')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+
+    directory_path = Path(datapath, args.directory)
+
+    # results of each experiment are written in nanosight_app_results/<directory>/watch/<experiment>
+    results_path = Path(resultspath, os.path.basename(os.path.normpath(args.directory)), 'watch')
+
+
+    watch_directory(directory_path, results_path, 
+                    dilution_prefix=args.dilution_prefix, 
+                    replicate_prefix=args.replicate_prefix,
+                    cache_directory=None if args.no_cache else parse_cache_path,
+                    n_workers=args.n_workers, 
+                    batch_size=args.batch_size, 
+                    queue_size=args.queue_size,
+                    settle_time=args.settle_time, 
+                    poll_interval=args.poll_interval,
+                    process_existing=args.process_existing, 
+                    use_inotify=not args.polling)
+
+
+
+# the worker processes are started with spawn (see dispatch_batches), they import this module again: the watch must
+# only run in the main process
+if __name__ == '__main__':
+
+    main()